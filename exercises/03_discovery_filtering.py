@@ -1,19 +1,28 @@
 import asyncio
 
+from ble_filter import AdvertisementFilter
 from bleak import BleakScanner
 from bleak.backends.device import BLEDevice
 from bleak.backends.scanner import AdvertisementData
 
+# Each rule only lists the fields it needs; UUIDs may be given in any case or width.
+ADVERTISEMENT_FILTER = AdvertisementFilter.from_spec([
+    {"name": "environmental sensing", "service_uuid": 0x181A, "min_rssi": -90},
+    {"name": "pico", "service_uuid": "51FF12BB-3ED8-46E5-B4F9-D64E2FEC021B"},
+])
+
 
 def discovery_callback(device: BLEDevice, advertisement_data: AdvertisementData) -> None:
-    print(f"{device.address} {advertisement_data}")
+    rule = ADVERTISEMENT_FILTER.match(device, advertisement_data)
+    if rule is not None:
+        print(f"[{rule}] {device.address} {advertisement_data}")
 
 
 async def main() -> None:
-    scanner = BleakScanner()
+    # What the backend can filter by itself (here, the service UUIDs) is pushed down to it.
+    scanner = BleakScanner(**ADVERTISEMENT_FILTER.scanner_kwargs())
 
-    await scanner.discover(detection_callback=discovery_callback,
-                           service_uuids=["0000181a-0000-1000-8000-00805f9b34fb",
-                                          "51FF12BB-3ED8-46E5-B4F9-D64E2FEC021B"])
+    await scanner.discover(detection_callback=discovery_callback)
+    print(f"Matches per rule: {ADVERTISEMENT_FILTER.hits}")
 
 asyncio.run(main())
@@ -1,7 +1,7 @@
 import asyncio
 import signal
 
-from bleak import BleakScanner
+from ble_scan_scheduler import ScanScheduler, ScanWindow
 from bleak.backends.device import BLEDevice
 from bleak.backends.scanner import AdvertisementData
 
@@ -10,10 +10,18 @@ def discovery_callback(device: BLEDevice, advertisement_data: AdvertisementData)
     print(f"{device.address} {advertisement_data}")
 
 
+def window_callback(window: ScanWindow) -> None:
+    print(f"Scanned {window.duration:.1f}s ({window.mode}): {window.new_devices} new devices, "
+          f"{window.reports} reports; duty cycle now {window.duty_cycle:.0%}")
+
+
 async def main() -> None:
     stop_scanning = asyncio.Event()
-    scanner = BleakScanner(discovery_callback,
-                           service_uuids=["0000181a-0000-1000-8000-00805f9b34fb"])
+    # Instead of scanning non-stop, scan in 2s windows with idle gaps that grow while no new
+    # device shows up.
+    scheduler = ScanScheduler(discovery_callback,
+                              service_uuids=["0000181a-0000-1000-8000-00805f9b34fb"],
+                              window=2.0, window_callback=window_callback)
 
     def stop_scanning_clbk(sig, frame) -> None:
         stop_scanning.set()
@@ -21,8 +29,8 @@ async def main() -> None:
     signal.signal(signal.SIGINT, stop_scanning_clbk)
     signal.signal(signal.SIGTERM, stop_scanning_clbk)
 
-    while not stop_scanning.is_set():
-        async with scanner:
-            await stop_scanning.wait()
+    stats = await scheduler.run(stop_scanning)
+    print(f"Duty cycle {stats.duty_cycle:.0%}, {stats.discovery_rate:.2f} devices and "
+          f"{stats.reports_per_second:.1f} reports per scan-second")
 
 asyncio.run(main())
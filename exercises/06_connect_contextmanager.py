@@ -1,38 +1,25 @@
 import asyncio
 
-from bleak import BleakClient, BleakScanner
-from bleak.backends.device import BLEDevice
-from bleak.backends.scanner import AdvertisementData
+from ble_locator import DeviceLocator, by_service
+from bleak import BleakClient
 
 ENVIRONMENTAL_SENSING_UUID = "0000181a-0000-1000-8000-00805f9b34fb"
 
-discovered_device: BLEDevice = None
-
-
-def discovery_callback(device: BLEDevice, advertisement_data: AdvertisementData) -> None:
-    print(
-        f"Peripheral {device.name} ({device.address}) "
-        f"with service {advertisement_data.service_uuids} found!")
-    global discovered_device  # noqa: PLW0603
-    discovered_device = device
-
 
 def disconnected_clbk(client: BleakClient) -> None:
     print(f"Disconnected from {client.address}")
 
 
 async def main() -> None:
-    scanner = BleakScanner()
-
-    while discovered_device is None:
-        await scanner.discover(detection_callback=discovery_callback,
-                               service_uuids=[ENVIRONMENTAL_SENSING_UUID])
-        if discovered_device is None:
-            print("No devices with environmental sensing service found")
+    # Stops scanning as soon as a sensor advertises, instead of after a full scan window.
+    device = await DeviceLocator().find("sensor", by_service(ENVIRONMENTAL_SENSING_UUID))
+    if device is None:
+        print("No devices with environmental sensing service found")
+        return
 
-    async with BleakClient(discovered_device,
+    async with BleakClient(device,
                            disconnected_callback=disconnected_clbk):
-        print(f"Connected to {discovered_device}")
+        print(f"Connected to {device}")
         await asyncio.sleep(3)
 
 
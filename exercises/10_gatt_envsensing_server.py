@@ -2,71 +2,74 @@ from __future__ import annotations
 
 import asyncio
 import logging
-import random
 import signal
 import sys
 import threading
 import time
-from pathlib import Path
-from typing import Any
-
+from typing import TYPE_CHECKING, Any
+
+from ble_codecs import PROBE_TEMPERATURES, TEMPERATURE
+from ble_history import (
+    CONTROL_SIZE,
+    DEFAULT_MTU,
+    HISTORY_CONTROL_UUID,
+    HISTORY_DATA_UUID,
+    OP_START,
+    TICKS_PERIOD,
+    History,
+    chunk_capacity,
+    unpack_control,
+)
+from ble_metrics import metrics
+from ble_uuids import normalize_uuid
 from bless import (
     BlessGATTCharacteristic,
     BlessServer,
     GATTAttributePermissions,
     GATTCharacteristicProperties,
 )
+from notify_scheduler import NotificationScheduler
+from w1_therm import BusSampler, RandomSensor, Reading, TemperatureSampler, W1Bus
 
+if TYPE_CHECKING:
+    from collections.abc import Callable
 
-def read_temperature_raw(device: str) -> list[str]:
-    with Path(device).open() as fp:
-        return fp.readlines()
-
-
-def read_temperature(device: str) -> tuple[float, float] | None:
-    lines = read_temperature_raw(device)
-    print(f"{lines=}")
-
-    # Check if the reading is correct. The first line must contain YES.
-    while lines[0].strip()[-3:] != "YES":
-        time.sleep(0.2)
-        lines = read_temperature_raw(DEVICE_FILE)
-
-    # Calculate temperature and convert to Fahrenheit. The temperature is in the second line.
-    equals_pos = lines[1].find("t=")
-
-    if equals_pos == -1:
-        return None
-
-    temp_string = lines[1][equals_pos+2:]
-    temp_c = float(temp_string) / 1000.0
-    temp_f = temp_c * 9.0 / 5.0 + 32.0
-
-    return temp_c, temp_f
-
+    ReadHandler = Callable[[BlessGATTCharacteristic], bytes | None]
+    WriteHandler = Callable[[BlessGATTCharacteristic, Any], None]
 
 ENVIRONMENTAL_SENSING_UUID = "0000181a-0000-1000-8000-00805f9b34fb"
 ENVIRONMENTAL_SENSING_TEMPERATURE_UUID = "00002a6e-0000-1000-8000-00805f9b34fb"
-BASE_DIR = Path("/sys/bus/w1/devices/")
-# DEVICE_DIR = glob.glob(BASE_DIR, "28*")[0]
-
-if Path.exists(BASE_DIR):
-    try:
-        DEVICE_DIR = next(BASE_DIR.glob("28*"), None)
-        print(DEVICE_DIR)
-        DEVICE_FILE = Path(DEVICE_DIR).joinpath("/w1_slave")
-        print(DEVICE_FILE)
-    except (StopIteration, TypeError):
-        DEVICE_DIR = None
-        DEVICE_FILE = None
-else:
-    DEVICE_DIR = None
-    DEVICE_FILE = None
+# Custom characteristics with every probe of the 1-Wire bus: the probe ids (comma separated,
+# UTF-8) and their temperatures packed as sint16 in 0.01 degC, in the same order.
+PROBE_IDS_UUID = "51ff12bb-3ed8-46e5-b4f9-d64e2fec0001"
+PROBE_TEMPERATURES_UUID = "51ff12bb-3ed8-46e5-b4f9-d64e2fec0002"
+# org.bluetooth.characteristic.temperature value for "unknown".
+TEMPERATURE_UNKNOWN = -0x8000
+TEMPERATURE_UNKNOWN_DEGREES = TEMPERATURE_UNKNOWN / 100
+# Seconds between sensor reads. A DS18B20 conversion takes ~750ms.
+SAMPLE_INTERVAL = 1.0
+# Subscribers are notified when the temperature moves more than NOTIFY_DEADBAND degrees, at
+# most every NOTIFY_MIN_INTERVAL seconds, and at least every NOTIFY_PERIOD seconds.
+NOTIFY_PERIOD = 10.0
+NOTIFY_DEADBAND = 0.1
+NOTIFY_MIN_INTERVAL = 0.5
+# Reported temperatures kept for centrals that were offline: a day at one per second. See
+# rpi_pico/gatt_history.py for the download protocol.
+HISTORY_SIZE = 86400
+# bless doesn't tell the MTU of a connection, so chunks are sized for the MTU the central
+# sends in its request, up to HISTORY_MAX_MTU. A central on BlueZ older than 5.62 can't
+# know its MTU and sends 23: 3 samples per chunk.
+HISTORY_MAX_MTU = 247
+# Seconds between chunks, so the notifications don't pile up in the Bluetooth stack.
+HISTORY_CHUNK_INTERVAL = 0.01
 
 
 logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(name=__name__)
 
+W1_BUS = W1Bus()
+logger.info(f"1-Wire probes: {list(W1_BUS.probes)}")
+
 # NOTE: Some systems require different synchronization methods.
 stop_server: asyncio.Event | threading.Event
 if sys.platform in ["darwin", "win32"]:
@@ -74,32 +77,104 @@ if sys.platform in ["darwin", "win32"]:
 else:
     stop_server = asyncio.Event()
 
+# The sensors are read in the background; read requests only return the latest readings.
+sampler: TemperatureSampler
+if W1_BUS.probes:
+    sampler = BusSampler(W1_BUS, interval=SAMPLE_INTERVAL)
+else:
+    sampler = TemperatureSampler(RandomSensor(), interval=SAMPLE_INTERVAL)
+# Sensor I/O time, to compare with the time spent answering read requests (BLE_METRICS=1).
+sampler.sensor = metrics.timed("sensor_read")(sampler.sensor)
+
+# Only touched from the event loop; the bless callbacks hand history requests over through
+# the queue.
+history = History(HISTORY_SIZE)
+history_requests: asyncio.Queue[tuple[int, int, int]] = asyncio.Queue()
+
+
+def history_clock() -> int:
+    # Milliseconds, in the same clock as Reading.timestamp, wrapping like the Pico's ticks_ms.
+    return int(time.monotonic() * 1000) % TICKS_PERIOD
+
+
+def encode_temperature(value: float) -> bytes:
+    # org.bluetooth.characteristic.temperature: sint16 in 0.01 degrees Celsius.
+    return TEMPERATURE.encode(value)
+
+
+def encode_probe_temperatures() -> bytes:
+    readings = sampler.readings() if isinstance(sampler, BusSampler) else {}
+    return PROBE_TEMPERATURES.encode(
+        [readings[probe_id].value if probe_id in readings else TEMPERATURE_UNKNOWN_DEGREES
+         for probe_id in W1_BUS.probes])
+
+
+def read_probe_ids(characteristic: BlessGATTCharacteristic) -> bytes:
+    return ",".join(W1_BUS.probes).encode()
 
-def read_request(characteristic: BlessGATTCharacteristic, **kwargs) -> bytearray | None:
-    if characteristic.uuid != ENVIRONMENTAL_SENSING_TEMPERATURE_UUID:
+
+def read_probe_temperatures(characteristic: BlessGATTCharacteristic) -> bytes:
+    return encode_probe_temperatures()
+
+
+def read_temperature(characteristic: BlessGATTCharacteristic) -> bytes | None:
+    reading = sampler.latest()
+    if reading is None:
+        logger.warning("No temperature reading available yet")
         return None
 
-    temperature: int
+    age = sampler.age(reading)
+    if age > sampler.max_staleness():
+        logger.warning(f"Temperature reading is {age:.1f}s old")
+    logger.debug(f"Reading temperature = {reading.value} ({age:.2f}s old)")
 
-    if DEVICE_FILE is not None:
-        temp_c, temp_f = read_temperature(DEVICE_FILE)
-        logger.debug(f"{temp_c=}; {temp_f=}")
-        temperature = int(temp_c * 100).to_bytes(length=2, byteorder="little")
-    else:
-        temp = round(random.uniform(23.0, 24.5), 2)  # noqa: S311
-        logger.debug(f"Reading temperature = {temp}")
-        temperature = int(temp * 100).to_bytes(length=2, byteorder="little")
+    return encode_temperature(reading.value)
 
-    return temperature
 
+def read_history_status(characteristic: BlessGATTCharacteristic) -> bytes:
+    return history.status()
 
-def write_request(characteristic: BlessGATTCharacteristic, value: Any, **kwargs):
+
+def write_history_control(characteristic: BlessGATTCharacteristic, value: Any) -> None:
+    if len(value) < CONTROL_SIZE:
+        logger.warning(f"Invalid history request {bytes(value)!r}")
+        return
+    loop.call_soon_threadsafe(history_requests.put_nowait, unpack_control(value))
+
+
+def write_value(characteristic: BlessGATTCharacteristic, value: Any) -> None:
     characteristic.value = value
     logger.debug(f"Char value set to {characteristic.value}")
     if characteristic.value == b"\x0f":
         logger.debug("NICE")
 
 
+# Request handlers by characteristic. Keys are normalized, so looking up the UUID bless
+# reports (whatever its case or width) is a single dict lookup.
+READ_HANDLERS: dict[str, ReadHandler] = {
+    normalize_uuid(ENVIRONMENTAL_SENSING_TEMPERATURE_UUID): read_temperature,
+    normalize_uuid(PROBE_IDS_UUID): read_probe_ids,
+    normalize_uuid(PROBE_TEMPERATURES_UUID): read_probe_temperatures,
+    normalize_uuid(HISTORY_CONTROL_UUID): read_history_status,
+}
+# Any other characteristic just stores the value written.
+WRITE_HANDLERS: dict[str, WriteHandler] = {
+    normalize_uuid(HISTORY_CONTROL_UUID): write_history_control,
+}
+
+
+@metrics.timed("server_read_request")
+def read_request(characteristic: BlessGATTCharacteristic, **kwargs) -> bytes | None:
+    handler = READ_HANDLERS.get(normalize_uuid(characteristic.uuid))
+    return handler(characteristic) if handler is not None else None
+
+
+@metrics.timed("server_write_request")
+def write_request(characteristic: BlessGATTCharacteristic, value: Any, **kwargs):
+    handler = WRITE_HANDLERS.get(normalize_uuid(characteristic.uuid), write_value)
+    handler(characteristic, value)
+
+
 async def run(loop):
     def stop_server_clbk(sig, frame):
         stop_server.set()
@@ -107,6 +182,8 @@ async def run(loop):
     signal.signal(signal.SIGINT, stop_server_clbk)
     signal.signal(signal.SIGTERM, stop_server_clbk)
 
+    sampler.start()
+
     # Instantiate the server
     my_service_name = "PyCon Environment Sensing (mac)"
     server = BlessServer(name=my_service_name, loop=loop)
@@ -131,16 +208,75 @@ async def run(loop):
 
     logger.debug(server.get_characteristic(my_char_uuid))
 
+    if W1_BUS.probes:
+        for char_uuid in (PROBE_IDS_UUID, PROBE_TEMPERATURES_UUID):
+            await server.add_new_characteristic(
+                my_service_uuid, char_uuid, GATTCharacteristicProperties.read, None,
+                permissions,
+            )
+
+    await server.add_new_characteristic(
+        my_service_uuid, HISTORY_CONTROL_UUID,
+        GATTCharacteristicProperties.read | GATTCharacteristicProperties.write, None,
+        GATTAttributePermissions.readable | GATTAttributePermissions.writeable,
+    )
+    await server.add_new_characteristic(
+        my_service_uuid, HISTORY_DATA_UUID, GATTCharacteristicProperties.notify, None,
+        permissions,
+    )
+
     await server.start()
     logger.debug("Advertising")
 
+    def notify_temperature(value: float) -> None:
+        logger.debug(f"Notifying temperature = {value}")
+        metrics.inc("server_notifications")
+        server.get_characteristic(my_char_uuid).value = encode_temperature(value)
+        server.update_value(my_service_uuid, my_char_uuid)
+
+    scheduler = NotificationScheduler(notify_temperature, period=NOTIFY_PERIOD,
+                                      deadband=NOTIFY_DEADBAND,
+                                      min_interval=NOTIFY_MIN_INTERVAL)
+
+    def record_reading(reading: Reading) -> None:
+        scheduler.offer(reading.value)
+        history.append(int(reading.timestamp * 1000) % TICKS_PERIOD, round(reading.value * 100))
+
+    def reading_received(reading: Reading) -> None:
+        # Only the primary probe is notified on the temperature characteristic.
+        if sampler.latest() is reading:
+            loop.call_soon_threadsafe(record_reading, reading)
+
+    async def stream_history() -> None:
+        # bless notifies every subscribed central, so there is one transfer at a time: a
+        # new request (or OP_STOP) ends the current one.
+        while True:
+            opcode, sequence, mtu = await history_requests.get()
+            capacity = chunk_capacity(min(mtu, HISTORY_MAX_MTU) if mtu else DEFAULT_MTU)
+            done = opcode != OP_START
+            while not done and history_requests.empty():
+                data, sequence, done = history.pack_chunk(sequence, capacity, history_clock())
+                server.get_characteristic(HISTORY_DATA_UUID).value = bytearray(data)
+                server.update_value(my_service_uuid, HISTORY_DATA_UUID)
+                metrics.inc("server_history_chunks")
+                await asyncio.sleep(HISTORY_CHUNK_INTERVAL)
+
+    sampler.subscribe(reading_received)
+    notify_task = asyncio.create_task(scheduler.run())
+    history_task = asyncio.create_task(stream_history())
+
     if stop_server.__module__ == "threading":
         stop_server.wait()
     else:
         await stop_server.wait()
 
     logger.info("Stopping server")
+    notify_task.cancel()
+    history_task.cancel()
     await server.stop()
+    sampler.stop()
+    if metrics.enabled:
+        print(metrics.prometheus())
 
 
 loop = asyncio.get_event_loop()
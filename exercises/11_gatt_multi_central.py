@@ -0,0 +1,47 @@
+import asyncio
+
+from ble_codecs import TEMPERATURE
+from ble_metrics import instrument_client, metrics
+from ble_pool import ENVIRONMENTAL_SENSING_UUID, CentralPool
+from bleak import BleakClient
+from bleak.backends.characteristic import BleakGATTCharacteristic
+
+ENVIRONMENTAL_SENSING_TEMPERATURE_UUID = "00002a6e-0000-1000-8000-00805f9b34fb"
+
+
+def notification_handler(address: str, characteristic: BleakGATTCharacteristic,
+                         data: bytearray) -> None:
+    print(f"{address} {characteristic.description} = "
+          f"{TEMPERATURE.decode(data)}")
+
+
+async def main() -> None:
+    # Run with BLE_METRICS=1 to get the connect/read/notify latency histograms.
+    async with CentralPool(ENVIRONMENTAL_SENSING_UUID, concurrency=5,
+                           client_cls=instrument_client(BleakClient)) as pool:
+        devices = await pool.discover()
+        if not devices:
+            print("No devices with environmental sensing service found")
+            return
+
+        await pool.connect_all(devices)
+        print(f"Connected to {len(pool.clients)} of {len(devices)} peripherals")
+
+        values = await pool.read_all(ENVIRONMENTAL_SENSING_TEMPERATURE_UUID)
+        for address, value in values.items():
+            if isinstance(value, Exception):
+                print(f"{address} read failed: {value}")
+            else:
+                print(f"{address} = {TEMPERATURE.decode(value)}")
+
+        await pool.start_notify_all(ENVIRONMENTAL_SENSING_TEMPERATURE_UUID, notification_handler)
+        await asyncio.sleep(5.0)
+        await pool.stop_notify_all(ENVIRONMENTAL_SENSING_TEMPERATURE_UUID)
+
+        print(pool.stats.report())
+
+    if metrics.enabled:
+        print(metrics.prometheus())
+
+
+asyncio.run(main())
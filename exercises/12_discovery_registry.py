@@ -0,0 +1,37 @@
+import asyncio
+import signal
+from types import FrameType
+
+from ble_registry import DeviceEntry, DeviceRegistry
+from bleak import BleakScanner
+
+
+def device_changed(event: str, entry: DeviceEntry) -> None:
+    print(f"[{event}] {entry.device.address} rssi={entry.rssi} {entry.advertisement}")
+
+
+async def main() -> None:
+    stop_scanning = asyncio.Event()
+    registry = DeviceRegistry(ttl=30.0, max_entries=256)
+    registry.subscribe(device_changed)
+    scanner = BleakScanner(registry,
+                           service_uuids=["0000181a-0000-1000-8000-00805f9b34fb"])
+
+    def stop_scanning_clbk(sig: int, frame: FrameType | None) -> None:  # noqa: ARG001
+        stop_scanning.set()
+
+    signal.signal(signal.SIGINT, stop_scanning_clbk)
+    signal.signal(signal.SIGTERM, stop_scanning_clbk)
+
+    async with scanner:
+        while not stop_scanning.is_set():
+            # Devices that stopped advertising are only evicted when something else is
+            # reported, so expire them periodically as well.
+            try:
+                await asyncio.wait_for(stop_scanning.wait(), timeout=registry.ttl)
+            except TimeoutError:
+                registry.expire()
+
+    print(f"{len(registry)} devices in the registry")
+
+asyncio.run(main())
@@ -0,0 +1,21 @@
+import asyncio
+import contextlib
+
+from ble_stream import COALESCE, AdvertisementStream
+
+
+async def main() -> None:
+    stream = AdvertisementStream(service_uuids=["0000181a-0000-1000-8000-00805f9b34fb"],
+                                 maxsize=128, overflow=COALESCE,
+                                 batch_size=32, batch_window_ms=500)
+
+    async with stream:
+        async for batch in stream:
+            for device, advertisement_data in batch:
+                print(f"{device.address} {advertisement_data}")
+            print(f"{len(batch)} advertisements, {stream.dropped}/{stream.received} dropped")
+            # Simulate a slow consumer: the scan keeps going while we are busy.
+            await asyncio.sleep(1)
+
+with contextlib.suppress(KeyboardInterrupt):
+    asyncio.run(main())
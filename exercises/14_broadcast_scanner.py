@@ -0,0 +1,30 @@
+import asyncio
+import signal
+from types import FrameType
+
+from ble_broadcast import ENVIRONMENTAL_SENSING_UUID, BroadcastCollector, BroadcastReading
+from bleak import BleakScanner
+
+
+def reading_received(reading: BroadcastReading) -> None:
+    print(f"{reading.address} #{reading.sequence} {reading.temperature:.2f} degC "
+          f"(rssi {reading.rssi})")
+
+
+async def main() -> None:
+    stop_scanning = asyncio.Event()
+    collector = BroadcastCollector(reading_received)
+    scanner = BleakScanner(collector, service_uuids=[ENVIRONMENTAL_SENSING_UUID])
+
+    def stop_scanning_clbk(sig: int, frame: FrameType | None) -> None:  # noqa: ARG001
+        stop_scanning.set()
+
+    signal.signal(signal.SIGINT, stop_scanning_clbk)
+    signal.signal(signal.SIGTERM, stop_scanning_clbk)
+
+    async with scanner:
+        await stop_scanning.wait()
+
+    print(f"{len(collector.readings)} sensors, {collector.duplicates} duplicate advertisements")
+
+asyncio.run(main())
@@ -0,0 +1,57 @@
+import asyncio
+
+from ble_gatt_cache import GattCache, StaleCacheError
+from bleak import BleakClient, BleakScanner
+from bleak.backends.device import BLEDevice
+from bleak.backends.scanner import AdvertisementData
+
+ENVIRONMENTAL_SENSING_UUID = "0000181a-0000-1000-8000-00805f9b34fb"
+MANUFACTURER_NAME_CHAR_UUID = "00002a29-0000-1000-8000-00805f9b34fb"
+MODEL_NUMBER_CHAR_UUID = "00002a24-0000-1000-8000-00805f9b34fb"
+SERIAL_NUMBER_CHAR_UUID = "00002a25-0000-1000-8000-00805f9b34fb"
+CHAR_UUIDS = [MANUFACTURER_NAME_CHAR_UUID, MODEL_NUMBER_CHAR_UUID, SERIAL_NUMBER_CHAR_UUID]
+
+
+def disconnected_clbk(client: BleakClient) -> None:
+    print(f"Disconnected from {client.address}")
+
+
+async def read_characteristics(device: BLEDevice, cache: GattCache) -> None:
+    # Only discover the services that hold the characteristics we read, if they are known.
+    services = cache.services(device.address, CHAR_UUIDS)
+
+    async with BleakClient(device, disconnected_callback=disconnected_clbk,
+                           services=services) as client:
+        print(f"Connected to {device} ({'cached' if services else 'full'} discovery)")
+        valid = await cache.refresh(client)
+        print(f"Cached GATT tree {'valid' if valid else 'stored'}")
+
+        for char_uuid in CHAR_UUIDS:
+            value = await cache.read(client, char_uuid)
+            print(f"{char_uuid} = {value.decode('utf-8')}")
+        # What the reads learned (e.g. handles of characteristics not cached yet).
+        cache.save()
+
+
+async def main() -> None:
+    def service_uuid_filter(device: BLEDevice, adv: AdvertisementData) -> bool:  # noqa: ARG001
+        return ENVIRONMENTAL_SENSING_UUID in adv.service_uuids
+
+    device = await BleakScanner.find_device_by_filter(service_uuid_filter)
+    if device is None:
+        print("No devices with environmental sensing service found")
+        return
+
+    cache = GattCache()
+    # A stale cached tree makes the first connection fail; the second one discovers everything.
+    for _ in range(2):
+        try:
+            await read_characteristics(device, cache)
+            break
+        except StaleCacheError as exc:
+            print(f"Stale GATT cache: {exc}")
+
+    print(f"cache hits={cache.hits} misses={cache.misses} invalidations={cache.invalidations}")
+
+
+asyncio.run(main())
@@ -0,0 +1,38 @@
+import asyncio
+import time
+
+from ble_devinfo import DeviceInfoCache
+from bleak import BleakClient, BleakScanner
+from bleak.backends.device import BLEDevice
+from bleak.backends.scanner import AdvertisementData
+
+ENVIRONMENTAL_SENSING_UUID = "0000181a-0000-1000-8000-00805f9b34fb"
+
+
+def disconnected_clbk(client: BleakClient) -> None:
+    print(f"Disconnected from {client.address}")
+
+
+async def main() -> None:
+    def service_uuid_filter(device: BLEDevice, adv: AdvertisementData) -> bool:  # noqa: ARG001
+        return ENVIRONMENTAL_SENSING_UUID in adv.service_uuids
+
+    device = await BleakScanner.find_device_by_filter(service_uuid_filter)
+    if device is None:
+        print("No devices with environmental sensing service found")
+        return
+
+    cache = DeviceInfoCache(ttl=3600)
+
+    # The second connection gets the device information from the cache.
+    for _ in range(2):
+        async with BleakClient(device, disconnected_callback=disconnected_clbk) as client:
+            print(f"Connected to {device}")
+            start = time.perf_counter()
+            info = await cache.read(client)
+            print(f"{info} in {(time.perf_counter() - start) * 1000:.1f}ms")
+
+    print(f"cache hits={cache.hits} misses={cache.misses}")
+
+
+asyncio.run(main())
@@ -0,0 +1,39 @@
+import asyncio
+
+from ble_locator import DeviceLocator, by_service
+from bleak import BleakClient
+
+ENVIRONMENTAL_SENSING_UUID = "0000181a-0000-1000-8000-00805f9b34fb"
+DEVICE_INFORMATION_UUID = "0000180a-0000-1000-8000-00805f9b34fb"
+
+
+def disconnected_clbk(client: BleakClient) -> None:
+    print(f"Disconnected from {client.address}")
+
+
+async def main() -> None:
+    locator = DeviceLocator()
+
+    # Both targets are located in the same scan, which stops as soon as both are found.
+    found = await locator.find_many({"sensor": by_service(ENVIRONMENTAL_SENSING_UUID),
+                                     "info": by_service(DEVICE_INFORMATION_UUID)},
+                                    timeout=10.0)
+    for key, device in found.items():
+        print(f"{key}: {device}")
+
+    # The device found above is tried first, while a new scan runs in the background.
+    client = await locator.connect("sensor", by_service(ENVIRONMENTAL_SENSING_UUID),
+                                   disconnected_callback=disconnected_clbk)
+    if client is None:
+        print("No devices with environmental sensing service found")
+        return
+
+    # connect() returns a connected client: `async with client` would connect it again.
+    try:
+        print(f"Connected to {client.address}")
+        await asyncio.sleep(2)
+    finally:
+        await client.disconnect()
+
+
+asyncio.run(main())
@@ -0,0 +1,52 @@
+import asyncio
+import json
+import signal
+from types import FrameType
+
+from ble_codecs import TEMPERATURE
+from ble_locator import DeviceLocator, by_service
+from ble_metrics import instrument_client, metrics
+from ble_supervisor import ConnectionSupervisor
+from bleak import BleakClient
+from bleak.backends.characteristic import BleakGATTCharacteristic
+
+ENVIRONMENTAL_SENSING_UUID = "0000181a-0000-1000-8000-00805f9b34fb"
+ENVIRONMENTAL_SENSING_TEMPERATURE_UUID = "00002a6e-0000-1000-8000-00805f9b34fb"
+
+
+def notification_handler(characteristic: BleakGATTCharacteristic, data: bytearray) -> None:
+    print(f"{characteristic.description} = "
+          f"{TEMPERATURE.decode(data)}")
+
+
+async def main() -> None:
+    stop = asyncio.Event()
+
+    def stop_clbk(sig: int, frame: FrameType | None) -> None:  # noqa: ARG001
+        stop.set()
+
+    signal.signal(signal.SIGINT, stop_clbk)
+    signal.signal(signal.SIGTERM, stop_clbk)
+
+    locator = DeviceLocator()
+    device = await locator.find("sensor", by_service(ENVIRONMENTAL_SENSING_UUID))
+    if device is None:
+        print("No devices with environmental sensing service found")
+        return
+
+    # Turn the peripheral off and on again: the subscription comes back on its own.
+    async with ConnectionSupervisor(device, locator=locator,
+                                    client_cls=instrument_client(BleakClient)) as supervisor:
+        print(f"Connected to {device}")
+        await supervisor.start_notify(ENVIRONMENTAL_SENSING_TEMPERATURE_UUID,
+                                      notification_handler)
+        await stop.wait()
+
+    for event in supervisor.recoveries:
+        print(f"disconnected for {event.time_to_recovery}s, {event.attempts} attempts")
+
+    if metrics.enabled:
+        print(json.dumps(metrics.snapshot(), indent=2))
+
+
+asyncio.run(main())
@@ -0,0 +1,53 @@
+import asyncio
+import signal
+import time
+from pathlib import Path
+from types import FrameType
+
+from ble_locator import DeviceLocator, by_service
+from ble_supervisor import ConnectionSupervisor
+from ble_timeseries import SeriesStore
+from bleak.backends.characteristic import BleakGATTCharacteristic
+
+ENVIRONMENTAL_SENSING_UUID = "0000181a-0000-1000-8000-00805f9b34fb"
+ENVIRONMENTAL_SENSING_TEMPERATURE_UUID = "00002a6e-0000-1000-8000-00805f9b34fb"
+
+HISTORY_DIR = Path("history")
+
+
+async def main() -> None:
+    stop = asyncio.Event()
+
+    def stop_clbk(sig: int, frame: FrameType | None) -> None:  # noqa: ARG001
+        stop.set()
+
+    signal.signal(signal.SIGINT, stop_clbk)
+    signal.signal(signal.SIGTERM, stop_clbk)
+
+    locator = DeviceLocator()
+    device = await locator.find("sensor", by_service(ENVIRONMENTAL_SENSING_UUID))
+    if device is None:
+        print("No devices with environmental sensing service found")
+        return
+
+    with SeriesStore(HISTORY_DIR) as store:
+        def notification_handler(characteristic: BleakGATTCharacteristic,  # noqa: ARG001
+                                 data: bytearray) -> None:
+            # Keep the raw 0.01 degC value: it fits the int16 column as is.
+            store.append(device.address, int.from_bytes(data, byteorder="little", signed=True))
+
+        async with ConnectionSupervisor(device, locator=locator) as supervisor:
+            print(f"Connected to {device}")
+            await supervisor.start_notify(ENVIRONMENTAL_SENSING_TEMPERATURE_UUID,
+                                          notification_handler)
+            await stop.wait()
+
+        print(f"{store.count(device.address)} samples stored for {device.address}")
+        now = time.time()
+        for bucket in store.downsample(device.address, now - 3600, now, 60):
+            print(f"{time.strftime('%H:%M', time.localtime(bucket.start))} "
+                  f"min={bucket.min / 100} max={bucket.max / 100} "
+                  f"mean={bucket.mean / 100:.2f} ({bucket.count} samples)")
+
+
+asyncio.run(main())
@@ -0,0 +1,55 @@
+import asyncio
+import signal
+from types import FrameType
+
+from ble_batch import Batch, NotificationBatcher
+from ble_pool import ENVIRONMENTAL_SENSING_UUID, CentralPool
+from bleak.backends.characteristic import BleakGATTCharacteristic
+
+ENVIRONMENTAL_SENSING_TEMPERATURE_UUID = "00002a6e-0000-1000-8000-00805f9b34fb"
+
+
+def batch_consumer(address: str, batch: Batch) -> None:
+    print(f"{address}: {len(batch)} samples at {batch.rate:.1f}/s "
+          f"min={batch.min:.2f} max={batch.max:.2f} mean={batch.mean:.2f} "
+          f"rolling={batch.rolling_mean[-1]:.2f}")
+
+
+async def main() -> None:
+    stop = asyncio.Event()
+
+    def stop_clbk(sig: int, frame: FrameType | None) -> None:  # noqa: ARG001
+        stop.set()
+
+    signal.signal(signal.SIGINT, stop_clbk)
+    signal.signal(signal.SIGTERM, stop_clbk)
+
+    batchers: dict[str, NotificationBatcher] = {}
+
+    def notification_handler(address: str, characteristic: BleakGATTCharacteristic,
+                             data: bytearray) -> None:
+        # Only a copy into the batcher's buffer: decoding happens once per batch.
+        batcher = batchers.get(address)
+        if batcher is None:
+            batcher = batchers[address] = NotificationBatcher(
+                lambda batch: batch_consumer(address, batch), capacity=64, flush_interval=5.0)
+        batcher(characteristic, data)
+
+    async with CentralPool(ENVIRONMENTAL_SENSING_UUID, concurrency=5) as pool:
+        devices = await pool.discover()
+        if not devices:
+            print("No devices with environmental sensing service found")
+            return
+
+        await pool.connect_all(devices)
+        print(f"Connected to {len(pool.clients)} of {len(devices)} peripherals")
+
+        await pool.start_notify_all(ENVIRONMENTAL_SENSING_TEMPERATURE_UUID, notification_handler)
+        await stop.wait()
+        await pool.stop_notify_all(ENVIRONMENTAL_SENSING_TEMPERATURE_UUID)
+
+    for batcher in batchers.values():
+        batcher.flush()
+
+
+asyncio.run(main())
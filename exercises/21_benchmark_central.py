@@ -0,0 +1,159 @@
+# Benchmark the central code paths against the simulated radio (no Bluetooth needed).
+#
+#   python 21_benchmark_central.py --devices 50 --duration 5
+#   python 21_benchmark_central.py --json > results.json
+#
+# Latencies are measured from the moment an advertisement or notification was due
+# to the moment its callback returned, so they include event loop delays.
+
+import argparse
+import asyncio
+import json
+import resource
+import statistics
+import sys
+import time
+
+from ble_batch import NotificationBatcher
+from ble_fake import (
+    ENVIRONMENTAL_SENSING_TEMPERATURE_UUID,
+    ENVIRONMENTAL_SENSING_UUID,
+    FakeRadio,
+    lognormal,
+)
+from ble_pool import CentralPool
+from ble_registry import DeviceRegistry
+from bleak.backends.characteristic import BleakGATTCharacteristic
+
+
+def percentile(values: list[float], fraction: float) -> float:
+    if not values:
+        return 0.0
+    if len(values) == 1:
+        return values[0]
+    return statistics.quantiles(values, n=100, method="inclusive")[round(fraction * 100) - 1]
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is in KiB on Linux and in bytes on macOS.
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+
+
+def result(name: str, count: int, elapsed: float, latencies: list[float]) -> dict:
+    return {"benchmark": name,
+            "count": count,
+            "rate": count / elapsed if elapsed > 0 else 0.0,
+            "p50_ms": percentile(latencies, 0.50) * 1000,
+            "p99_ms": percentile(latencies, 0.99) * 1000,
+            "peak_rss_mb": peak_rss_mb()}
+
+
+def make_radio(args: argparse.Namespace) -> FakeRadio:
+    return FakeRadio.with_sensors(args.devices, adv_interval=args.adv_interval,
+                                  notify_interval=args.notify_interval,
+                                  connect_latency=lognormal(args.connect_latency),
+                                  read_latency=lognormal(args.read_latency))
+
+
+async def bench_scan(args: argparse.Namespace) -> dict:
+    # Detection callback cost: every advertisement goes through a DeviceRegistry.
+    radio = make_radio(args)
+    registry = DeviceRegistry()
+    start = time.perf_counter()
+    async with radio.scanner_cls(registry, [ENVIRONMENTAL_SENSING_UUID]):
+        await asyncio.sleep(args.duration)
+    return result("scan", radio.advertisements, time.perf_counter() - start,
+                  list(radio.latencies))
+
+
+async def bench_connect(args: argparse.Namespace) -> dict:
+    # Connection fan-out: time to connect to every device through a CentralPool.
+    radio = make_radio(args)
+    async with CentralPool(concurrency=args.concurrency, scan_timeout=args.adv_interval * 2,
+                           scanner_cls=radio.scanner_cls, client_cls=radio.client_cls) as pool:
+        devices = await pool.discover()
+        start = time.perf_counter()
+        await pool.connect_all(devices)
+        elapsed = time.perf_counter() - start
+        latencies = [stats.connect_time for stats in pool.stats.devices.values()
+                     if stats.connected_at]
+        return result("connect", len(pool.clients), elapsed, latencies)
+
+
+async def bench_notify(args: argparse.Namespace, *, batched: bool) -> dict:
+    # Notification handling across every connected device, decoded per sample or in batches.
+    radio = make_radio(args)
+    values = []
+
+    def decode(address: str, characteristic: BleakGATTCharacteristic,  # noqa: ARG001
+               data: bytearray) -> None:
+        values.append(int.from_bytes(data, byteorder="little", signed=True) / 100)
+
+    batcher = NotificationBatcher(lambda batch: values.extend(batch.values),
+                                  capacity=1024, flush_interval=0.1)
+
+    def batch(address: str, characteristic: BleakGATTCharacteristic,  # noqa: ARG001
+              data: bytearray) -> None:
+        batcher.append(data)
+
+    async with CentralPool(concurrency=args.concurrency, scan_timeout=args.adv_interval * 2,
+                           scanner_cls=radio.scanner_cls, client_cls=radio.client_cls) as pool:
+        await pool.connect_all(await pool.discover())
+        radio.reset_stats()
+        start = time.perf_counter()
+        await pool.start_notify_all(ENVIRONMENTAL_SENSING_TEMPERATURE_UUID,
+                                    batch if batched else decode)
+        await asyncio.sleep(args.duration)
+        await pool.stop_notify_all(ENVIRONMENTAL_SENSING_TEMPERATURE_UUID)
+        elapsed = time.perf_counter() - start
+    batcher.flush()
+    return result("notify-batched" if batched else "notify", radio.notifications, elapsed,
+                  list(radio.latencies))
+
+
+BENCHMARKS = {
+    "scan": bench_scan,
+    "connect": bench_connect,
+    "notify": lambda args: bench_notify(args, batched=False),
+    "notify-batched": lambda args: bench_notify(args, batched=True),
+}
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Benchmark the central code paths against "
+                                                 "the simulated radio")
+    parser.add_argument("benchmarks", nargs="*", metavar="benchmark",
+                        help=f"benchmarks to run: {', '.join(BENCHMARKS)} (default: all)")
+    parser.add_argument("--devices", type=int, default=50)
+    parser.add_argument("--duration", type=float, default=3.0, help="seconds per benchmark")
+    parser.add_argument("--adv-interval", type=float, default=0.02)
+    parser.add_argument("--notify-interval", type=float, default=0.01)
+    parser.add_argument("--connect-latency", type=float, default=0.05,
+                        help="median connection time in seconds")
+    parser.add_argument("--read-latency", type=float, default=0.01,
+                        help="median read time in seconds")
+    parser.add_argument("--concurrency", type=int, default=5)
+    parser.add_argument("--json", action="store_true", help="print the results as JSON")
+    args = parser.parse_args()
+    unknown = set(args.benchmarks) - BENCHMARKS.keys()
+    if unknown:
+        parser.error(f"unknown benchmarks: {', '.join(sorted(unknown))}")
+    return args
+
+
+async def main() -> None:
+    args = parse_args()
+    results = [await BENCHMARKS[name](args) for name in args.benchmarks or BENCHMARKS]
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{'benchmark':<16}{'count':>9}{'rate/s':>12}{'p50 ms':>10}{'p99 ms':>10}"
+          f"{'rss MB':>9}")
+    for r in results:
+        print(f"{r['benchmark']:<16}{r['count']:>9}{r['rate']:>12.1f}{r['p50_ms']:>10.3f}"
+              f"{r['p99_ms']:>10.3f}{r['peak_rss_mb']:>9.1f}")
+
+
+asyncio.run(main())
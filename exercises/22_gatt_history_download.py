@@ -0,0 +1,43 @@
+import asyncio
+import json
+import time
+from array import array
+from pathlib import Path
+
+from ble_history import connection_mtu, download_history
+from ble_locator import DeviceLocator, by_service
+from ble_timeseries import SeriesStore
+
+ENVIRONMENTAL_SENSING_UUID = "0000181a-0000-1000-8000-00805f9b34fb"
+
+HISTORY_DIR = Path("history")
+# Next sequence to download, per device, so each run only gets the new samples.
+SEQUENCES_FILE = HISTORY_DIR / "sequences.json"
+
+
+async def main() -> None:
+    locator = DeviceLocator()
+    client = await locator.connect("sensor", by_service(ENVIRONMENTAL_SENSING_UUID))
+    if client is None:
+        print("No devices with environmental sensing service found")
+        return
+
+    sequences = json.loads(SEQUENCES_FILE.read_text()) if SEQUENCES_FILE.exists() else {}
+    try:
+        print(f"Connected to {client.address} (MTU {connection_mtu(client)})")
+        start = time.perf_counter()
+        download = await download_history(client, sequences.get(client.address, 0))
+        elapsed = time.perf_counter() - start
+    finally:
+        await client.disconnect()
+
+    print(f"{len(download.values)} samples in {download.chunks} notifications "
+          f"({elapsed:.1f}s), {download.lost} lost")
+    with SeriesStore(HISTORY_DIR) as store:
+        store.extend(client.address, array("h", download.values),
+                     array("q", (int(t * 1000) for t in download.timestamps)))
+    sequences[client.address] = download.next_sequence
+    SEQUENCES_FILE.write_text(json.dumps(sequences))
+
+
+asyncio.run(main())
@@ -0,0 +1,72 @@
+# Connect to every environmental sensor through several adapters.
+#
+#   python 23_connect_sharded.py --adapters hci0 hci1 hci2 --scan-adapter hci0
+#   python 23_connect_sharded.py --simulate 20
+#
+# With --simulate the adapters belong to the simulated radio, and one of the connection
+# adapters is unplugged halfway, to watch its devices move to the others.
+
+import argparse
+import asyncio
+
+from ble_fake import FakeRadio, constant
+from ble_sharding import ShardedCentral
+from bleak import BleakClient, BleakScanner
+from bleak.backends.characteristic import BleakGATTCharacteristic
+
+ENVIRONMENTAL_SENSING_TEMPERATURE_UUID = "00002a6e-0000-1000-8000-00805f9b34fb"
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Shard connections over several adapters")
+    parser.add_argument("--adapters", nargs="+", default=["hci0", "hci1"])
+    parser.add_argument("--scan-adapter", help="adapter dedicated to scanning")
+    parser.add_argument("--max-connections", type=int, default=7,
+                        help="connections per adapter")
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--simulate", type=int, metavar="DEVICES",
+                        help="use the simulated radio with this many sensors")
+    return parser.parse_args()
+
+
+async def main() -> None:
+    args = parse_args()
+    radio = None
+    scanner_cls, client_cls = BleakScanner, BleakClient
+    if args.simulate:
+        radio = FakeRadio.with_sensors(args.simulate, adv_interval=0.05, adapters=args.adapters,
+                                       max_connections=args.max_connections,
+                                       connect_latency=constant(0.05))
+        scanner_cls, client_cls = radio.scanner_cls, radio.client_cls
+
+    notifications: dict[str, int] = {}
+
+    def notification_handler(address: str, characteristic: BleakGATTCharacteristic,  # noqa: ARG001
+                             data: bytearray) -> None:
+        notifications[address] = notifications.get(address, 0) + 1
+
+    async with ShardedCentral(args.adapters, scan_adapter=args.scan_adapter,
+                              max_connections=args.max_connections,
+                              scan_timeout=1.0 if radio else 5.0,
+                              scanner_cls=scanner_cls, client_cls=client_cls) as central:
+        devices = await central.discover()
+        if not devices:
+            print("No devices with environmental sensing service found")
+            return
+        await central.connect_all(devices)
+        print(central.report())
+
+        await central.start_notify_all(ENVIRONMENTAL_SENSING_TEMPERATURE_UUID,
+                                       notification_handler)
+        await asyncio.sleep(args.duration / 2)
+        if radio is not None:
+            busiest = max(central.connection_adapters(), key=central.load)
+            print(f"Unplugging {busiest}")
+            radio.remove_adapter(busiest)
+        await asyncio.sleep(args.duration / 2)
+
+        print(central.report())
+        print(f"{sum(notifications.values())} notifications from {len(notifications)} devices")
+
+
+asyncio.run(main())
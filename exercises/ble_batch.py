@@ -0,0 +1,141 @@
+# Decode notifications in batches instead of one by one.
+#
+# Decoding every notification in its callback (int.from_bytes, scaling, printing)
+# costs more than receiving it when many devices notify often. NotificationBatcher
+# only copies the raw payload into a preallocated buffer. The buffer is decoded
+# with NumPy when it holds `capacity` samples or `flush_interval` seconds after
+# its first sample, and the consumer gets the whole batch with its statistics
+# (min/max/mean, rate and a rolling mean) computed on the arrays.
+
+from __future__ import annotations
+
+import asyncio
+import time
+from dataclasses import dataclass
+from typing import TYPE_CHECKING
+
+import numpy as np
+
+if TYPE_CHECKING:
+    from collections.abc import Callable
+
+    from bleak.backends.characteristic import BleakGATTCharacteristic
+
+    Consumer = Callable[["Batch"], None]
+
+# sint16 in 0.01 degC, as the temperature characteristic.
+TEMPERATURE_DTYPE = "<i2"
+TEMPERATURE_SCALE = 0.01
+
+
+@dataclass(slots=True, frozen=True)
+class Batch:
+    raw: np.ndarray
+    values: np.ndarray
+    timestamps: np.ndarray
+    rolling_mean: np.ndarray
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    @property
+    def min(self) -> float:
+        return float(self.values.min())
+
+    @property
+    def max(self) -> float:
+        return float(self.values.max())
+
+    @property
+    def mean(self) -> float:
+        return float(self.values.mean())
+
+    @property
+    def rate(self) -> float:
+        # Samples per second between the first and the last sample of the batch.
+        elapsed = float(self.timestamps[-1] - self.timestamps[0])
+        return (len(self) - 1) / elapsed if elapsed > 0 else 0.0
+
+
+class NotificationBatcher:
+    def __init__(  # noqa: PLR0913
+        self,
+        consumer: Consumer,
+        capacity: int = 256,
+        flush_interval: float | None = 1.0,
+        window: int = 8,
+        dtype: str = TEMPERATURE_DTYPE,
+        scale: float = TEMPERATURE_SCALE,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        if capacity < 1 or window < 1:
+            msg = "capacity and window must be at least 1"
+            raise ValueError(msg)
+
+        self.capacity = capacity
+        self.flush_interval = flush_interval
+        self.window = window
+        self.dtype = np.dtype(dtype)
+        self.scale = scale
+        self.received = 0
+        self.dropped = 0
+        self.batches = 0
+        self._consumer = consumer
+        self._clock = clock
+        self._size = self.dtype.itemsize
+        self._buffer = bytearray(capacity * self._size)
+        self._view = memoryview(self._buffer)
+        self._timestamps = np.empty(capacity, dtype=np.float64)
+        self._count = 0
+        # The last window - 1 values, so the rolling mean carries over between batches.
+        self._tail = np.empty(0, dtype=np.float64)
+        self._timer: asyncio.TimerHandle | None = None
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __call__(self, characteristic: BleakGATTCharacteristic, data: bytearray) -> None:  # noqa: ARG002
+        self.append(data)
+
+    def append(self, data: bytes | bytearray | memoryview) -> None:
+        if len(data) != self._size:
+            self.dropped += 1
+            return
+
+        offset = self._count * self._size
+        self._view[offset:offset + self._size] = data
+        self._timestamps[self._count] = self._clock()
+        self._count += 1
+        self.received += 1
+
+        if self._count == self.capacity:
+            self.flush()
+        elif self._count == 1 and self.flush_interval is not None:
+            try:
+                loop = asyncio.get_running_loop()
+            except RuntimeError:
+                return
+            self._timer = loop.call_later(self.flush_interval, self.flush)
+
+    def flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._count:
+            return
+
+        # frombuffer does not copy; the scaling does, so the buffer can be reused right away.
+        raw = np.frombuffer(self._buffer, dtype=self.dtype, count=self._count).copy()
+        values = raw * self.scale
+        timestamps = self._timestamps[:self._count].copy()
+        self._count = 0
+
+        series = np.concatenate((self._tail, values))
+        sums = np.cumsum(series)
+        sums[self.window:] -= sums[:-self.window]
+        counts = np.minimum(np.arange(1, len(series) + 1), self.window)
+        rolling_mean = (sums / counts)[len(self._tail):]
+        self._tail = series[len(series) - self.window + 1:] if self.window > 1 else series[:0]
+
+        self.batches += 1
+        self._consumer(Batch(raw, values, timestamps, rolling_mean))
@@ -0,0 +1,72 @@
+# Decoder for the broadcast mode of the Raspberry Pi Pico firmware.
+#
+# In broadcast mode the Pico advertises the Service Data AD field of the
+# Environmental Sensing service with the latest temperature (sint16, 0.01 degC)
+# followed by a sequence counter (uint8). Readings are collected from scan results
+# alone, without connecting to the peripherals.
+
+from __future__ import annotations
+
+import time
+from dataclasses import dataclass
+from typing import TYPE_CHECKING
+
+from ble_codecs import BROADCAST
+
+if TYPE_CHECKING:
+    from collections.abc import Callable
+
+    from bleak.backends.device import BLEDevice
+    from bleak.backends.scanner import AdvertisementData
+
+ENVIRONMENTAL_SENSING_UUID = "0000181a-0000-1000-8000-00805f9b34fb"
+
+
+@dataclass(slots=True, frozen=True)
+class BroadcastReading:
+    address: str
+    temperature: float
+    sequence: int
+    rssi: int
+    timestamp: float
+
+
+def _service_data(adv: AdvertisementData) -> tuple[float, int] | None:
+    # (temperature, sequence), laid out by the BROADCAST codec.
+    data = adv.service_data.get(ENVIRONMENTAL_SENSING_UUID)
+    if data is None or len(data) < BROADCAST.size:
+        return None
+    return BROADCAST.decode(data)
+
+
+def decode_broadcast(device: BLEDevice, adv: AdvertisementData) -> BroadcastReading | None:
+    decoded = _service_data(adv)
+    if decoded is None:
+        return None
+    temperature, sequence = decoded
+    return BroadcastReading(device.address, temperature, sequence, adv.rssi, time.time())
+
+
+class BroadcastCollector:
+    # Detection callback that keeps the latest reading of every sensor. The same
+    # advertisement is received many times, so on_reading is only called when the
+    # sequence counter changes.
+
+    def __init__(self, on_reading: Callable[[BroadcastReading], None] | None = None) -> None:
+        self.readings: dict[str, BroadcastReading] = {}
+        self.duplicates = 0
+        self._on_reading = on_reading
+
+    def __call__(self, device: BLEDevice, adv: AdvertisementData) -> None:
+        decoded = _service_data(adv)
+        if decoded is None:
+            return
+        temperature, sequence = decoded
+        last = self.readings.get(device.address)
+        if last is not None and last.sequence == sequence:
+            self.duplicates += 1
+            return
+        reading = BroadcastReading(device.address, temperature, sequence, adv.rssi, time.time())
+        self.readings[device.address] = reading
+        if self._on_reading is not None:
+            self._on_reading(reading)
@@ -0,0 +1,30 @@
+# Characteristic codecs, shared with the Raspberry Pi Pico firmware.
+#
+# The module lives in rpi_pico/gatt_codecs.py so it can be copied to the board as
+# is; this only makes it importable from the exercises.
+
+import sys
+from pathlib import Path
+
+_RPI_PICO_DIR = str(Path(__file__).resolve().parent.parent / "rpi_pico")
+if _RPI_PICO_DIR not in sys.path:
+    sys.path.append(_RPI_PICO_DIR)
+
+from gatt_codecs import (  # noqa: E402
+    BROADCAST,
+    CODECS,
+    PROBE_TEMPERATURES,
+    TEMPERATURE,
+    UTF8,
+    ArrayCodec,
+    StructCodec,
+    Utf8Codec,
+    codec_for,
+    decode,
+    encode,
+    register,
+    uuid_key,
+)
+
+__all__ = ["BROADCAST", "CODECS", "PROBE_TEMPERATURES", "TEMPERATURE", "UTF8", "ArrayCodec",
+           "StructCodec", "Utf8Codec", "codec_for", "decode", "encode", "register", "uuid_key"]
@@ -0,0 +1,109 @@
+# Bulk characteristic reads and a cache for the Device Information service.
+#
+# read_characteristics issues all the reads at once instead of awaiting them one
+# by one; the backend queues them on the link, so there is no idle time between
+# requests. The Device Information characteristics never change for a given
+# device, so DeviceInfoCache keeps them for `ttl` seconds per address and repeat
+# connections skip the reads entirely. A record with a missing value (the read
+# failed, or the characteristic isn't there) is only kept for `incomplete_ttl`, so
+# a transient GATT error doesn't hide the other strings for a whole `ttl`.
+
+from __future__ import annotations
+
+import asyncio
+import time
+from dataclasses import astuple, dataclass
+from typing import TYPE_CHECKING
+
+from ble_codecs import UTF8
+
+if TYPE_CHECKING:
+    from collections.abc import Callable, Iterable
+
+    from bleak import BleakClient
+
+MANUFACTURER_NAME_CHAR_UUID = "00002a29-0000-1000-8000-00805f9b34fb"
+MODEL_NUMBER_CHAR_UUID = "00002a24-0000-1000-8000-00805f9b34fb"
+SERIAL_NUMBER_CHAR_UUID = "00002a25-0000-1000-8000-00805f9b34fb"
+DEVICE_INFORMATION_CHAR_UUIDS = (MANUFACTURER_NAME_CHAR_UUID,
+                                 MODEL_NUMBER_CHAR_UUID,
+                                 SERIAL_NUMBER_CHAR_UUID)
+
+
+@dataclass(slots=True, frozen=True)
+class DeviceInformation:
+    manufacturer_name: str | None
+    model_number: str | None
+    serial_number: str | None
+
+
+async def read_characteristics(client: BleakClient, char_uuids: Iterable[str], *,
+                               concurrent: bool = True) -> dict[str, bytearray | None]:
+    # Characteristics that are missing or fail to read are returned as None.
+    char_uuids = [char_uuid for char_uuid in char_uuids
+                  if client.services.get_characteristic(char_uuid) is not None]
+    if concurrent:
+        values = await asyncio.gather(*(client.read_gatt_char(char_uuid)
+                                        for char_uuid in char_uuids),
+                                      return_exceptions=True)
+    else:
+        values = []
+        for char_uuid in char_uuids:
+            try:
+                values.append(await client.read_gatt_char(char_uuid))
+            except Exception as exc:  # noqa: BLE001
+                values.append(exc)
+
+    return {char_uuid: None if isinstance(value, BaseException) else value
+            for char_uuid, value in zip(char_uuids, values, strict=True)}
+
+
+def _decode(value: bytearray | None) -> str | None:
+    return UTF8.decode(value) if value is not None else None
+
+
+async def read_device_information(client: BleakClient, *,
+                                  concurrent: bool = True) -> DeviceInformation:
+    values = await read_characteristics(client, DEVICE_INFORMATION_CHAR_UUIDS,
+                                        concurrent=concurrent)
+    return DeviceInformation(_decode(values.get(MANUFACTURER_NAME_CHAR_UUID)),
+                             _decode(values.get(MODEL_NUMBER_CHAR_UUID)),
+                             _decode(values.get(SERIAL_NUMBER_CHAR_UUID)))
+
+
+class DeviceInfoCache:
+    def __init__(self, ttl: float = 24 * 3600.0, incomplete_ttl: float = 60.0,
+                 clock: Callable[[], float] = time.monotonic) -> None:
+        self.ttl = ttl
+        self.incomplete_ttl = incomplete_ttl
+        self.hits = 0
+        self.misses = 0
+        self._clock = clock
+        self._entries: dict[str, tuple[float, DeviceInformation]] = {}
+
+    def get(self, address: str) -> DeviceInformation | None:
+        entry = self._entries.get(address)
+        if entry is None:
+            return None
+        expires, info = entry
+        if self._clock() >= expires:
+            del self._entries[address]
+            return None
+        return info
+
+    def put(self, address: str, info: DeviceInformation, ttl: float | None = None) -> None:
+        self._entries[address] = (self._clock() + (ttl if ttl is not None else self.ttl), info)
+
+    def invalidate(self, address: str) -> None:
+        self._entries.pop(address, None)
+
+    async def read(self, client: BleakClient, *, concurrent: bool = True) -> DeviceInformation:
+        info = self.get(client.address)
+        if info is not None:
+            self.hits += 1
+            return info
+        self.misses += 1
+        info = await read_device_information(client, concurrent=concurrent)
+        complete = None not in astuple(info)
+        self.put(client.address, info, self.ttl if complete else self.incomplete_ttl)
+        return info
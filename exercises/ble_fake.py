@@ -0,0 +1,512 @@
+# A simulated BLE radio, to run (and measure) the central code without hardware.
+#
+# FakeRadio holds a set of FakePeripherals. radio.scanner_cls and radio.client_cls
+# are drop-in replacements for BleakScanner and BleakClient, covering the parts
+# used by the exercises and helpers: discover/find_device_by_filter, scanning
+# with a detection callback (also as a context manager), connect/disconnect,
+# services, read/write_gatt_char and start/stop_notify. They can be passed to
+# CentralPool, AdvertisementStream, DeviceLocator and ConnectionSupervisor.
+#
+# Every peripheral advertises every `adv_interval` seconds and notifies every
+# `notify_interval` seconds; connect and read latencies are drawn from the
+# radio's latency distributions. The delay between the moment an advertisement
+# or notification was due and the moment its callback returned is recorded in
+# `radio.latencies`, which includes the time spent in the callback itself.
+#
+# The radio has one or more adapters (hci0, hci1, ...), picked like on BlueZ with
+# bluez={"adapter": "hci1"} (the first one by default), each holding at most
+# `max_connections` connections. remove_adapter() simulates unplugging one: its
+# connections drop, its scans stop reporting, and using it raises BleakError until
+# add_adapter() brings it back.
+
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import heapq
+import math
+import random
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Any, Self
+
+from bleak.backends.device import BLEDevice
+from bleak.backends.scanner import AdvertisementData
+from bleak.exc import BleakError
+from bleak.uuids import normalize_uuid_str, uuidstr_to_str
+
+if TYPE_CHECKING:
+    from collections.abc import Callable, Iterable, Iterator
+
+    Latency = Callable[[], float]
+    DetectionCallback = Callable[[BLEDevice, AdvertisementData], None]
+    NotifyHandler = Callable[["FakeCharacteristic", bytearray], None]
+    Discovered = dict[str, tuple[BLEDevice, AdvertisementData]]
+
+ENVIRONMENTAL_SENSING_UUID = "0000181a-0000-1000-8000-00805f9b34fb"
+ENVIRONMENTAL_SENSING_TEMPERATURE_UUID = "00002a6e-0000-1000-8000-00805f9b34fb"
+DEVICE_INFORMATION_UUID = "0000180a-0000-1000-8000-00805f9b34fb"
+MANUFACTURER_NAME_CHAR_UUID = "00002a29-0000-1000-8000-00805f9b34fb"
+MODEL_NUMBER_CHAR_UUID = "00002a24-0000-1000-8000-00805f9b34fb"
+SERIAL_NUMBER_CHAR_UUID = "00002a25-0000-1000-8000-00805f9b34fb"
+
+
+def constant(delay: float) -> Latency:
+    return lambda: delay
+
+
+def uniform(low: float, high: float) -> Latency:
+    return lambda: random.uniform(low, high)  # noqa: S311
+
+
+def lognormal(median: float, sigma: float = 0.5) -> Latency:
+    # Long tailed, like real connection and ATT response times.
+    if median <= 0:
+        return constant(0.0)
+    mu = math.log(median)
+    return lambda: random.lognormvariate(mu, sigma)
+
+
+def temperature_walk(start: float = 20.0, step: float = 0.05) -> Callable[[], bytes]:
+    # sint16 in 0.01 degC, drifting randomly like a real sensor.
+    value = start
+
+    def sample() -> bytes:
+        nonlocal value
+        value += random.uniform(-step, step)  # noqa: S311
+        return round(value * 100).to_bytes(2, byteorder="little", signed=True)
+
+    return sample
+
+
+@dataclass(slots=True)
+class FakePeripheral:
+    address: str
+    name: str | None = None
+    service_uuids: list[str] = field(default_factory=lambda: [ENVIRONMENTAL_SENSING_UUID])
+    # service uuid -> characteristic uuid -> value (bytes, or a callable returning bytes).
+    services: dict[str, dict[str, bytes | Callable[[], bytes]]] = field(default_factory=dict)
+    adv_interval: float = 0.1
+    notify_interval: float = 1.0
+    rssi: int = -60
+    service_data: dict[str, bytes] = field(default_factory=dict)
+    manufacturer_data: dict[int, bytes] = field(default_factory=dict)
+
+    def device(self) -> BLEDevice:
+        return BLEDevice(address=self.address, name=self.name, details=None, rssi=self.rssi)
+
+    def advertisement(self, rssi: int) -> AdvertisementData:
+        return AdvertisementData(local_name=self.name,
+                                 manufacturer_data=self.manufacturer_data,
+                                 service_data=self.service_data,
+                                 service_uuids=self.service_uuids,
+                                 tx_power=None,
+                                 rssi=rssi,
+                                 platform_data=())
+
+    def value(self, char_uuid: str) -> bytes:
+        for characteristics in self.services.values():
+            if char_uuid in characteristics:
+                value = characteristics[char_uuid]
+                return value() if callable(value) else value
+        msg = f"Characteristic {char_uuid} not found on {self.address}"
+        raise BleakError(msg)
+
+
+def environmental_sensor(index: int, adv_interval: float = 0.1,
+                         notify_interval: float = 1.0) -> FakePeripheral:
+    return FakePeripheral(
+        address=f"FA:KE:00:00:{index >> 8 & 0xff:02X}:{index & 0xff:02X}",
+        name=f"Fake sensor {index}",
+        services={
+            ENVIRONMENTAL_SENSING_UUID: {
+                ENVIRONMENTAL_SENSING_TEMPERATURE_UUID: temperature_walk(),
+            },
+            DEVICE_INFORMATION_UUID: {
+                MANUFACTURER_NAME_CHAR_UUID: b"PyCon PT",
+                MODEL_NUMBER_CHAR_UUID: b"Fake sensor",
+                SERIAL_NUMBER_CHAR_UUID: f"{index:08d}".encode(),
+            },
+        },
+        adv_interval=adv_interval,
+        notify_interval=notify_interval,
+    )
+
+
+@dataclass(slots=True)
+class FakeCharacteristic:
+    uuid: str
+    handle: int
+    service_uuid: str
+    properties: list[str] = field(default_factory=lambda: ["read", "notify"])
+    # MTU - 3, as BlueZ >= 5.62 reports it (the default MTU of 23 here).
+    max_write_without_response_size: int = 20
+
+    @property
+    def description(self) -> str:
+        return uuidstr_to_str(self.uuid)
+
+
+@dataclass(slots=True)
+class FakeService:
+    uuid: str
+    handle: int
+    characteristics: list[FakeCharacteristic] = field(default_factory=list)
+
+    @property
+    def description(self) -> str:
+        return uuidstr_to_str(self.uuid)
+
+    def get_characteristic(self, specifier: str) -> FakeCharacteristic | None:
+        specifier = normalize_uuid_str(specifier)
+        return next((char for char in self.characteristics if char.uuid == specifier), None)
+
+
+class FakeServiceCollection:
+    def __init__(self, peripheral: FakePeripheral,
+                 service_uuids: Iterable[str] | None = None) -> None:
+        wanted = None if service_uuids is None else {normalize_uuid_str(uuid)
+                                                    for uuid in service_uuids}
+        self.services: dict[int, FakeService] = {}
+        self.characteristics: dict[int, FakeCharacteristic] = {}
+        handle = 1
+        for service_uuid, characteristics in peripheral.services.items():
+            service = FakeService(service_uuid, handle)
+            handle += 1
+            for char_uuid in characteristics:
+                char = FakeCharacteristic(char_uuid, handle, service_uuid)
+                service.characteristics.append(char)
+                handle += 1
+            # Handles are kept stable even for the services left out of discovery.
+            if wanted is None or service_uuid in wanted:
+                self.services[service.handle] = service
+                self.characteristics.update((char.handle, char)
+                                            for char in service.characteristics)
+
+    def __iter__(self) -> Iterator[FakeService]:
+        return iter(self.services.values())
+
+    def get_service(self, specifier: int | str) -> FakeService | None:
+        if isinstance(specifier, int):
+            return self.services.get(specifier)
+        specifier = normalize_uuid_str(specifier)
+        return next((service for service in self if service.uuid == specifier), None)
+
+    def get_characteristic(self, specifier: int | str) -> FakeCharacteristic | None:
+        if isinstance(specifier, int):
+            return self.characteristics.get(specifier)
+        specifier = normalize_uuid_str(specifier)
+        return next((char for char in self.characteristics.values() if char.uuid == specifier),
+                    None)
+
+
+class FakeRadio:
+    def __init__(  # noqa: PLR0913
+        self,
+        peripherals: Iterable[FakePeripheral] = (),
+        *,
+        connect_latency: Latency | None = None,
+        discovery_latency: Latency | None = None,
+        read_latency: Latency | None = None,
+        connect_failure_rate: float = 0.0,
+        adv_jitter: float = 0.01,
+        max_latencies: int = 100_000,
+        adapters: Iterable[str] = ("hci0",),
+        max_connections: int | None = None,
+    ) -> None:
+        self.peripherals = {peripheral.address: peripheral for peripheral in peripherals}
+        # Adapter name -> whether it is plugged in.
+        self.adapters = dict.fromkeys(adapters, True)
+        self.max_connections = max_connections
+        # No latency unless one is given.
+        self.connect_latency = connect_latency or constant(0.0)
+        self.discovery_latency = discovery_latency or constant(0.0)
+        self.read_latency = read_latency or constant(0.0)
+        self.connect_failure_rate = connect_failure_rate
+        self.adv_jitter = adv_jitter
+        self.advertisements = 0
+        self.notifications = 0
+        self.latencies: deque[float] = deque(maxlen=max_latencies)
+        self._clients: dict[str, set[FakeClient]] = {}
+        self._adapter_clients: dict[str, set[FakeClient]] = {name: set() for name in self.adapters}
+        radio = self
+        self.scanner_cls = type("FakeScanner", (FakeScanner,), {"radio": radio})
+        self.client_cls = type("FakeClient", (FakeClient,), {"radio": radio})
+
+    @classmethod
+    def with_sensors(cls, count: int, adv_interval: float = 0.1, notify_interval: float = 1.0,
+                     **kwargs: Any) -> Self:  # noqa: ANN401
+        return cls((environmental_sensor(index, adv_interval, notify_interval)
+                    for index in range(count)), **kwargs)
+
+    def reset_stats(self) -> None:
+        self.advertisements = 0
+        self.notifications = 0
+        self.latencies.clear()
+
+    def drop(self, address: str) -> None:
+        # Simulate the peripheral going out of range: every client gets disconnected.
+        for client in list(self._clients.get(address, ())):
+            client._disconnected()  # noqa: SLF001
+
+    def connections(self, adapter: str) -> int:
+        return len(self._adapter_clients.get(adapter, ()))
+
+    def remove_adapter(self, adapter: str) -> None:
+        # Simulate the adapter being unplugged: every connection it holds drops.
+        self.adapters[adapter] = False
+        for client in list(self._adapter_clients.get(adapter, ())):
+            client._disconnected()  # noqa: SLF001
+
+    def add_adapter(self, adapter: str) -> None:
+        self.adapters[adapter] = True
+        self._adapter_clients.setdefault(adapter, set())
+
+    def _adapter(self, kwargs: dict[str, Any]) -> str:
+        return kwargs.get("bluez", {}).get("adapter") or next(iter(self.adapters))
+
+    def _check_adapter(self, adapter: str) -> None:
+        if not self.adapters.get(adapter):
+            msg = f"adapter '{adapter}' not found"
+            raise BleakError(msg)
+
+    def _record(self, due: float) -> None:
+        self.latencies.append(time.perf_counter() - due)
+
+
+class FakeScanner:
+    radio: FakeRadio
+
+    def __init__(self, detection_callback: DetectionCallback | None = None,
+                 service_uuids: list[str] | None = None, **kwargs: Any) -> None:  # noqa: ANN401
+        self.adapter = self.radio._adapter(kwargs)  # noqa: SLF001
+        self._callback = detection_callback
+        self._service_uuids = (None if service_uuids is None
+                               else {normalize_uuid_str(uuid) for uuid in service_uuids})
+        self._seen: dict[str, tuple[BLEDevice, AdvertisementData]] = {}
+        self._task: asyncio.Task | None = None
+
+    async def __aenter__(self) -> Self:
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc_info: object) -> None:
+        await self.stop()
+
+    @property
+    def discovered_devices(self) -> list[BLEDevice]:
+        return [device for device, _ in self._seen.values()]
+
+    @property
+    def discovered_devices_and_advertisement_data(self) -> Discovered:
+        return dict(self._seen)
+
+    def register_detection_callback(self, callback: DetectionCallback | None) -> None:
+        self._callback = callback
+
+    async def start(self) -> None:
+        self.radio._check_adapter(self.adapter)  # noqa: SLF001
+        self._seen.clear()
+        self._task = asyncio.create_task(self._advertise())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
+
+    def _matches(self, peripheral: FakePeripheral) -> bool:
+        return self._service_uuids is None or not self._service_uuids.isdisjoint(
+            peripheral.service_uuids)
+
+    async def _advertise(self) -> None:
+        # One task for all peripherals: a heap of (next advertisement time, address).
+        radio = self.radio
+        now = time.perf_counter()
+        peripherals = [peripheral for peripheral in radio.peripherals.values()
+                       if self._matches(peripheral)]
+        devices = {peripheral.address: peripheral.device() for peripheral in peripherals}
+        heap = [(now + random.uniform(0, p.adv_interval), p.address)  # noqa: S311
+                for p in peripherals]
+        heapq.heapify(heap)
+        while heap and radio.adapters.get(self.adapter):
+            due, address = heap[0]
+            delay = due - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            peripheral = radio.peripherals[address]
+            adv = peripheral.advertisement(
+                peripheral.rssi + random.randint(-3, 3))  # noqa: S311
+            self._seen[address] = (devices[address], adv)
+            radio.advertisements += 1
+            if self._callback is not None:
+                self._callback(devices[address], adv)
+            radio._record(due)  # noqa: SLF001
+            interval = peripheral.adv_interval + random.uniform(0, radio.adv_jitter)  # noqa: S311
+            heapq.heapreplace(heap, (due + interval, address))
+
+    @classmethod
+    async def discover(cls, timeout: float = 5.0, *, return_adv: bool = False,  # noqa: ASYNC109
+                       **kwargs: Any) -> list[BLEDevice] | Discovered:  # noqa: ANN401
+        async with cls(**kwargs) as scanner:
+            await asyncio.sleep(timeout)
+        if return_adv:
+            return scanner.discovered_devices_and_advertisement_data
+        return scanner.discovered_devices
+
+    @classmethod
+    async def find_device_by_filter(cls, filterfunc: DetectionCallback, timeout: float = 10.0,  # noqa: ASYNC109
+                                    **kwargs: Any) -> BLEDevice | None:  # noqa: ANN401
+        loop = asyncio.get_running_loop()
+        found: asyncio.Future[BLEDevice] = loop.create_future()
+
+        def callback(device: BLEDevice, adv: AdvertisementData) -> None:
+            if not found.done() and filterfunc(device, adv):
+                found.set_result(device)
+
+        async with cls(callback, **kwargs):
+            try:
+                return await asyncio.wait_for(found, timeout)
+            except TimeoutError:
+                return None
+
+    @classmethod
+    async def find_device_by_address(cls, address: str, timeout: float = 10.0,  # noqa: ASYNC109
+                                     **kwargs: Any) -> BLEDevice | None:  # noqa: ANN401
+        return await cls.find_device_by_filter(
+            lambda device, adv: device.address.upper() == address.upper(),  # noqa: ARG005
+            timeout, **kwargs)
+
+
+class FakeClient:
+    radio: FakeRadio
+
+    def __init__(self, address_or_ble_device: BLEDevice | str,
+                 disconnected_callback: Callable[[FakeClient], None] | None = None,
+                 services: Iterable[str] | None = None, **kwargs: Any) -> None:  # noqa: ANN401
+        self.address = getattr(address_or_ble_device, "address", address_or_ble_device)
+        self.adapter = self.radio._adapter(kwargs)  # noqa: SLF001
+        self.mtu_size = 23
+        self._disconnected_callback = disconnected_callback
+        self._service_uuids = services
+        self._services: FakeServiceCollection | None = None
+        self._notify_tasks: dict[str, asyncio.Task] = {}
+        self._connected = False
+
+    async def __aenter__(self) -> Self:
+        await self.connect()
+        return self
+
+    async def __aexit__(self, *exc_info: object) -> None:
+        await self.disconnect()
+
+    @property
+    def is_connected(self) -> bool:
+        return self._connected
+
+    @property
+    def services(self) -> FakeServiceCollection:
+        if self._services is None:
+            msg = "Service Discovery has not been performed yet"
+            raise BleakError(msg)
+        return self._services
+
+    @property
+    def _peripheral(self) -> FakePeripheral:
+        peripheral = self.radio.peripherals.get(self.address)
+        if peripheral is None:
+            msg = f"Device with address {self.address} was not found."
+            raise BleakError(msg)
+        return peripheral
+
+    async def connect(self, **kwargs: Any) -> bool:  # noqa: ANN401, ARG002
+        if self._connected:
+            # As the BlueZ backend does.
+            msg = "Client is already connected"
+            raise BleakError(msg)
+        radio = self.radio
+        radio._check_adapter(self.adapter)  # noqa: SLF001
+        limit = radio.max_connections
+        if limit is not None and radio.connections(self.adapter) >= limit:
+            msg = f"No free connection slot on {self.adapter}"
+            raise BleakError(msg)
+        peripheral = self._peripheral
+        await asyncio.sleep(self.radio.connect_latency())
+        if random.random() < self.radio.connect_failure_rate:  # noqa: S311
+            msg = f"Connection to {self.address} failed"
+            raise BleakError(msg)
+        await asyncio.sleep(self.radio.discovery_latency())
+        self._services = FakeServiceCollection(peripheral, self._service_uuids)
+        radio._check_adapter(self.adapter)  # noqa: SLF001
+        self._connected = True
+        radio._clients.setdefault(self.address, set()).add(self)  # noqa: SLF001
+        radio._adapter_clients[self.adapter].add(self)  # noqa: SLF001
+        return True
+
+    async def disconnect(self) -> bool:
+        if self._connected:
+            self._disconnected()
+        return True
+
+    def _disconnected(self) -> None:
+        self._connected = False
+        self.radio._clients.get(self.address, set()).discard(self)  # noqa: SLF001
+        self.radio._adapter_clients.get(self.adapter, set()).discard(self)  # noqa: SLF001
+        for task in self._notify_tasks.values():
+            task.cancel()
+        self._notify_tasks.clear()
+        if self._disconnected_callback is not None:
+            self._disconnected_callback(self)
+
+    def _characteristic(self, specifier: FakeCharacteristic | int | str) -> FakeCharacteristic:
+        if not self._connected:
+            msg = "Not connected"
+            raise BleakError(msg)
+        if isinstance(specifier, FakeCharacteristic):
+            return specifier
+        char = self.services.get_characteristic(specifier)
+        if char is None:
+            msg = f"Characteristic {specifier} was not found!"
+            raise BleakError(msg)
+        return char
+
+    async def read_gatt_char(self, char_specifier: FakeCharacteristic | int | str,
+                             **kwargs: Any) -> bytearray:  # noqa: ANN401, ARG002
+        char = self._characteristic(char_specifier)
+        await asyncio.sleep(self.radio.read_latency())
+        return bytearray(self._peripheral.value(char.uuid))
+
+    async def write_gatt_char(self, char_specifier: FakeCharacteristic | int | str,
+                              data: bytes, response: bool | None = None) -> None:  # noqa: FBT001, ARG002
+        char = self._characteristic(char_specifier)
+        await asyncio.sleep(self.radio.read_latency())
+        self._peripheral.services[char.service_uuid][char.uuid] = bytes(data)
+
+    async def start_notify(self, char_specifier: FakeCharacteristic | int | str,
+                           callback: NotifyHandler, **kwargs: Any) -> None:  # noqa: ANN401, ARG002
+        char = self._characteristic(char_specifier)
+        if char.uuid in self._notify_tasks:
+            msg = "Notifications are already enabled"
+            raise BleakError(msg)
+        self._notify_tasks[char.uuid] = asyncio.create_task(self._notify(char, callback))
+
+    async def stop_notify(self, char_specifier: FakeCharacteristic | int | str) -> None:
+        char = self._characteristic(char_specifier)
+        task = self._notify_tasks.pop(char.uuid, None)
+        if task is not None:
+            task.cancel()
+
+    async def _notify(self, char: FakeCharacteristic, callback: NotifyHandler) -> None:
+        radio = self.radio
+        peripheral = self._peripheral
+        due = time.perf_counter() + random.uniform(0, peripheral.notify_interval)  # noqa: S311
+        while True:
+            delay = due - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            radio.notifications += 1
+            callback(char, bytearray(peripheral.value(char.uuid)))
+            radio._record(due)  # noqa: SLF001
+            due += peripheral.notify_interval
@@ -0,0 +1,243 @@
+# Declarative advertisement filters, compiled into a single predicate.
+#
+# A FilterRule lists the fields an advertisement must have: a service UUID (with
+# optionally a prefix of its service data), a manufacturer id (with optionally a
+# prefix of its data), a name prefix and an RSSI floor. AdvertisementFilter
+# compiles a list of rules once:
+#   - each rule becomes a closure that only checks the fields the rule sets;
+#   - rules are indexed by service UUID (or service data UUID), or else by
+#     manufacturer id, so an advertisement is usually rejected after one dict
+#     miss per service UUID and manufacturer id it carries, before any other
+#     field is looked at. Only the rules with neither (e.g. just a name prefix)
+#     are tried on every report.
+# The filter is a callable(device, adv) -> bool, so it can be passed to
+# BleakScanner.find_device_by_filter or a DeviceLocator; match() returns the name
+# of the rule that matched, and `hits` counts the matches of each rule.
+#
+# What the backend can filter by itself is pushed down by scanner_kwargs(): the
+# service UUIDs (when every rule has one), and on BlueZ the RSSI floor and name
+# pattern shared by every rule, and the or_patterns needed for passive scanning.
+
+from __future__ import annotations
+
+import uuid as _uuid
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Any
+
+from ble_metrics import metrics
+from ble_uuids import normalize_uuid
+from bleak.args.bluez import OrPattern
+from bleak.assigned_numbers import AdvertisementDataType
+
+if TYPE_CHECKING:
+    from collections.abc import Callable, Iterable
+
+    from bleak.backends.device import BLEDevice
+    from bleak.backends.scanner import AdvertisementData
+
+    Check = Callable[[BLEDevice, AdvertisementData], bool]
+
+
+@dataclass(slots=True, frozen=True)
+class FilterRule:
+    name: str
+    service_uuid: str | int | None = None
+    # Prefix of the service data of service_uuid.
+    service_data: bytes | None = None
+    manufacturer_id: int | None = None
+    # Prefix of the data of manufacturer_id (without the id).
+    manufacturer_data: bytes | None = None
+    name_prefix: str | None = None
+    min_rssi: int | None = None
+
+    def __post_init__(self) -> None:
+        if self.service_data is not None and self.service_uuid is None:
+            msg = f"rule {self.name!r}: service_data needs a service_uuid"
+            raise ValueError(msg)
+        if self.manufacturer_data is not None and self.manufacturer_id is None:
+            msg = f"rule {self.name!r}: manufacturer_data needs a manufacturer_id"
+            raise ValueError(msg)
+
+
+def _data_checks(rule: FilterRule) -> list[Check]:
+    # Manufacturer and service data checks. The field the rule is indexed by (service UUID,
+    # else manufacturer id) is known to be in the advertisement already.
+    checks: list[Check] = []
+    if rule.manufacturer_id is not None and (rule.service_uuid is not None
+                                             or rule.manufacturer_data is not None):
+        company = rule.manufacturer_id
+        manufacturer_data = rule.manufacturer_data or b""
+
+        def check_manufacturer(device: BLEDevice, adv: AdvertisementData) -> bool:  # noqa: ARG001
+            value = adv.manufacturer_data.get(company)
+            return value is not None and value.startswith(manufacturer_data)
+        checks.append(check_manufacturer)
+    if rule.service_data is not None:
+        service = normalize_uuid(rule.service_uuid)
+        service_data = rule.service_data
+        checks.append(lambda device, adv:  # noqa: ARG005
+                      adv.service_data[service].startswith(service_data))
+    return checks
+
+
+def _compile(rule: FilterRule) -> Check:
+    # Only the checks for the fields set, cheapest first.
+    checks: list[Check] = []
+    if rule.min_rssi is not None:
+        min_rssi = rule.min_rssi
+        checks.append(lambda device, adv: adv.rssi >= min_rssi)  # noqa: ARG005
+    if rule.name_prefix is not None:
+        prefix = rule.name_prefix
+        checks.append(lambda device, adv: (adv.local_name or device.name or "").startswith(prefix))
+    checks.extend(_data_checks(rule))
+
+    if not checks:
+        return lambda device, adv: True  # noqa: ARG005
+    if len(checks) == 1:
+        return checks[0]
+
+    def check(device: BLEDevice, adv: AdvertisementData) -> bool:
+        return all(c(device, adv) for c in checks)
+    return check
+
+
+class AdvertisementFilter:
+    def __init__(self, rules: Iterable[FilterRule]) -> None:
+        self.rules = list(rules)
+        names = [rule.name for rule in self.rules]
+        if len(set(names)) != len(names):
+            msg = "rule names must be unique"
+            raise ValueError(msg)
+        self.hits = dict.fromkeys(names, 0)
+        self.evaluated = 0
+        self._by_service: dict[str, list[tuple[str, Check]]] = {}
+        # Rules on service data: the UUID may only be in the service data, not in the list.
+        self._by_service_data: dict[str, list[tuple[str, Check]]] = {}
+        self._by_manufacturer: dict[int, list[tuple[str, Check]]] = {}
+        self._unindexed: list[tuple[str, Check]] = []
+        for rule in self.rules:
+            entry = (rule.name, _compile(rule))
+            if rule.service_data is not None:
+                self._by_service_data.setdefault(normalize_uuid(rule.service_uuid),
+                                                 []).append(entry)
+            elif rule.service_uuid is not None:
+                self._by_service.setdefault(normalize_uuid(rule.service_uuid), []).append(entry)
+            elif rule.manufacturer_id is not None:
+                self._by_manufacturer.setdefault(rule.manufacturer_id, []).append(entry)
+            else:
+                self._unindexed.append(entry)
+
+    @classmethod
+    def from_spec(cls, spec: Iterable[dict[str, Any]]) -> AdvertisementFilter:
+        # e.g. [{"name": "sensor", "service_uuid": 0x181A, "min_rssi": -80}, ...]
+        return cls(FilterRule(**rule) for rule in spec)
+
+    def __call__(self, device: BLEDevice, adv: AdvertisementData) -> bool:
+        return self.match(device, adv) is not None
+
+    def match(self, device: BLEDevice, adv: AdvertisementData) -> str | None:
+        self.evaluated += 1
+        name = self._lookup(self._by_service, adv.service_uuids, device, adv)
+        if name is None and self._by_service_data:
+            name = self._lookup(self._by_service_data, adv.service_data, device, adv)
+        if name is None and self._by_manufacturer:
+            name = self._lookup(self._by_manufacturer, adv.manufacturer_data, device, adv)
+        if name is None and self._unindexed:
+            name = self._first(self._unindexed, device, adv)
+        return name
+
+    def _lookup(self, index: dict[Any, list[tuple[str, Check]]], keys: Iterable[Any],
+                device: BLEDevice, adv: AdvertisementData) -> str | None:
+        # First rule matching among those indexed by the keys the advertisement carries.
+        for key in keys:
+            candidates = index.get(key)
+            if candidates is not None:
+                name = self._first(candidates, device, adv)
+                if name is not None:
+                    return name
+        return None
+
+    def _first(self, candidates: list[tuple[str, Check]], device: BLEDevice,
+               adv: AdvertisementData) -> str | None:
+        for name, check in candidates:
+            if check(device, adv):
+                self.hits[name] += 1
+                metrics.inc("filter_hits", rule=name)
+                return name
+        return None
+
+    def service_uuids(self) -> list[str] | None:
+        # None unless every rule needs a service UUID: filtering on the others would drop
+        # the matches of the rules without one.
+        if self._by_manufacturer or self._unindexed:
+            return None
+        return list(self._by_service.keys() | self._by_service_data.keys())
+
+    def bluez_filters(self) -> dict[str, Any]:
+        # SetDiscoveryFilter applies to every report, so only what all rules share.
+        filters: dict[str, Any] = {}
+        floors = [rule.min_rssi for rule in self.rules]
+        if floors and None not in floors:
+            filters["RSSI"] = min(floors)
+        prefixes = {rule.name_prefix for rule in self.rules}
+        if len(prefixes) == 1 and None not in prefixes:
+            filters["Pattern"] = prefixes.pop()
+        return filters
+
+    def or_patterns(self) -> list[OrPattern] | None:
+        # BlueZ passive scanning needs at least one pattern, and reports what matches any of
+        # them; None if a rule can't be expressed as a pattern (e.g. only an RSSI floor).
+        patterns: list[OrPattern] = []
+        for rule in self.rules:
+            rule_patterns = _or_patterns(rule)
+            if not rule_patterns:
+                return None
+            patterns.extend(rule_patterns)
+        return patterns or None
+
+    def scanner_kwargs(self) -> dict[str, Any]:
+        kwargs: dict[str, Any] = {"service_uuids": self.service_uuids()}
+        bluez: dict[str, Any] = {}
+        filters = self.bluez_filters()
+        if filters:
+            bluez["filters"] = filters
+        patterns = self.or_patterns()
+        if patterns is not None:
+            bluez["or_patterns"] = patterns
+        if bluez:
+            kwargs["bluez"] = bluez
+        return kwargs
+
+
+def _uuid_bytes(service: str) -> tuple[bytes, bool]:
+    # Advertised form (little endian) of a UUID, and whether it is a 16-bit one.
+    uuid = normalize_uuid(service)
+    short = uuid.short
+    if short is not None and short <= 0xFFFF:  # noqa: PLR2004
+        return short.to_bytes(2, "little"), True
+    return _uuid.UUID(uuid).bytes[::-1], False
+
+
+def _or_patterns(rule: FilterRule) -> list[OrPattern]:
+    # Patterns match at a fixed position of an AD field, so a service UUID is only found
+    # when it is the first of its list (as in most single-service advertisements).
+    ad_type = AdvertisementDataType
+    if rule.manufacturer_id is not None:
+        return [OrPattern(0, ad_type.MANUFACTURER_SPECIFIC_DATA,
+                          rule.manufacturer_id.to_bytes(2, "little")
+                          + (rule.manufacturer_data or b""))]
+    if rule.service_uuid is not None:
+        value, is_short = _uuid_bytes(rule.service_uuid)
+        if rule.service_data is not None:
+            data_type = ad_type.SERVICE_DATA_UUID16 if is_short else ad_type.SERVICE_DATA_UUID128
+            return [OrPattern(0, data_type, value + rule.service_data)]
+        if is_short:
+            return [OrPattern(0, ad_type.COMPLETE_LIST_SERVICE_UUID16, value),
+                    OrPattern(0, ad_type.INCOMPLETE_LIST_SERVICE_UUID16, value)]
+        return [OrPattern(0, ad_type.COMPLETE_LIST_SERVICE_UUID128, value),
+                OrPattern(0, ad_type.INCOMPLETE_LIST_SERVICE_UUID128, value)]
+    if rule.name_prefix is not None:
+        prefix = rule.name_prefix.encode()
+        return [OrPattern(0, ad_type.COMPLETE_LOCAL_NAME, prefix),
+                OrPattern(0, ad_type.SHORTENED_LOCAL_NAME, prefix)]
+    return []
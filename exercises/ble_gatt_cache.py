@@ -0,0 +1,191 @@
+# On-disk cache of the GATT tree (services, characteristics and descriptors) of
+# the peripherals we connected to, keyed by address.
+#
+# Bleak always runs service discovery while connecting, but it can be limited to
+# a subset of services (BleakClient(services=...)), which is what most of the
+# time is spent on. GattCache remembers which services hold the characteristics
+# we use and their handles, so reconnecting only discovers those services and
+# characteristics are resolved by handle. An entry is dropped, and the tree
+# stored again, when the GATT database hash changes or a cached handle fails.
+# The file is written by refresh() and save(), not on every change: call save()
+# once done with a connection to keep what read() learned.
+#
+# The Generic Attribute service, which holds the database hash, is always part of
+# the services to discover. When a characteristic isn't in the services that were
+# discovered (the cached tree was wrong), read() invalidates the entry and raises
+# StaleCacheError: reconnect, with a full discovery this time, and read again.
+
+from __future__ import annotations
+
+import hashlib
+import json
+from pathlib import Path
+from typing import TYPE_CHECKING, Any
+
+from bleak.exc import BleakCharacteristicNotFoundError, BleakError
+
+if TYPE_CHECKING:
+    from bleak import BleakClient
+    from bleak.backends.service import BleakGATTServiceCollection
+
+# org.bluetooth.service.generic_attribute, which holds the database hash.
+GENERIC_ATTRIBUTE_UUID = "00001801-0000-1000-8000-00805f9b34fb"
+# org.bluetooth.characteristic.gatt.database_hash
+DATABASE_HASH_UUID = "00002b2a-0000-1000-8000-00805f9b34fb"
+DEFAULT_CACHE_PATH = Path("~/.cache/pyconpt2024-ble/gatt_cache.json").expanduser()
+
+
+def services_to_dict(services: BleakGATTServiceCollection) -> dict[str, Any]:
+    return {
+        service.uuid: {
+            "handle": service.handle,
+            "characteristics": {
+                char.uuid: {
+                    "handle": char.handle,
+                    "properties": list(char.properties),
+                    "descriptors": {desc.uuid: desc.handle for desc in char.descriptors},
+                }
+                for char in service.characteristics
+            },
+        }
+        for service in services
+    }
+
+
+class StaleCacheError(BleakError):
+    pass
+
+
+def tree_digest(tree: dict[str, Any]) -> str:
+    # Used as version when the peripheral has no database hash characteristic.
+    return hashlib.sha256(json.dumps(tree, sort_keys=True).encode()).hexdigest()
+
+
+class GattCache:
+    def __init__(self, path: Path = DEFAULT_CACHE_PATH) -> None:
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self._dirty = False
+        self._entries: dict[str, dict[str, Any]] = self._load()
+        # address -> {characteristic uuid: (service uuid, handle)}
+        self._handles = {address: self._index(entry) for address, entry in self._entries.items()}
+
+    def _load(self) -> dict[str, dict[str, Any]]:
+        try:
+            with self.path.open() as fp:
+                return json.load(fp)
+        except (OSError, ValueError):
+            return {}
+
+    def save(self) -> None:
+        if not self._dirty:
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix(".tmp")
+        with tmp.open("w") as fp:
+            json.dump(self._entries, fp)
+        tmp.replace(self.path)
+        self._dirty = False
+
+    @staticmethod
+    def _index(entry: dict[str, Any]) -> dict[str, tuple[str, int]]:
+        return {char_uuid: (service_uuid, char["handle"])
+                for service_uuid, service in entry["services"].items()
+                for char_uuid, char in service["characteristics"].items()}
+
+    def __contains__(self, address: str) -> bool:
+        return address in self._entries
+
+    def services(self, address: str, char_uuids: list[str] | None = None) -> list[str] | None:
+        # Service UUIDs to pass to BleakClient(services=...) so only those are discovered.
+        handles = self._handles.get(address)
+        if handles is None:
+            return None
+        if char_uuids is None:
+            services = set(self._entries[address]["services"])
+        else:
+            try:
+                services = {handles[char_uuid][0] for char_uuid in char_uuids}
+            except KeyError:
+                return None
+        # Always discovered, so refresh() can check the database hash.
+        return sorted(services | {GENERIC_ATTRIBUTE_UUID})
+
+    def handle(self, address: str, char_uuid: str) -> int | None:
+        entry = self._handles.get(address)
+        if entry is not None and char_uuid in entry:
+            self.hits += 1
+            return entry[char_uuid][1]
+        self.misses += 1
+        return None
+
+    def store(self, address: str, services: BleakGATTServiceCollection,
+              db_hash: str | None = None) -> None:
+        tree = services_to_dict(services)
+        entry = self._entries.get(address)
+        if entry is not None:
+            # Discovery may have been limited to a few services; keep the others.
+            tree = {**entry["services"], **tree}
+            if db_hash is None:
+                db_hash = entry["hash"]
+        self._entries[address] = {"hash": db_hash or tree_digest(tree), "services": tree}
+        self._handles[address] = self._index(self._entries[address])
+        self._dirty = True
+
+    def invalidate(self, address: str) -> None:
+        if self._entries.pop(address, None) is not None:
+            self._handles.pop(address, None)
+            self.invalidations += 1
+            self._dirty = True
+
+    @staticmethod
+    async def read_db_hash(client: BleakClient) -> str | None:
+        if client.services.get_characteristic(DATABASE_HASH_UUID) is None:
+            return None
+        return (await client.read_gatt_char(DATABASE_HASH_UUID)).hex()
+
+    async def refresh(self, client: BleakClient) -> bool:
+        # Call after connecting. Returns True when the cached entry is still valid.
+        db_hash = await self.read_db_hash(client)
+
+        entry = self._entries.get(client.address)
+        if entry is not None:
+            if db_hash is not None:
+                valid = entry["hash"] == db_hash
+            else:
+                # No database hash: compare what was discovered with the cached tree.
+                cached = entry["services"]
+                valid = all(cached.get(uuid) == service
+                            for uuid, service in services_to_dict(client.services).items())
+            if valid:
+                return True
+            self.invalidate(client.address)
+        self.store(client.address, client.services, db_hash)
+        self.save()
+        return False
+
+    async def read(self, client: BleakClient, char_uuid: str) -> bytearray:
+        handle = self.handle(client.address, char_uuid)
+        if handle is not None:
+            try:
+                return await client.read_gatt_char(handle)
+            except BleakError:
+                # The peripheral changed its database: forget it and fall back to the UUID.
+                self.invalidate(client.address)
+
+        try:
+            value = await client.read_gatt_char(char_uuid)
+        except BleakCharacteristicNotFoundError as exc:
+            # Discovery was limited to the services of a wrong cached tree.
+            self.invalidate(client.address)
+            self.save()
+            msg = f"{char_uuid} not in the discovered services, reconnect to discover all"
+            raise StaleCacheError(msg) from exc
+        # store() keeps the hash of a cached entry; after an invalidation, read it again.
+        db_hash = None
+        if client.address not in self._entries:
+            db_hash = await self.read_db_hash(client)
+        self.store(client.address, client.services, db_hash)
+        return value
@@ -0,0 +1,128 @@
+# Download the history of samples kept by a peripheral (Pico or exercise 10).
+#
+# The protocol lives in rpi_pico/gatt_history.py, shared with the firmware and the
+# server. download_history() asks for everything after `start` and collects the
+# chunks until the one that ends the transfer, which also maps the peripheral
+# clock to time.time(). Keep HistoryDownload.next_sequence and pass it as `start`
+# next time to only get the new samples: a download that was interrupted just
+# starts again from there.
+#
+# The chunks are sized for the MTU given in the request. bleak's mtu_size is
+# always 23 on BlueZ (3 samples per chunk), so connection_mtu() takes it from the
+# characteristics instead (max_write_without_response_size + 3), which BlueZ
+# reports from version 5.62 (older versions still give 23). Pass `mtu` to
+# download_history() to override it.
+
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import sys
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+_RPI_PICO_DIR = str(Path(__file__).resolve().parent.parent / "rpi_pico")
+if _RPI_PICO_DIR not in sys.path:
+    sys.path.append(_RPI_PICO_DIR)
+
+from gatt_history import (  # noqa: E402
+    CONTROL_SIZE,
+    DEFAULT_MTU,
+    HISTORY_CONTROL_UUID,
+    HISTORY_DATA_UUID,
+    OP_START,
+    OP_STOP,
+    TICKS_PERIOD,
+    History,
+    chunk_capacity,
+    pack_control,
+    ticks_diff,
+    unpack_chunk,
+    unpack_control,
+    unpack_status,
+)
+
+if TYPE_CHECKING:
+    from bleak import BleakClient
+    from bleak.backends.characteristic import BleakGATTCharacteristic
+
+__all__ = ["CONTROL_SIZE", "DEFAULT_MTU", "HISTORY_CONTROL_UUID", "HISTORY_DATA_UUID", "OP_START",
+           "OP_STOP", "TICKS_PERIOD", "History", "HistoryDownload", "chunk_capacity",
+           "connection_mtu", "download_history", "pack_control", "unpack_chunk",
+           "unpack_control", "unpack_status"]
+
+# ATT notification/write command header: opcode (1 byte) + attribute handle (2 bytes).
+_ATT_HEADER_SIZE = 3
+
+
+@dataclass(slots=True)
+class HistoryDownload:
+    # Timestamps in seconds (time.time()), values in 0.01 degC.
+    timestamps: list[float] = field(default_factory=list)
+    values: list[int] = field(default_factory=list)
+    next_sequence: int = 0
+    # Samples overwritten on the peripheral before they could be downloaded.
+    lost: int = 0
+    chunks: int = 0
+
+
+def connection_mtu(client: BleakClient) -> int:
+    char = client.services.get_characteristic(HISTORY_CONTROL_UUID)
+    if char is None:
+        return DEFAULT_MTU
+    return char.max_write_without_response_size + _ATT_HEADER_SIZE
+
+
+async def download_history(client: BleakClient, start: int = 0, *, mtu: int | None = None,
+                           timeout: float = 10.0) -> HistoryDownload:  # noqa: ASYNC109
+    # `timeout` is the longest wait for the next chunk.
+    if mtu is None:
+        mtu = connection_mtu(client)
+    _, total = unpack_status(await client.read_gatt_char(HISTORY_CONTROL_UUID))
+    if start > total:
+        # The peripheral restarted: its sequences start from 0 again.
+        start = 0
+    result = HistoryDownload(next_sequence=start)
+    chunks: asyncio.Queue[tuple[bytes, float]] = asyncio.Queue()
+
+    def chunk_received(characteristic: BleakGATTCharacteristic,  # noqa: ARG001
+                       data: bytearray) -> None:
+        chunks.put_nowait((bytes(data), time.time()))
+
+    # Device clock (ms) of every sample, converted once the clock offset is known.
+    device_times: list[int] = []
+    await client.start_notify(HISTORY_DATA_UUID, chunk_received)
+    try:
+        await client.write_gatt_char(HISTORY_CONTROL_UUID,
+                                     pack_control(OP_START, start, mtu),
+                                     response=True)
+        while True:
+            data, received_at = await asyncio.wait_for(chunks.get(), timeout)
+            sequence, first_ms, samples = unpack_chunk(data)
+            result.chunks += 1
+            if sequence > result.next_sequence:
+                result.lost += sequence - result.next_sequence
+            if not samples:
+                result.next_sequence = max(result.next_sequence, sequence)
+                break
+            # A chunk meant for another central (bless notifies every subscriber) may
+            # overlap what was already received.
+            skip = max(result.next_sequence - sequence, 0)
+            for delta, value in samples[skip:]:
+                device_times.append(first_ms + delta)
+                result.values.append(value)
+            result.next_sequence = max(result.next_sequence, sequence + len(samples))
+    except BaseException:
+        with contextlib.suppress(Exception):
+            await client.write_gatt_char(HISTORY_CONTROL_UUID, pack_control(OP_STOP),
+                                         response=True)
+        raise
+    finally:
+        with contextlib.suppress(Exception):
+            await client.stop_notify(HISTORY_DATA_UUID)
+
+    # The last chunk carries the device clock when it was sent.
+    result.timestamps = [received_at - ticks_diff(first_ms, t) / 1000 for t in device_times]
+    return result
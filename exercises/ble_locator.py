@@ -0,0 +1,139 @@
+# Locate peripherals without waiting for a full scan window.
+#
+# DeviceLocator stops scanning as soon as every target has been matched, so the
+# time to find a device follows its advertising interval instead of the scan
+# timeout. Several targets can be located in a single scan pass. The last
+# BLEDevice found for each target is remembered: connect() tries that device
+# while a live scan runs in the background, and connects to what the scan finds
+# if that's faster or the cached device cannot be reached. The client it returns
+# is already connected: disconnect it when done (don't use it with `async with`).
+
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import time
+from typing import TYPE_CHECKING, Any
+
+from ble_metrics import metrics
+from ble_uuids import normalize_uuid
+from bleak import BleakClient, BleakScanner
+
+if TYPE_CHECKING:
+    from collections.abc import Callable
+
+    from bleak.backends.device import BLEDevice
+    from bleak.backends.scanner import AdvertisementData
+
+    Predicate = Callable[[BLEDevice, AdvertisementData], bool]
+
+
+def by_address(address: str) -> Predicate:
+    address = address.upper()
+    return lambda device, adv: device.address.upper() == address  # noqa: ARG005
+
+
+def by_service(service_uuid: str) -> Predicate:
+    service_uuid = normalize_uuid(service_uuid)
+    return lambda device, adv: service_uuid in adv.service_uuids  # noqa: ARG005
+
+
+class DeviceLocator:
+    def __init__(self, scanner_cls: type[BleakScanner] = BleakScanner,
+                 client_cls: type[BleakClient] = BleakClient) -> None:
+        self.last_known: dict[str, BLEDevice] = {}
+        self._scanner_cls = scanner_cls
+        self._client_cls = client_cls
+
+    async def find_many(self, targets: dict[str, Predicate], timeout: float = 10.0,  # noqa: ASYNC109
+                        service_uuids: list[str] | None = None) -> dict[str, BLEDevice]:
+        # Returns the targets found before the timeout, keyed like `targets`.
+        found: dict[str, BLEDevice] = {}
+        pending = dict(targets)
+        all_found = asyncio.Event()
+        start = time.perf_counter()
+
+        def detection_callback(device: BLEDevice, adv: AdvertisementData) -> None:
+            for key, predicate in list(pending.items()):
+                if predicate(device, adv):
+                    found[key] = self.last_known[key] = device
+                    del pending[key]
+                    metrics.observe("scan_to_find", time.perf_counter() - start)
+            if not pending:
+                all_found.set()
+
+        if pending:
+            async with self._scanner_cls(detection_callback, service_uuids):
+                with contextlib.suppress(TimeoutError):
+                    await asyncio.wait_for(all_found.wait(), timeout)
+        return found
+
+    async def find(self, key: str, predicate: Predicate, timeout: float = 10.0,  # noqa: ASYNC109
+                   service_uuids: list[str] | None = None) -> BLEDevice | None:
+        found = await self.find_many({key: predicate}, timeout, service_uuids)
+        return found.get(key)
+
+    async def connect(self, key: str, predicate: Predicate, timeout: float = 10.0,  # noqa: ASYNC109
+                      cached_timeout: float = 5.0, **client_kwargs: Any) -> BleakClient | None:  # noqa: ANN401
+        # Races a connection to the last known device against a scan (and a connection to
+        # what it finds); the first connection made wins and the other attempt is
+        # cancelled. A scan that finds the device being connected to waits for that attempt.
+        scan = asyncio.create_task(self.find(key, predicate, timeout))
+        cached = self.last_known.get(key)
+        cached_attempt = scanned_attempt = winner = None
+        if cached is not None:
+            cached_attempt = asyncio.create_task(
+                self._connect_device(cached, cached_timeout, client_kwargs))
+        pending = {task for task in (scan, cached_attempt) if task is not None}
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                if cached_attempt in done:
+                    if cached_attempt.exception() is None:
+                        winner = cached_attempt
+                        return cached_attempt.result()
+                    # Stale device (e.g. it changed address or the backend forgot it).
+                    if self.last_known.get(key) is cached:
+                        del self.last_known[key]
+                if scanned_attempt in done:
+                    winner = scanned_attempt
+                    return scanned_attempt.result()
+
+                device = scan.result() if scan.done() else None
+                cached_pending = cached_attempt is not None and not cached_attempt.done()
+                if device is not None and scanned_attempt is None and not (
+                        cached_pending and device.address == cached.address):
+                    scanned_attempt = asyncio.create_task(
+                        self._connect_device(device, None, client_kwargs))
+                    pending.add(scanned_attempt)
+            return None
+        finally:
+            await self._cancel_losers(winner, scan, cached_attempt, scanned_attempt)
+
+    @staticmethod
+    async def _cancel_losers(winner: asyncio.Task | None, scan: asyncio.Task,
+                             *attempts: asyncio.Task | None) -> None:
+        losers = [task for task in (scan, *attempts) if task is not None and task is not winner]
+        for task in losers:
+            task.cancel()
+        await asyncio.gather(*losers, return_exceptions=True)
+        # Both connections may have been made in the same iteration.
+        for task in attempts:
+            if task in losers and not task.cancelled() and task.exception() is None:
+                with contextlib.suppress(Exception):
+                    await task.result().disconnect()
+
+    async def _connect_device(self, device: BLEDevice, timeout: float | None,  # noqa: ASYNC109
+                              client_kwargs: dict[str, Any]) -> BleakClient:
+        client = self._client_cls(device, **client_kwargs)
+        try:
+            if timeout is None:
+                await client.connect()
+            else:
+                await asyncio.wait_for(client.connect(), timeout)
+        except BaseException:
+            # Failed, timed out or lost the race: don't leave a half-open connection behind.
+            with contextlib.suppress(Exception):
+                await client.disconnect()
+            raise
+        return client
@@ -0,0 +1,225 @@
+# Latency histograms and counters for the central and server code.
+#
+# `metrics` is disabled unless BLE_METRICS=1 is set (or metrics.enabled is set
+# to True), and then every hook returns after a single attribute check. When
+# enabled, durations are recorded into HDR-style histograms: each power of two
+# of microseconds is split into 2**precision sub-buckets, so any percentile is
+# within 1/2**precision (~3% by default) of the true value, with a fixed,
+# small amount of memory however many values are recorded.
+#
+# instrument_client(BleakClient) returns a client class that times connect()
+# (labelled by full or cached service discovery), read_gatt_char() and the time
+# between notifications; it can be passed as client_cls to the helpers. The
+# recorded values are exported with metrics.prometheus() (text format) or
+# metrics.snapshot() (a dict, e.g. for json.dumps).
+
+from __future__ import annotations
+
+import contextlib
+import functools
+import os
+import time
+from typing import TYPE_CHECKING, Any, ParamSpec, TypeVar
+
+if TYPE_CHECKING:
+    from collections.abc import Callable, Iterator
+
+    from bleak import BleakClient
+    from bleak.backends.characteristic import BleakGATTCharacteristic
+
+    Labels = tuple[tuple[str, str], ...]
+
+P = ParamSpec("P")
+R = TypeVar("R")
+
+QUANTILES = (0.5, 0.9, 0.99, 0.999)
+
+
+class Histogram:
+    def __init__(self, precision: int = 5, unit: float = 1e-6) -> None:
+        self.precision = precision
+        self.unit = unit
+        self.count = 0
+        self.sum = 0.0
+        self.min = float("inf")
+        self.max = 0.0
+        self._counts: dict[int, int] = {}
+
+    def _index(self, value: int) -> int:
+        # Values below 2**(precision + 1) units are exact; above, the bucket
+        # width doubles with every power of two.
+        shift = max(value.bit_length() - self.precision - 1, 0)
+        return (shift << self.precision) + (value >> shift)
+
+    def _upper_bound(self, index: int) -> int:
+        shift = max((index >> self.precision) - 1, 0)
+        return (index - (shift << self.precision) + 1) << shift
+
+    def record(self, value: float) -> None:
+        index = self._index(max(int(value / self.unit), 0))
+        self._counts[index] = self._counts.get(index, 0) + 1
+        self.count += 1
+        self.sum += value
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+
+    def percentile(self, fraction: float) -> float:
+        if not self.count:
+            return 0.0
+        rank = fraction * self.count
+        seen = 0
+        for index in sorted(self._counts):
+            seen += self._counts[index]
+            if seen >= rank:
+                return min(self._upper_bound(index) * self.unit, self.max)
+        return self.max
+
+    def snapshot(self) -> dict[str, Any]:
+        return {"count": self.count,
+                "sum": self.sum,
+                "min": self.min if self.count else 0.0,
+                "max": self.max,
+                "mean": self.sum / self.count if self.count else 0.0,
+                **{f"p{q * 100:g}": self.percentile(q) for q in QUANTILES}}
+
+
+class Metrics:
+    def __init__(self, *, enabled: bool = False, prefix: str = "ble", precision: int = 5) -> None:
+        self.enabled = enabled
+        self.prefix = prefix
+        self.precision = precision
+        self._histograms: dict[tuple[str, Labels], Histogram] = {}
+        self._counters: dict[tuple[str, Labels], float] = {}
+
+    def reset(self) -> None:
+        self._histograms.clear()
+        self._counters.clear()
+
+    def observe(self, name: str, value: float, **labels: str) -> None:
+        if not self.enabled:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        histogram = self._histograms.get(key)
+        if histogram is None:
+            histogram = self._histograms[key] = Histogram(self.precision)
+        histogram.record(value)
+
+    def inc(self, name: str, value: float = 1, **labels: str) -> None:
+        if not self.enabled:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        self._counters[key] = self._counters.get(key, 0) + value
+
+    @contextlib.contextmanager
+    def timer(self, name: str, **labels: str) -> Iterator[None]:
+        if not self.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def timed(self, name: str, **labels: str) -> Callable[[Callable[P, R]], Callable[P, R]]:
+        # Decorator for plain (not async) functions, e.g. the bless request callbacks.
+        def decorator(func: Callable[P, R]) -> Callable[P, R]:
+            @functools.wraps(func)
+            def wrapper(*args: P.args, **kwargs: P.kwargs) -> R:
+                if not self.enabled:
+                    return func(*args, **kwargs)
+                start = time.perf_counter()
+                try:
+                    return func(*args, **kwargs)
+                finally:
+                    self.observe(name, time.perf_counter() - start, **labels)
+            return wrapper
+        return decorator
+
+    def snapshot(self) -> dict[str, Any]:
+        def key(name: str, labels: Labels) -> str:
+            return name + "".join(f",{label}={value}" for label, value in labels)
+
+        return {"histograms": {key(*k): h.snapshot() for k, h in self._histograms.items()},
+                "counters": {key(*k): v for k, v in self._counters.items()}}
+
+    def prometheus(self) -> str:
+        # Histograms are exported as summaries (quantiles, _sum and _count).
+        def labels_text(labels: Labels, **extra: str) -> str:
+            pairs = [*labels, *extra.items()]
+            if not pairs:
+                return ""
+            return "{" + ",".join(f'{label}="{value}"' for label, value in pairs) + "}"
+
+        lines = []
+        for name in sorted({name for name, _ in self._histograms}):
+            metric = f"{self.prefix}_{name}_seconds"
+            lines.append(f"# TYPE {metric} summary")
+            for (hname, labels), histogram in self._histograms.items():
+                if hname != name:
+                    continue
+                lines.extend(f"{metric}{labels_text(labels, quantile=f'{q:g}')} "
+                             f"{histogram.percentile(q):.6g}" for q in QUANTILES)
+                lines.append(f"{metric}_sum{labels_text(labels)} {histogram.sum:.6g}")
+                lines.append(f"{metric}_count{labels_text(labels)} {histogram.count}")
+        for name in sorted({name for name, _ in self._counters}):
+            metric = f"{self.prefix}_{name}_total"
+            lines.append(f"# TYPE {metric} counter")
+            lines.extend(f"{metric}{labels_text(labels)} {value:g}"
+                         for (cname, labels), value in self._counters.items() if cname == name)
+        return "\n".join(lines) + "\n"
+
+
+metrics = Metrics(enabled=os.environ.get("BLE_METRICS") == "1")
+
+
+def instrument_client(client_cls: type[BleakClient], registry: Metrics = metrics) -> type:
+    # bleak discovers the services inside connect(); comparing the connect time with
+    # full discovery and with cached services (services=...) shows what discovery costs.
+    class InstrumentedClient(client_cls):
+        def __init__(self, *args: Any, **kwargs: Any) -> None:  # noqa: ANN401
+            super().__init__(*args, **kwargs)
+            self._discovery = "full" if kwargs.get("services") is None else "cached"
+
+        async def connect(self, **kwargs: Any) -> bool:  # noqa: ANN401
+            if not registry.enabled:
+                return await super().connect(**kwargs)
+            start = time.perf_counter()
+            try:
+                return await super().connect(**kwargs)
+            except Exception:
+                registry.inc("connect_errors")
+                raise
+            finally:
+                registry.observe("connect", time.perf_counter() - start,
+                                 discovery=self._discovery)
+
+        async def read_gatt_char(self, char_specifier: Any, **kwargs: Any) -> bytearray:  # noqa: ANN401
+            if not registry.enabled:
+                return await super().read_gatt_char(char_specifier, **kwargs)
+            start = time.perf_counter()
+            try:
+                return await super().read_gatt_char(char_specifier, **kwargs)
+            finally:
+                registry.observe("read_gatt_char", time.perf_counter() - start)
+
+        async def start_notify(self, char_specifier: Any,  # noqa: ANN401
+                               callback: Callable[[BleakGATTCharacteristic, bytearray], None],
+                               **kwargs: Any) -> None:  # noqa: ANN401
+            last = None
+
+            def timed_callback(characteristic: BleakGATTCharacteristic,
+                               data: bytearray) -> None:
+                nonlocal last
+                if registry.enabled:
+                    now = time.perf_counter()
+                    if last is not None:
+                        registry.observe("notify_interval", now - last)
+                    last = now
+                    registry.inc("notifications")
+                callback(characteristic, data)
+
+            await super().start_notify(char_specifier, timed_callback, **kwargs)
+
+    InstrumentedClient.__name__ = f"Instrumented{client_cls.__name__}"
+    return InstrumentedClient
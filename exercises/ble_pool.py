@@ -0,0 +1,207 @@
+# Helpers for talking to several BLE peripherals at the same time.
+#
+# The exercises 05-09 connect to a single peripheral. CentralPool discovers every
+# peripheral advertising a given service, connects to all of them (at most
+# `concurrency` connection attempts/GATT operations in flight) and fans out reads
+# and notification subscriptions across the pool.
+#
+# The scanner and client classes can be replaced, so the pool can be driven by a
+# fake backend instead of a real radio. `adapter` (e.g. "hci1") scans and
+# connects through that adapter instead of the default one (BlueZ only).
+
+from __future__ import annotations
+
+import asyncio
+import time
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Self
+
+from ble_uuids import normalize_uuid
+from bleak import BleakClient, BleakScanner
+
+if TYPE_CHECKING:
+    from collections.abc import Callable, Iterable
+
+    from bleak.backends.characteristic import BleakGATTCharacteristic
+    from bleak.backends.device import BLEDevice
+
+    NotifyHandler = Callable[[str, BleakGATTCharacteristic, bytearray], None]
+
+ENVIRONMENTAL_SENSING_UUID = "0000181a-0000-1000-8000-00805f9b34fb"
+
+
+@dataclass
+class DeviceStats:
+    address: str
+    connected_at: float = 0.0
+    connect_time: float = 0.0
+    reads: int = 0
+    read_time: float = 0.0
+    notifications: int = 0
+    bytes_received: int = 0
+    errors: int = 0
+
+    def elapsed(self, now: float | None = None) -> float:
+        if not self.connected_at:
+            return 0.0
+        return (now or time.monotonic()) - self.connected_at
+
+    def throughput(self, now: float | None = None) -> float:
+        # Bytes per second received (reads + notifications) since the connection was made.
+        elapsed = self.elapsed(now)
+        return self.bytes_received / elapsed if elapsed > 0 else 0.0
+
+    def mean_read_latency(self) -> float:
+        return self.read_time / self.reads if self.reads else 0.0
+
+
+@dataclass
+class PoolStats:
+    devices: dict[str, DeviceStats] = field(default_factory=dict)
+
+    def device(self, address: str) -> DeviceStats:
+        stats = self.devices.get(address)
+        if stats is None:
+            stats = self.devices[address] = DeviceStats(address)
+        return stats
+
+    def report(self) -> str:
+        now = time.monotonic()
+        lines = []
+        total_bytes = 0
+        for stats in self.devices.values():
+            total_bytes += stats.bytes_received
+            lines.append(
+                f"{stats.address}: connect={stats.connect_time * 1000:.0f}ms "
+                f"reads={stats.reads} (avg {stats.mean_read_latency() * 1000:.1f}ms) "
+                f"notifications={stats.notifications} errors={stats.errors} "
+                f"throughput={stats.throughput(now):.1f}B/s")
+        lines.append(f"total: {len(self.devices)} devices, {total_bytes} bytes")
+        return "\n".join(lines)
+
+
+class CentralPool:
+    def __init__(  # noqa: PLR0913
+        self,
+        service_uuid: str = ENVIRONMENTAL_SENSING_UUID,
+        concurrency: int = 5,
+        scan_timeout: float = 5.0,
+        *,
+        scanner_cls: type[BleakScanner] = BleakScanner,
+        client_cls: type[BleakClient] = BleakClient,
+        disconnected_callback: Callable[[BleakClient], None] | None = None,
+        adapter: str | None = None,
+    ) -> None:
+        self.service_uuid = normalize_uuid(service_uuid)
+        self.adapter = adapter
+        self.scan_timeout = scan_timeout
+        self.stats = PoolStats()
+        self.clients: dict[str, BleakClient] = {}
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._scanner_cls = scanner_cls
+        self._client_cls = client_cls
+        self._disconnected_callback = disconnected_callback
+        self._backend_kwargs = {"bluez": {"adapter": adapter}} if adapter is not None else {}
+
+    async def __aenter__(self) -> Self:
+        return self
+
+    async def __aexit__(self, *exc_info: object) -> None:
+        await self.disconnect_all()
+
+    async def discover(self, max_devices: int | None = None) -> list[BLEDevice]:
+        found = await self._scanner_cls.discover(timeout=self.scan_timeout,
+                                                 return_adv=True,
+                                                 service_uuids=[self.service_uuid],
+                                                 **self._backend_kwargs)
+        # Not every backend honours service_uuids, so filter again.
+        devices = [device for device, adv in found.values()
+                   if self.service_uuid in adv.service_uuids]
+        return devices[:max_devices] if max_devices is not None else devices
+
+    async def connect_all(self, devices: Iterable[BLEDevice]) -> dict[str, BleakClient]:
+        await asyncio.gather(*(self.connect(device) for device in devices))
+        return self.clients
+
+    async def connect(self, device: BLEDevice) -> BleakClient | None:
+        # Returns None if the connection failed.
+        client = self.clients.get(device.address)
+        if client is not None:
+            return client
+        stats = self.stats.device(device.address)
+        # A BLEDevice found by another adapter refers to that adapter: connect by address.
+        client = self._client_cls(device if self.adapter is None else device.address,
+                                  disconnected_callback=self._on_disconnect,
+                                  **self._backend_kwargs)
+        async with self._semaphore:
+            start = time.monotonic()
+            try:
+                await client.connect()
+            except Exception as exc:  # noqa: BLE001
+                stats.errors += 1
+                print(f"Failed to connect to {device.address}: {exc}")
+                return None
+            stats.connected_at = time.monotonic()
+            stats.connect_time = stats.connected_at - start
+        self.clients[device.address] = client
+        return client
+
+    def _on_disconnect(self, client: BleakClient) -> None:
+        self.clients.pop(client.address, None)
+        if self._disconnected_callback is not None:
+            self._disconnected_callback(client)
+
+    async def read_all(self, char_uuid: str) -> dict[str, bytearray | Exception]:
+        addresses = list(self.clients)
+        results = await asyncio.gather(*(self._read(address, char_uuid) for address in addresses))
+        return dict(zip(addresses, results, strict=True))
+
+    async def _read(self, address: str, char_uuid: str) -> bytearray | Exception:
+        stats = self.stats.device(address)
+        async with self._semaphore:
+            start = time.monotonic()
+            try:
+                value = await self.clients[address].read_gatt_char(char_uuid)
+            except Exception as exc:  # noqa: BLE001
+                stats.errors += 1
+                return exc
+        stats.reads += 1
+        stats.read_time += time.monotonic() - start
+        stats.bytes_received += len(value)
+        return value
+
+    async def start_notify_all(self, char_uuid: str, handler: NotifyHandler) -> None:
+        # handler(address, characteristic, data) is called for every notification.
+        await asyncio.gather(*(self.start_notify(address, char_uuid, handler)
+                               for address in list(self.clients)))
+
+    async def start_notify(self, address: str, char_uuid: str, handler: NotifyHandler) -> None:
+        stats = self.stats.device(address)
+
+        def callback(characteristic: BleakGATTCharacteristic, data: bytearray) -> None:
+            stats.notifications += 1
+            stats.bytes_received += len(data)
+            handler(address, characteristic, data)
+
+        async with self._semaphore:
+            try:
+                await self.clients[address].start_notify(char_uuid, callback)
+            except Exception as exc:  # noqa: BLE001
+                stats.errors += 1
+                print(f"Failed to subscribe {char_uuid} on {address}: {exc}")
+
+    async def stop_notify_all(self, char_uuid: str) -> None:
+        async def stop(client: BleakClient) -> None:
+            async with self._semaphore:
+                try:
+                    await client.stop_notify(char_uuid)
+                except Exception:  # noqa: BLE001
+                    self.stats.device(client.address).errors += 1
+
+        await asyncio.gather(*(stop(client) for client in list(self.clients.values())))
+
+    async def disconnect_all(self) -> None:
+        clients = list(self.clients.values())
+        self.clients.clear()
+        await asyncio.gather(*(client.disconnect() for client in clients),
+                             return_exceptions=True)
@@ -0,0 +1,115 @@
+# Registry of the devices seen while scanning.
+#
+# A scanner reports the same advertisement over and over. DeviceRegistry keeps
+# one entry per address and only calls its consumers when a device shows up,
+# changes its advertisement (or its RSSI moves more than `rssi_threshold`), or
+# is evicted because it was not seen for `ttl` seconds. The registry can be
+# passed directly as the detection callback of a BleakScanner.
+
+from __future__ import annotations
+
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from collections.abc import Callable
+
+    from bleak.backends.device import BLEDevice
+    from bleak.backends.scanner import AdvertisementData
+
+    Consumer = Callable[[str, "DeviceEntry"], None]
+
+EVENT_NEW = "new"
+EVENT_CHANGED = "changed"
+EVENT_LOST = "lost"
+
+
+def advertisement_digest(adv: AdvertisementData) -> int:
+    # RSSI is left out on purpose: it changes on every report and is tracked separately.
+    return hash((adv.local_name,
+                 tuple(adv.service_uuids),
+                 tuple(adv.manufacturer_data.items()),
+                 tuple(adv.service_data.items()),
+                 adv.tx_power))
+
+
+@dataclass(slots=True)
+class DeviceEntry:
+    device: BLEDevice
+    advertisement: AdvertisementData
+    digest: int
+    rssi: int
+    first_seen: float
+    last_seen: float
+    reports: int = 1
+
+
+class DeviceRegistry:
+    def __init__(self, ttl: float = 60.0, max_entries: int = 1024, rssi_threshold: int = 5,
+                 clock: Callable[[], float] = time.monotonic) -> None:
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.rssi_threshold = rssi_threshold
+        self._clock = clock
+        self._consumers: list[Consumer] = []
+        # Ordered from least to most recently seen, so expired entries are always at the front.
+        self._entries: OrderedDict[str, DeviceEntry] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, address: str) -> bool:
+        return address in self._entries
+
+    def get(self, address: str) -> DeviceEntry | None:
+        return self._entries.get(address)
+
+    def entries(self) -> list[DeviceEntry]:
+        return list(self._entries.values())
+
+    def subscribe(self, consumer: Consumer) -> None:
+        self._consumers.append(consumer)
+
+    def __call__(self, device: BLEDevice, adv: AdvertisementData) -> None:
+        self.update(device, adv)
+
+    def update(self, device: BLEDevice, adv: AdvertisementData) -> None:
+        now = self._clock()
+        entry = self._entries.get(device.address)
+
+        if entry is None:
+            entry = DeviceEntry(device, adv, advertisement_digest(adv), adv.rssi, now, now)
+            self._entries[device.address] = entry
+            self._evict(now)
+            self._emit(EVENT_NEW, entry)
+            return
+
+        self._entries.move_to_end(device.address)
+        entry.last_seen = now
+        entry.reports += 1
+        digest = advertisement_digest(adv)
+        if digest != entry.digest or abs(adv.rssi - entry.rssi) >= self.rssi_threshold:
+            entry.device = device
+            entry.advertisement = adv
+            entry.digest = digest
+            entry.rssi = adv.rssi
+            self._emit(EVENT_CHANGED, entry)
+        self._evict(now)
+
+    def expire(self) -> None:
+        self._evict(self._clock())
+
+    def _evict(self, now: float) -> None:
+        entries = self._entries
+        while entries:
+            address, entry = next(iter(entries.items()))
+            if len(entries) <= self.max_entries and now - entry.last_seen < self.ttl:
+                break
+            del entries[address]
+            self._emit(EVENT_LOST, entry)
+
+    def _emit(self, event: str, entry: DeviceEntry) -> None:
+        for consumer in self._consumers:
+            consumer(event, entry)
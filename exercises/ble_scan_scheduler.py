@@ -0,0 +1,215 @@
+# Scan in windows, with idle gaps that adapt to the discovery rate.
+#
+# Scanning non-stop keeps the controller busy (connections get fewer radio slots)
+# and floods the callbacks with duplicate reports. ScanScheduler scans for
+# `window` seconds, then stays idle long enough to keep a target duty cycle
+# (scan time / total time). The duty cycle starts at `max_duty` and, like a
+# Trickle timer, halves after every window that found no new device, down to
+# `min_duty`; a window with a new device resets it to `max_duty`. So it scans
+# aggressively while devices keep appearing and sparsely once the population is
+# stable. A device not seen for `ttl` seconds counts as new again.
+#
+# While discovering, scanning is active (scan requests, so scan responses with
+# e.g. the name are received); once the duty cycle drops to `passive_below`, it
+# switches to passive. BlueZ only scans passively with or_patterns (pass
+# bluez=BlueZScannerArgs(or_patterns=...) in scanner_kwargs); if the backend
+# refuses passive scanning, the scheduler stays active. Passive scans don't
+# filter by service on BlueZ, so the service_uuids are also checked here.
+#
+# Every window is recorded (ScanWindow) and the totals (ScanStats) give the duty
+# cycle actually used and the devices found per scan-second.
+
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import logging
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Any
+
+from ble_metrics import metrics
+from ble_uuids import normalize_uuids
+from bleak import BleakScanner
+from bleak.exc import BleakError
+
+if TYPE_CHECKING:
+    from collections.abc import Callable
+
+    from bleak.backends.device import BLEDevice
+    from bleak.backends.scanner import AdvertisementData
+
+    DetectionCallback = Callable[[BLEDevice, AdvertisementData], None]
+
+SCAN_ACTIVE = "active"
+SCAN_PASSIVE = "passive"
+
+logger = logging.getLogger(name=__name__)
+
+
+@dataclass(slots=True)
+class ScanWindow:
+    mode: str
+    started_at: float
+    duration: float
+    # Duty cycle the idle gap after this window was computed for.
+    duty_cycle: float
+    reports: int = 0
+    new_devices: int = 0
+
+    @property
+    def discovery_rate(self) -> float:
+        # New devices per scan-second.
+        return self.new_devices / self.duration if self.duration > 0 else 0.0
+
+
+@dataclass(slots=True)
+class ScanStats:
+    windows: int = 0
+    scan_time: float = 0.0
+    idle_time: float = 0.0
+    reports: int = 0
+    new_devices: int = 0
+
+    @property
+    def duty_cycle(self) -> float:
+        total = self.scan_time + self.idle_time
+        return self.scan_time / total if total > 0 else 0.0
+
+    @property
+    def discovery_rate(self) -> float:
+        return self.new_devices / self.scan_time if self.scan_time > 0 else 0.0
+
+    @property
+    def reports_per_second(self) -> float:
+        return self.reports / self.scan_time if self.scan_time > 0 else 0.0
+
+
+class ScanScheduler:
+    def __init__(self, detection_callback: DetectionCallback | None = None,
+                 service_uuids: list[str] | None = None, *, window: float = 2.0,
+                 min_duty: float = 0.05, max_duty: float = 1.0, passive_below: float = 0.25,
+                 ttl: float = 300.0, scanner_cls: type[BleakScanner] = BleakScanner,
+                 scanner_kwargs: dict[str, Any] | None = None,
+                 window_callback: Callable[[ScanWindow], None] | None = None,
+                 clock: Callable[[], float] = time.monotonic) -> None:
+        if not 0 < min_duty <= max_duty <= 1:
+            msg = "duty cycles must satisfy 0 < min_duty <= max_duty <= 1"
+            raise ValueError(msg)
+        self.detection_callback = detection_callback
+        self.service_uuids = service_uuids
+        self.window = window
+        self.min_duty = min_duty
+        self.max_duty = max_duty
+        self.passive_below = passive_below
+        self.ttl = ttl
+        self.duty_cycle = max_duty
+        self.stats = ScanStats()
+        self.windows: deque[ScanWindow] = deque(maxlen=256)
+        self._scanner_cls = scanner_cls
+        self._scanner_kwargs = scanner_kwargs or {}
+        self._window_callback = window_callback
+        self._clock = clock
+        self._filter = set(normalize_uuids(service_uuids)) if service_uuids else None
+        self._passive_supported = True
+        # Address -> last time seen, to tell new devices from known ones.
+        self._last_seen: dict[str, float] = {}
+        self._current: ScanWindow | None = None
+
+    @property
+    def mode(self) -> str:
+        if self._passive_supported and self.duty_cycle <= self.passive_below:
+            return SCAN_PASSIVE
+        return SCAN_ACTIVE
+
+    def idle_time(self) -> float:
+        # Gap after a window so that window / (window + gap) is the duty cycle.
+        return self.window * (1 / self.duty_cycle - 1)
+
+    def _detected(self, device: BLEDevice, adv: AdvertisementData) -> None:
+        if self._filter is not None and self._filter.isdisjoint(adv.service_uuids):
+            return
+        window = self._current
+        if window is not None:
+            window.reports += 1
+            now = self._clock()
+            last_seen = self._last_seen.get(device.address)
+            if last_seen is None or now - last_seen > self.ttl:
+                window.new_devices += 1
+            self._last_seen[device.address] = now
+        if self.detection_callback is not None:
+            self.detection_callback(device, adv)
+
+    def _create_scanner(self, mode: str) -> BleakScanner:
+        return self._scanner_cls(self._detected, self.service_uuids, scanning_mode=mode,
+                                 **self._scanner_kwargs)
+
+    async def scan_once(self, stop: asyncio.Event | None = None) -> ScanWindow:
+        # One scan window (cut short if `stop` is set), then the duty cycle is adapted.
+        mode = self.mode
+        try:
+            scanner = self._create_scanner(mode)
+        except BleakError as exc:
+            if mode != SCAN_PASSIVE:
+                raise
+            logger.warning(f"Passive scanning not available ({exc}), scanning actively")
+            self._passive_supported = False
+            mode = SCAN_ACTIVE
+            scanner = self._create_scanner(mode)
+
+        window = self._current = ScanWindow(mode, self._clock(), 0.0, self.duty_cycle)
+        try:
+            async with scanner:
+                await _wait(stop, self.window)
+        finally:
+            self._current = None
+            window.duration = self._clock() - window.started_at
+
+        self._adapt(window)
+        self._forget(self._clock())
+        window.duty_cycle = self.duty_cycle
+        self.windows.append(window)
+        self.stats.windows += 1
+        self.stats.scan_time += window.duration
+        self.stats.reports += window.reports
+        self.stats.new_devices += window.new_devices
+        metrics.inc("scan_seconds", window.duration, mode=mode)
+        metrics.inc("scan_reports", window.reports)
+        metrics.inc("scan_new_devices", window.new_devices)
+        if self._window_callback is not None:
+            self._window_callback(window)
+        return window
+
+    def _adapt(self, window: ScanWindow) -> None:
+        if window.new_devices:
+            self.duty_cycle = self.max_duty
+        else:
+            self.duty_cycle = max(self.duty_cycle / 2, self.min_duty)
+
+    def _forget(self, now: float) -> None:
+        expired = [address for address, seen in self._last_seen.items() if now - seen > self.ttl]
+        for address in expired:
+            del self._last_seen[address]
+
+    async def run(self, stop: asyncio.Event | None = None) -> ScanStats:
+        # Scans until `stop` is set (forever without one).
+        while stop is None or not stop.is_set():
+            await self.scan_once(stop)
+            idle = self.idle_time()
+            if idle <= 0 or (stop is not None and stop.is_set()):
+                continue
+            start = self._clock()
+            await _wait(stop, idle)
+            idle = self._clock() - start
+            self.stats.idle_time += idle
+            metrics.inc("scan_idle_seconds", idle)
+        return self.stats
+
+
+async def _wait(stop: asyncio.Event | None, timeout: float) -> None:  # noqa: ASYNC109
+    if stop is None:
+        await asyncio.sleep(timeout)
+        return
+    with contextlib.suppress(TimeoutError):
+        await asyncio.wait_for(stop.wait(), timeout)
@@ -0,0 +1,259 @@
+# Spread scanning and connections over several local adapters (hci0, hci1, ...).
+#
+# A controller holds a limited number of connections (often 7-10) and shares its
+# airtime between scanning and those connections. ShardedCentral keeps one
+# CentralPool per adapter: `scan_adapter` is dedicated to scanning (it only takes
+# connections once the other adapters are full or gone) and every device found is
+# assigned to the connection adapter with the fewest connections, up to
+# `max_connections` each.
+#
+# An adapter is considered lost after `max_failures` connection attempts in a row
+# failed on it, or when adapter_lost() is called (e.g. from a udev or D-Bus
+# monitor). Its devices are then reconnected on the remaining adapters, with their
+# notification subscriptions armed again, and scanning moves to another adapter if
+# it was the scan adapter. A device that drops is reconnected the same way, so the
+# load evens out as devices come and go. adapter_restored() puts an adapter back in
+# use for the next connections; existing connections are not moved.
+
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import functools
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Any, Self
+
+from ble_pool import ENVIRONMENTAL_SENSING_UUID, CentralPool
+from bleak import BleakClient, BleakScanner
+
+if TYPE_CHECKING:
+    from collections.abc import Callable, Coroutine, Iterable
+
+    from ble_pool import NotifyHandler
+    from bleak.backends.device import BLEDevice
+
+
+@dataclass(slots=True)
+class AdapterState:
+    name: str
+    up: bool = True
+    # Connection attempts in flight, counted in the load so concurrent assignments spread.
+    pending: int = 0
+    failures: int = 0
+
+
+class ShardedCentral:
+    def __init__(  # noqa: PLR0913
+        self,
+        adapters: Iterable[str],
+        service_uuid: str = ENVIRONMENTAL_SENSING_UUID,
+        *,
+        scan_adapter: str | None = None,
+        max_connections: int = 7,
+        concurrency: int = 2,
+        scan_timeout: float = 5.0,
+        max_failures: int = 3,
+        reconnect_delay: float = 1.0,
+        scanner_cls: type[BleakScanner] = BleakScanner,
+        client_cls: type[BleakClient] = BleakClient,
+        disconnected_callback: Callable[[BleakClient], None] | None = None,
+    ) -> None:
+        # `concurrency` is per adapter: each controller runs its own connection attempts.
+        self.adapters = {name: AdapterState(name) for name in adapters}
+        if not self.adapters:
+            msg = "at least one adapter is needed"
+            raise ValueError(msg)
+        if scan_adapter is not None and scan_adapter not in self.adapters:
+            msg = f"scan adapter {scan_adapter} is not one of the adapters"
+            raise ValueError(msg)
+        self.scan_adapter = scan_adapter
+        self.max_connections = max_connections
+        self.max_failures = max_failures
+        self.reconnect_delay = reconnect_delay
+        self.pools = {
+            name: CentralPool(service_uuid, concurrency, scan_timeout, scanner_cls=scanner_cls,
+                              client_cls=client_cls, adapter=name,
+                              disconnected_callback=functools.partial(self._on_disconnect, name))
+            for name in self.adapters
+        }
+        # Devices to keep connected, by address, and the adapter each one is on.
+        self.devices: dict[str, BLEDevice] = {}
+        self.assignments: dict[str, str] = {}
+        self._disconnected_callback = disconnected_callback
+        self._subscriptions: dict[str, NotifyHandler] = {}
+        self._tasks: set[asyncio.Task] = set()
+        self._reconnecting: set[str] = set()
+        self._closing = False
+        self.reconnections = 0
+
+    async def __aenter__(self) -> Self:
+        return self
+
+    async def __aexit__(self, *exc_info: object) -> None:
+        await self.disconnect_all()
+
+    @property
+    def clients(self) -> dict[str, BleakClient]:
+        return {address: client for pool in self.pools.values()
+                for address, client in pool.clients.items()}
+
+    def load(self, adapter: str) -> int:
+        return len(self.pools[adapter].clients) + self.adapters[adapter].pending
+
+    def connection_adapters(self) -> list[str]:
+        return [name for name, state in self.adapters.items()
+                if state.up and name != self.scan_adapter]
+
+    def scanning_adapter(self) -> str | None:
+        if self.scan_adapter is not None and self.adapters[self.scan_adapter].up:
+            return self.scan_adapter
+        # The least loaded adapter shares its airtime with scanning.
+        up = self.connection_adapters()
+        return min(up, key=self.load) if up else None
+
+    def _assign(self, exclude: set[str]) -> str | None:
+        candidates = [name for name in self.connection_adapters()
+                      if name not in exclude and self.load(name) < self.max_connections]
+        scan_adapter = self.scan_adapter
+        if (not candidates and scan_adapter is not None and scan_adapter not in exclude
+                and self.adapters[scan_adapter].up
+                and self.load(scan_adapter) < self.max_connections):
+            # Every other adapter is full or gone: the scan adapter takes connections too.
+            candidates = [scan_adapter]
+        return min(candidates, key=self.load) if candidates else None
+
+    async def discover(self, max_devices: int | None = None) -> list[BLEDevice]:
+        while (adapter := self.scanning_adapter()) is not None:
+            try:
+                return await self.pools[adapter].discover(max_devices)
+            except Exception as exc:  # noqa: BLE001
+                print(f"Scan on {adapter} failed: {exc}")
+                self.adapter_lost(adapter)
+        return []
+
+    async def connect_all(self, devices: Iterable[BLEDevice]) -> dict[str, BleakClient]:
+        await asyncio.gather(*(self.connect(device) for device in devices))
+        return self.clients
+
+    async def connect(self, device: BLEDevice) -> BleakClient | None:
+        # Tries the least loaded adapters until one connects (or none has room left).
+        self.devices[device.address] = device
+        adapter = self.assignments.get(device.address)
+        if adapter is not None:
+            return self.pools[adapter].clients.get(device.address)
+        tried: set[str] = set()
+        while True:
+            adapter = self._assign(tried)
+            if adapter is None:
+                print(f"No adapter available for {device.address}")
+                return None
+            tried.add(adapter)
+            state = self.adapters[adapter]
+            state.pending += 1
+            try:
+                client = await self.pools[adapter].connect(device)
+            finally:
+                state.pending -= 1
+            if client is not None:
+                state.failures = 0
+                self.assignments[device.address] = adapter
+                return client
+            state.failures += 1
+            if state.failures >= self.max_failures:
+                self.adapter_lost(adapter)
+
+    def adapter_lost(self, adapter: str) -> None:
+        state = self.adapters[adapter]
+        if not state.up:
+            return
+        state.up = False
+        pool = self.pools[adapter]
+        print(f"Adapter {adapter} lost, reconnecting its devices on the other adapters")
+        for address, client in list(pool.clients.items()):
+            pool.clients.pop(address, None)
+            self.assignments.pop(address, None)
+            self._spawn(self._disconnect_quietly(client))
+            self._spawn(self._reconnect(address))
+
+    def adapter_restored(self, adapter: str) -> None:
+        state = self.adapters[adapter]
+        state.up = True
+        state.failures = 0
+
+    def _on_disconnect(self, adapter: str, client: BleakClient) -> None:
+        if self._disconnected_callback is not None:
+            self._disconnected_callback(client)
+        # Devices moved away from a lost adapter are already being reconnected.
+        if self.assignments.get(client.address) != adapter:
+            return
+        del self.assignments[client.address]
+        if not self._closing and client.address in self.devices:
+            self._spawn(self._reconnect(client.address))
+
+    def _spawn(self, coro: Coroutine[Any, Any, None]) -> None:
+        task = asyncio.get_running_loop().create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _disconnect_quietly(self, client: BleakClient) -> None:
+        with contextlib.suppress(Exception):
+            await client.disconnect()
+
+    async def _reconnect(self, address: str) -> None:
+        if address in self._reconnecting:
+            return
+        self._reconnecting.add(address)
+        delay = self.reconnect_delay
+        try:
+            while not self._closing and address not in self.assignments:
+                device = self.devices.get(address)
+                if device is None:
+                    return
+                if await self.connect(device) is not None:
+                    self.reconnections += 1
+                    await self._arm(address)
+                    return
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 30.0)
+        finally:
+            self._reconnecting.discard(address)
+
+    async def _arm(self, address: str) -> None:
+        pool = self.pools[self.assignments[address]]
+        for char_uuid, handler in self._subscriptions.items():
+            await pool.start_notify(address, char_uuid, handler)
+
+    async def read_all(self, char_uuid: str) -> dict[str, bytearray | Exception]:
+        results = await asyncio.gather(*(pool.read_all(char_uuid)
+                                         for pool in self.pools.values() if pool.clients))
+        return {address: value for result in results for address, value in result.items()}
+
+    async def start_notify_all(self, char_uuid: str, handler: NotifyHandler) -> None:
+        # Also armed on the devices reconnected later.
+        self._subscriptions[char_uuid] = handler
+        await asyncio.gather(*(pool.start_notify_all(char_uuid, handler)
+                               for pool in self.pools.values() if pool.clients))
+
+    async def stop_notify_all(self, char_uuid: str) -> None:
+        self._subscriptions.pop(char_uuid, None)
+        await asyncio.gather(*(pool.stop_notify_all(char_uuid)
+                               for pool in self.pools.values() if pool.clients))
+
+    async def disconnect_all(self) -> None:
+        self._closing = True
+        for task in list(self._tasks):
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self.devices.clear()
+        self.assignments.clear()
+        await asyncio.gather(*(pool.disconnect_all() for pool in self.pools.values()))
+
+    def report(self) -> str:
+        lines = []
+        for name, state in self.adapters.items():
+            role = " (scanning)" if name == self.scanning_adapter() else ""
+            lines.append(f"{name}{role}: {'up' if state.up else 'down'}, "
+                         f"{len(self.pools[name].clients)}/{self.max_connections} connections")
+        lines.append(f"total: {len(self.clients)} of {len(self.devices)} devices connected, "
+                     f"{self.reconnections} reconnections")
+        return "\n".join(lines)
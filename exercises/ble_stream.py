@@ -0,0 +1,151 @@
+# Advertisements as an asynchronous stream.
+#
+# The detection callback of a BleakScanner runs on the event loop, so a slow
+# callback delays the scan. AdvertisementStream only stores the advertisement in
+# a bounded buffer; consumers read it with `async for`, one at a time or in
+# batches of `batch_size` and/or everything received within `batch_window_ms`.
+# With a batch_size and no window, a batch is only returned once it is full (or
+# the stream was closed).
+#
+# When the buffer is full the overflow policy decides what is lost:
+#   drop-oldest: the oldest advertisement is discarded;
+#   drop-newest: the new advertisement is discarded;
+#   coalesce: only the latest advertisement of each address is kept, so a full
+#             buffer only drops data when a new address shows up.
+
+from __future__ import annotations
+
+import asyncio
+from collections import OrderedDict, deque
+from typing import TYPE_CHECKING, Any, Self
+
+from bleak import BleakScanner
+
+if TYPE_CHECKING:
+    from bleak.backends.device import BLEDevice
+    from bleak.backends.scanner import AdvertisementData
+
+    Advertisement = tuple[BLEDevice, AdvertisementData]
+
+DROP_OLDEST = "drop-oldest"
+DROP_NEWEST = "drop-newest"
+COALESCE = "coalesce"
+OVERFLOW_POLICIES = (DROP_OLDEST, DROP_NEWEST, COALESCE)
+
+
+class AdvertisementStream:
+    def __init__(  # noqa: PLR0913
+        self,
+        service_uuids: list[str] | None = None,
+        maxsize: int = 256,
+        overflow: str = DROP_OLDEST,
+        batch_size: int | None = None,
+        batch_window_ms: float | None = None,
+        *,
+        scanner_cls: type[BleakScanner] = BleakScanner,
+        **scanner_kwargs: Any,  # noqa: ANN401
+    ) -> None:
+        if overflow not in OVERFLOW_POLICIES:
+            msg = f"Unknown overflow policy {overflow!r}, expected one of {OVERFLOW_POLICIES}"
+            raise ValueError(msg)
+        if maxsize < 1:
+            msg = "maxsize must be at least 1"
+            raise ValueError(msg)
+        if batch_size is not None and not 1 <= batch_size <= maxsize:
+            # A batch larger than the buffer would never fill up.
+            msg = f"batch_size must be between 1 and maxsize ({maxsize})"
+            raise ValueError(msg)
+
+        self.maxsize = maxsize
+        self.overflow = overflow
+        self.batch_size = batch_size
+        self.batch_window = batch_window_ms / 1000 if batch_window_ms is not None else None
+        self.received = 0
+        self.dropped = 0
+        self._buffer: deque[Advertisement] | OrderedDict[str, Advertisement] = (
+            OrderedDict() if overflow == COALESCE else deque())
+        self._ready = asyncio.Event()
+        self._closed = False
+        self._scanner = scanner_cls(self._on_detection, service_uuids, **scanner_kwargs)
+
+    async def __aenter__(self) -> Self:
+        self._closed = False
+        await self._scanner.start()
+        return self
+
+    async def __aexit__(self, *exc_info: object) -> None:
+        await self._scanner.stop()
+        self.close()
+
+    def close(self) -> None:
+        # Consumers still get what is buffered before the iteration stops.
+        self._closed = True
+        self._ready.set()
+
+    def __len__(self) -> int:
+        return len(self._buffer)
+
+    def _on_detection(self, device: BLEDevice, adv: AdvertisementData) -> None:
+        self.received += 1
+        buffer = self._buffer
+
+        if self.overflow == COALESCE:
+            if device.address in buffer:
+                buffer[device.address] = (device, adv)
+                return
+            if len(buffer) >= self.maxsize:
+                buffer.popitem(last=False)
+                self.dropped += 1
+            buffer[device.address] = (device, adv)
+        elif len(buffer) < self.maxsize:
+            buffer.append((device, adv))
+        elif self.overflow == DROP_OLDEST:
+            buffer.popleft()
+            buffer.append((device, adv))
+            self.dropped += 1
+        else:
+            self.dropped += 1
+            return
+
+        self._ready.set()
+
+    def _pop(self) -> Advertisement:
+        if self.overflow == COALESCE:
+            return self._buffer.popitem(last=False)[1]
+        return self._buffer.popleft()
+
+    def __aiter__(self) -> Self:
+        return self
+
+    async def __anext__(self) -> Advertisement | list[Advertisement]:
+        while not self._buffer:
+            if self._closed:
+                raise StopAsyncIteration
+            self._ready.clear()
+            await self._ready.wait()
+
+        if self.batch_size is None and self.batch_window is None:
+            return self._pop()
+
+        if self.batch_window is not None:
+            loop = asyncio.get_running_loop()
+            deadline = loop.time() + self.batch_window
+            while not self._closed and (self.batch_size is None
+                                        or len(self._buffer) < self.batch_size):
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                self._ready.clear()
+                try:
+                    await asyncio.wait_for(self._ready.wait(), remaining)
+                except TimeoutError:
+                    break
+        else:
+            while not self._closed and len(self._buffer) < self.batch_size:
+                self._ready.clear()
+                await self._ready.wait()
+
+        count = len(self._buffer)
+        if self.batch_size is not None:
+            count = min(count, self.batch_size)
+        return [self._pop() for _ in range(count)]
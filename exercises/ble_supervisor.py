@@ -0,0 +1,165 @@
+# Keep a connection (and its notifications) alive across radio drops.
+#
+# ConnectionSupervisor wraps a BleakClient. When the peripheral disconnects it
+# reconnects to the same BLEDevice, limiting service discovery to the services
+# found on the first connection, with jittered exponential backoff. Notification
+# subscriptions registered through the supervisor are armed again after every
+# reconnection. The time it took to recover from each disconnection is recorded.
+
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import random
+import time
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Any, Self
+
+from ble_metrics import metrics
+from bleak import BleakClient
+
+if TYPE_CHECKING:
+    from collections.abc import Callable
+
+    from ble_locator import DeviceLocator
+    from bleak.backends.characteristic import BleakGATTCharacteristic
+    from bleak.backends.device import BLEDevice
+
+    NotifyHandler = Callable[[BleakGATTCharacteristic, bytearray], None]
+
+
+@dataclass(slots=True)
+class RecoveryEvent:
+    disconnected_at: float
+    recovered_at: float | None = None
+    attempts: int = 0
+
+    @property
+    def time_to_recovery(self) -> float | None:
+        if self.recovered_at is None:
+            return None
+        return self.recovered_at - self.disconnected_at
+
+
+class ConnectionSupervisor:
+    def __init__(  # noqa: PLR0913
+        self,
+        device: BLEDevice,
+        *,
+        initial_backoff: float = 0.1,
+        max_backoff: float = 10.0,
+        jitter: float = 0.5,
+        locator: DeviceLocator | None = None,
+        rescan_after: int = 5,
+        client_cls: type[BleakClient] = BleakClient,
+        **client_kwargs: Any,  # noqa: ANN401
+    ) -> None:
+        self.device = device
+        self.initial_backoff = initial_backoff
+        self.max_backoff = max_backoff
+        self.jitter = jitter
+        self.recoveries: list[RecoveryEvent] = []
+        self.client: BleakClient | None = None
+        self._locator = locator
+        self._rescan_after = rescan_after
+        self._client_cls = client_cls
+        self._client_kwargs = client_kwargs
+        self._services: list[str] | None = None
+        self._subscriptions: dict[str, NotifyHandler] = {}
+        self._disconnected = asyncio.Event()
+        self._closing = False
+        self._task: asyncio.Task | None = None
+
+    @property
+    def is_connected(self) -> bool:
+        return self.client is not None and self.client.is_connected
+
+    async def __aenter__(self) -> Self:
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc_info: object) -> None:
+        await self.close()
+
+    async def start(self) -> None:
+        self._closing = False
+        await self._connect()
+        # Reuse the services found now to speed up discovery on reconnection.
+        self._services = [service.uuid for service in self.client.services]
+        self._task = asyncio.create_task(self._supervise())
+
+    async def close(self) -> None:
+        self._closing = True
+        if self._task is not None:
+            self._task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
+        if self.client is not None:
+            await self.client.disconnect()
+
+    async def start_notify(self, char_uuid: str, handler: NotifyHandler) -> None:
+        self._subscriptions[char_uuid] = handler
+        if self.is_connected:
+            await self.client.start_notify(char_uuid, handler)
+
+    async def stop_notify(self, char_uuid: str) -> None:
+        self._subscriptions.pop(char_uuid, None)
+        if self.is_connected:
+            await self.client.stop_notify(char_uuid)
+
+    def _on_disconnect(self, client: BleakClient) -> None:
+        if client is self.client and not self._closing:
+            self._disconnected.set()
+
+    async def _connect(self) -> None:
+        kwargs = dict(self._client_kwargs)
+        if self._services is not None:
+            kwargs.setdefault("services", self._services)
+        client = self._client_cls(self.device, disconnected_callback=self._on_disconnect,
+                                  **kwargs)
+        self.client = client
+        self._disconnected.clear()
+        try:
+            await client.connect()
+            # A copy: start_notify/stop_notify may run while this awaits.
+            for char_uuid, handler in list(self._subscriptions.items()):
+                await client.start_notify(char_uuid, handler)
+        except BaseException:
+            with contextlib.suppress(Exception):
+                await client.disconnect()
+            raise
+
+    def _backoff(self, attempt: int) -> float:
+        delay = min(self.max_backoff, self.initial_backoff * 2 ** (attempt - 1))
+        return delay * (1 - self.jitter * random.random())  # noqa: S311
+
+    async def _supervise(self) -> None:
+        while True:
+            await self._disconnected.wait()
+            event = RecoveryEvent(time.monotonic())
+            self.recoveries.append(event)
+
+            while True:
+                # The first attempt is immediate: most drops recover straight away.
+                if event.attempts:
+                    await asyncio.sleep(self._backoff(event.attempts))
+                if self._locator is not None and event.attempts >= self._rescan_after:
+                    device = await self._locator.find(self.device.address, self._match)
+                    if device is not None:
+                        self.device = device
+                event.attempts += 1
+                try:
+                    await self._connect()
+                except Exception as exc:  # noqa: BLE001
+                    print(f"Reconnection to {self.device.address} failed: {exc}")
+                    continue
+                break
+
+            event.recovered_at = time.monotonic()
+            metrics.observe("reconnect", event.time_to_recovery)
+            print(f"Reconnected to {self.device.address} in "
+                  f"{event.time_to_recovery * 1000:.0f}ms ({event.attempts} attempts)")
+
+    def _match(self, device: BLEDevice, adv: object) -> bool:  # noqa: ARG002
+        return device.address == self.device.address
@@ -0,0 +1,189 @@
+# Append-only time-series store for the readings received from peripherals.
+#
+# Every device has two column files: timestamps (int64, milliseconds since the
+# epoch) and values (int16, e.g. 0.01 degC as in the temperature characteristic).
+# Appends are buffered in memory and written every `flush_every` samples, so
+# memory stays bounded however long the history is. Queries memory-map the
+# column files: the time range is found with a binary search on the timestamp
+# column and values are aggregated with NumPy, never row by row in Python.
+
+from __future__ import annotations
+
+import contextlib
+import mmap
+import time
+from array import array
+from bisect import bisect_left
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Self
+
+import numpy as np
+
+if TYPE_CHECKING:
+    from collections.abc import Iterator
+    from pathlib import Path
+
+    # collections.abc.Buffer is only in Python 3.12+ (typing_extensions comes with bleak).
+    from typing_extensions import Buffer
+
+TIMESTAMP_TYPE = "q"
+VALUE_TYPE = "h"
+
+
+@dataclass(slots=True, frozen=True)
+class Bucket:
+    start: float
+    count: int
+    min: int
+    max: int
+    mean: float
+
+
+class _Series:
+    def __init__(self, directory: Path) -> None:
+        directory.mkdir(parents=True, exist_ok=True)
+        self.timestamps_file = directory / "timestamps.bin"
+        self.values_file = directory / "values.bin"
+        self.timestamps = array(TIMESTAMP_TYPE)
+        self.values = array(VALUE_TYPE)
+        self._truncate_partial()
+
+    def _truncate_partial(self) -> None:
+        # A crash while flushing may leave the columns with different lengths.
+        sizes = [self.timestamps_file.stat().st_size if self.timestamps_file.exists() else 0,
+                 self.values_file.stat().st_size if self.values_file.exists() else 0]
+        rows = min(sizes[0] // self.timestamps.itemsize, sizes[1] // self.values.itemsize)
+        for path, itemsize in ((self.timestamps_file, self.timestamps.itemsize),
+                               (self.values_file, self.values.itemsize)):
+            with path.open("ab") as fp:
+                fp.truncate(rows * itemsize)
+
+    def __len__(self) -> int:
+        return self.values_file.stat().st_size // self.values.itemsize + len(self.values)
+
+    def flush(self) -> None:
+        if not self.values:
+            return
+        with self.timestamps_file.open("ab") as fp:
+            self.timestamps.tofile(fp)
+        with self.values_file.open("ab") as fp:
+            self.values.tofile(fp)
+        del self.timestamps[:]
+        del self.values[:]
+
+    @contextlib.contextmanager
+    def mapped(self) -> Iterator[tuple[memoryview, memoryview]]:
+        self.flush()
+        with contextlib.ExitStack() as stack:
+            views = []
+            for path, typecode in ((self.timestamps_file, TIMESTAMP_TYPE),
+                                   (self.values_file, VALUE_TYPE)):
+                if path.stat().st_size == 0:
+                    views.append(memoryview(array(typecode)))
+                    continue
+                fp = stack.enter_context(path.open("rb"))
+                mm = stack.enter_context(mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ))
+                view = stack.enter_context(memoryview(mm))
+                views.append(stack.enter_context(view.cast(typecode)))
+            yield views[0], views[1]
+
+
+class SeriesStore:
+    def __init__(self, root: Path, flush_every: int = 256) -> None:
+        self.root = root
+        self.flush_every = flush_every
+        self._series: dict[str, _Series] = {}
+        root.mkdir(parents=True, exist_ok=True)
+
+    def __enter__(self) -> Self:
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        self.flush()
+
+    def _get(self, address: str) -> _Series:
+        series = self._series.get(address)
+        if series is None:
+            series = self._series[address] = _Series(self.root / address.replace(":", "-"))
+        return series
+
+    def devices(self) -> list[str]:
+        return sorted(path.name.replace("-", ":") for path in self.root.iterdir() if path.is_dir())
+
+    def count(self, address: str) -> int:
+        return len(self._get(address))
+
+    def append(self, address: str, value: int, timestamp: float | None = None) -> None:
+        # Timestamps must be appended in increasing order (the range lookup relies on it).
+        series = self._get(address)
+        series.timestamps.append(int((timestamp if timestamp is not None else time.time()) * 1000))
+        series.values.append(value)
+        if len(series.values) >= self.flush_every:
+            series.flush()
+
+    def extend(self, address: str, values: Buffer, timestamps: Buffer) -> None:
+        # Bulk append: int16 values and int64 timestamps in ms (e.g. NumPy arrays).
+        series = self._get(address)
+        with memoryview(values) as vview, memoryview(timestamps) as tview:
+            if len(vview) != len(tview):
+                msg = "values and timestamps must have the same length"
+                raise ValueError(msg)
+            if vview.itemsize != series.values.itemsize or \
+                    tview.itemsize != series.timestamps.itemsize:
+                msg = "values must be int16 and timestamps int64"
+                raise ValueError(msg)
+            series.timestamps.frombytes(tview.cast("B"))
+            series.values.frombytes(vview.cast("B"))
+        if len(series.values) >= self.flush_every:
+            series.flush()
+
+    def flush(self) -> None:
+        for series in self._series.values():
+            series.flush()
+
+    def range(self, address: str, start: float, end: float) -> tuple[array, array]:
+        # Samples with start <= timestamp < end, as (timestamps in ms, values).
+        with self._get(address).mapped() as (timestamps, values):
+            lo = bisect_left(timestamps, int(start * 1000))
+            hi = bisect_left(timestamps, int(end * 1000), lo)
+            result = array(TIMESTAMP_TYPE), array(VALUE_TYPE)
+            for column, view in zip(result, (timestamps, values), strict=True):
+                with view[lo:hi] as chunk, chunk.cast("B") as raw:
+                    column.frombytes(raw)
+            return result
+
+    def downsample(self, address: str, start: float, end: float, bucket: float) -> list[Bucket]:
+        # min/max/mean of the values in every `bucket` seconds between start and end.
+        # Empty buckets are skipped.
+        step = int(bucket * 1000)
+        start_ms = int(start * 1000)
+        with self._get(address).mapped() as (timestamps, values):
+            # The arrays are views of the mapped files: they must be gone before it's closed.
+            times = np.frombuffer(timestamps, dtype=np.int64)
+            lo, hi = np.searchsorted(times, (start_ms, int(end * 1000)))
+            if hi <= lo:
+                del times
+                return []
+            indices = (times[lo:hi] - start_ms) // step
+            column = np.frombuffer(values, dtype=np.int16)[lo:hi]
+            # Samples are in time order, so every bucket is a run of equal indices.
+            firsts = np.flatnonzero(np.diff(indices)) + 1
+            firsts = np.concatenate(([0], firsts))
+            counts = np.diff(np.append(firsts, len(column)))
+            mins = np.minimum.reduceat(column, firsts).tolist()
+            maxs = np.maximum.reduceat(column, firsts).tolist()
+            means = (np.add.reduceat(column, firsts, dtype=np.int64) / counts).tolist()
+            starts = ((start_ms + indices[firsts] * step) / 1000).tolist()
+            del times, column
+        return [Bucket(*fields)
+                for fields in zip(starts, counts.tolist(), mins, maxs, means, strict=True)]
+
+    def latest(self, address: str) -> tuple[int, int] | None:
+        series = self._get(address)
+        if series.values:
+            return series.timestamps[-1], series.values[-1]
+        with series.mapped() as (timestamps, values):
+            if not len(values):
+                return None
+            return timestamps[-1], values[-1]
+
@@ -0,0 +1,55 @@
+# Canonical Bluetooth UUIDs.
+#
+# The same UUID can be written as 0x181A, "181a", "0000181A" or
+# "0000181a-0000-1000-8000-00805f9b34fb". normalize_uuid turns any of them into
+# a BleUUID: the lowercase 128-bit form that bleak reports, as a str subclass so
+# it compares and hashes like the strings in AdvertisementData.service_uuids and
+# BleakGATTCharacteristic.uuid. Every form seen is remembered, so normalizing a
+# UUID again is a single dict lookup and always returns the same object.
+
+from __future__ import annotations
+
+import sys
+import uuid as _uuid
+from typing import TYPE_CHECKING
+
+from ble_codecs import uuid_key
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable
+
+_SIG_SUFFIX = "-0000-1000-8000-00805f9b34fb"
+
+
+class BleUUID(str):
+    __slots__ = ()
+
+    @property
+    def short(self) -> int | None:
+        # The 16/32-bit alias of a UUID assigned by the Bluetooth SIG, None otherwise.
+        if not self.endswith(_SIG_SUFFIX):
+            return None
+        return int(self[:8], 16)
+
+
+# Every form normalized so far -> its BleUUID. The forms used by a program are few, so
+# this does not need a bound.
+_INTERNED: dict[str | int, BleUUID] = {}
+
+
+def normalize_uuid(value: str | int) -> BleUUID:
+    uuid = _INTERNED.get(value)
+    if uuid is not None:
+        return uuid
+    canonical = uuid_key(value)
+    uuid = _INTERNED.get(canonical)
+    if uuid is None:
+        # Raises ValueError for anything that isn't a UUID.
+        canonical = str(_uuid.UUID(canonical))
+        uuid = _INTERNED[canonical] = BleUUID(sys.intern(canonical))
+    _INTERNED[value] = uuid
+    return uuid
+
+
+def normalize_uuids(values: Iterable[str | int]) -> list[BleUUID]:
+    return [normalize_uuid(value) for value in values]
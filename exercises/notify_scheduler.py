@@ -0,0 +1,71 @@
+# Decide when a GATT server should notify a new value to its subscribers.
+#
+# NotificationScheduler sends the latest value when it moved more than
+# `deadband` away from the last value sent, and at least every `period` seconds
+# otherwise. Notifications are never closer than `min_interval`: values offered
+# in the meantime are coalesced and only the latest one is sent.
+
+from __future__ import annotations
+
+import asyncio
+import time
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from collections.abc import Callable
+
+
+class NotificationScheduler:
+    def __init__(self, send: Callable[[float], None], period: float = 10.0,
+                 deadband: float = 0.1, min_interval: float = 0.5,
+                 clock: Callable[[], float] = time.monotonic) -> None:
+        self.period = period
+        self.deadband = deadband
+        self.min_interval = min_interval
+        self.sent = 0
+        self.coalesced = 0
+        self._send = send
+        self._clock = clock
+        self._pending: float | None = None
+        self._last_value: float | None = None
+        self._last_sent = float("-inf")
+        self._wake = asyncio.Event()
+
+    def offer(self, value: float) -> None:
+        # Must be called from the event loop thread (use loop.call_soon_threadsafe).
+        if self._pending is not None:
+            self.coalesced += 1
+        self._pending = value
+        if self._last_value is None or abs(value - self._last_value) > self.deadband:
+            self._wake.set()
+
+    def _flush(self) -> None:
+        value = self._pending if self._pending is not None else self._last_value
+        if value is None:
+            return
+        self._pending = None
+        self._last_value = value
+        self._last_sent = self._clock()
+        self.sent += 1
+        self._send(value)
+
+    async def run(self) -> None:
+        while True:
+            if self._pending is None and self._last_value is None:
+                # Nothing to send yet, so no heartbeat either: wait for the first value.
+                await self._wake.wait()
+            timeout = self._last_sent + self.period - self._clock()
+            heartbeat = timeout <= 0
+            if not heartbeat:
+                try:
+                    await asyncio.wait_for(self._wake.wait(), timeout)
+                except TimeoutError:
+                    heartbeat = True
+
+            # Rate limit: anything offered while waiting is coalesced into one notification.
+            wait = self._last_sent + self.min_interval - self._clock()
+            if wait > 0:
+                await asyncio.sleep(wait)
+            self._wake.clear()
+            if heartbeat or self._pending is not None:
+                self._flush()
@@ -0,0 +1,289 @@
+# Temperature sensors for the GATT server of exercise 10.
+#
+# A DS18B20 on the 1-Wire bus is read through sysfs, and each conversion takes
+# ~750ms. TemperatureSampler reads the sensor in a background thread at a fixed
+# rate, so the BLE callbacks only fetch the latest reading. Any callable that
+# returns degrees Celsius (or None on failure) can be used as sensor, e.g.
+# RandomSensor when there is no 1-Wire bus.
+#
+# W1Bus reads every probe on the bus in one sweep: it starts the conversion on
+# all of them at once with the bus master's therm_bulk_read trigger when the
+# kernel supports it, or reads the probes from a thread pool otherwise, so a
+# sweep takes one conversion time instead of one per probe. BusSampler samples
+# a W1Bus. create_fake_bus builds a sysfs-like tree to run all this off-Pi
+# (point W1_BASE_DIR at it).
+
+from __future__ import annotations
+
+import logging
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from collections.abc import Callable
+
+BASE_DIR = Path(os.environ.get("W1_BASE_DIR", "/sys/bus/w1/devices/"))
+DS18B20_FAMILY = "28"
+BUS_MASTER = "w1_bus_master1"
+# A 12-bit DS18B20 conversion takes up to 750ms.
+CONVERSION_TIME = 0.75
+READ_ATTEMPTS = 5
+RETRY_DELAY = 0.2
+
+logger = logging.getLogger(name=__name__)
+
+
+def find_device_dirs(base_dir: Path = BASE_DIR) -> list[Path]:
+    return sorted(base_dir.glob(f"{DS18B20_FAMILY}*")) if base_dir.exists() else []
+
+
+def find_device_file(base_dir: Path = BASE_DIR) -> Path | None:
+    device_dirs = find_device_dirs(base_dir)
+    return device_dirs[0] / "w1_slave" if device_dirs else None
+
+
+def read_temperature_raw(device: Path) -> list[str]:
+    with Path(device).open() as fp:
+        return fp.readlines()
+
+
+def parse_temperature(lines: list[str]) -> float | None:
+    # The first line must end with YES (CRC ok); the temperature, in millidegrees,
+    # follows "t=" in the second line.
+    if len(lines) < 2 or lines[0].strip()[-3:] != "YES":  # noqa: PLR2004
+        return None
+    equals_pos = lines[1].find("t=")
+    if equals_pos == -1:
+        return None
+    return float(lines[1][equals_pos + 2:]) / 1000.0
+
+
+def max_read_time(retries: int = READ_ATTEMPTS, retry_delay: float = RETRY_DELAY) -> float:
+    # Longest read_temperature(): every attempt converts, with a delay between attempts.
+    return retries * CONVERSION_TIME + (retries - 1) * retry_delay
+
+
+def read_temperature(device: Path, retries: int = READ_ATTEMPTS,
+                     retry_delay: float = RETRY_DELAY) -> float | None:
+    for attempt in range(retries):
+        if attempt:
+            time.sleep(retry_delay)
+        try:
+            temp_c = parse_temperature(read_temperature_raw(device))
+        except OSError as exc:
+            logger.warning(f"Failed to read {device}: {exc}")
+            continue
+        if temp_c is not None:
+            return temp_c
+    return None
+
+
+class W1Sensor:
+    def __init__(self, device_file: Path) -> None:
+        self.device_file = device_file
+        self.max_read_time = max_read_time()
+
+    def __call__(self) -> float | None:
+        return read_temperature(self.device_file)
+
+
+class RandomSensor:
+    def __init__(self, low: float = 23.0, high: float = 24.5) -> None:
+        self.low = low
+        self.high = high
+
+    def __call__(self) -> float:
+        return round(random.uniform(self.low, self.high), 2)  # noqa: S311
+
+
+class W1Bus:
+    def __init__(self, base_dir: Path = BASE_DIR, *, bulk_read: bool = True,
+                 max_workers: int | None = None) -> None:
+        self.probes = {device_dir.name: device_dir for device_dir in find_device_dirs(base_dir)}
+        bulk_file = base_dir / BUS_MASTER / "therm_bulk_read"
+        self.bulk_file = bulk_file if bulk_read and bulk_file.exists() else None
+        # A failed bulk conversion (up to 2 conversion times) falls back to probe reads.
+        self.max_read_time = max_read_time() + (2 * CONVERSION_TIME if self.bulk_file else 0.0)
+        self._executor = ThreadPoolExecutor(max_workers=max_workers or max(len(self.probes), 1),
+                                            thread_name_prefix="w1")
+
+    def close(self) -> None:
+        self._executor.shutdown()
+
+    def _bulk_convert(self) -> bool:
+        # Start the conversion on every probe; reading the file returns -1 while any
+        # conversion is still in progress, then 1 (results not read yet) or 0 (nothing
+        # pending). On a fake bus it reads back the trigger, which also counts as done.
+        try:
+            self.bulk_file.write_text("trigger\n")
+            deadline = time.monotonic() + 2 * CONVERSION_TIME
+            while time.monotonic() < deadline:
+                time.sleep(CONVERSION_TIME / 10)
+                if self.bulk_file.read_text().strip() != "-1":
+                    return True
+        except OSError as exc:
+            logger.warning(f"Bulk conversion failed: {exc}")
+        return False
+
+    @staticmethod
+    def _read_converted(device_dir: Path) -> float | None:
+        # After a bulk conversion, "temperature" returns the result without converting again.
+        try:
+            return int((device_dir / "temperature").read_text()) / 1000.0
+        except (OSError, ValueError):
+            return read_temperature(device_dir / "w1_slave")
+
+    def sweep(self) -> dict[str, float | None]:
+        if not self.probes:
+            return {}
+        if self.bulk_file is not None and self._bulk_convert():
+            read = self._read_converted
+        else:
+            def read(device_dir: Path) -> float | None:
+                return read_temperature(device_dir / "w1_slave")
+        values = self._executor.map(read, self.probes.values())
+        return dict(zip(self.probes, values, strict=True))
+
+    __call__ = sweep
+
+
+def create_fake_bus(base_dir: Path, temperatures: dict[str, float]) -> Path:
+    # sysfs-like tree with one DS18B20 directory per probe id (e.g. "28-0000075a1b2c") and
+    # the bus master's bulk conversion trigger.
+    bus_master = base_dir / BUS_MASTER
+    bus_master.mkdir(parents=True, exist_ok=True)
+    (bus_master / "therm_bulk_read").write_text("0\n")
+    for probe_id, temp_c in temperatures.items():
+        device_dir = base_dir / probe_id
+        device_dir.mkdir(parents=True, exist_ok=True)
+        millidegrees = round(temp_c * 1000)
+        (device_dir / "w1_slave").write_text(
+            "72 01 4b 46 7f ff 0e 10 57 : crc=57 YES\n"
+            f"72 01 4b 46 7f ff 0e 10 57 t={millidegrees}\n")
+        (device_dir / "temperature").write_text(f"{millidegrees}\n")
+    return base_dir
+
+
+@dataclass(slots=True, frozen=True)
+class Reading:
+    value: float
+    timestamp: float
+    sensor_id: str = ""
+
+    def age(self, now: float | None = None) -> float:
+        return (now if now is not None else time.monotonic()) - self.timestamp
+
+
+class TemperatureSampler:
+    def __init__(self, sensor: Callable[[], float | None], interval: float = 1.0,
+                 clock: Callable[[], float] = time.monotonic) -> None:
+        self.sensor = sensor
+        self.interval = interval
+        self.failures = 0
+        # Longest sensor call (e.g. W1Sensor.max_read_time), part of max_staleness().
+        self.read_time = getattr(sensor, "max_read_time", 0.0)
+        self._clock = clock
+        self._latest: Reading | None = None
+        self._listeners: list[Callable[[Reading], None]] = []
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def latest(self) -> Reading | None:
+        return self._latest
+
+    def subscribe(self, listener: Callable[[Reading], None]) -> None:
+        # Listeners are called from the sampler thread with every new reading.
+        self._listeners.append(listener)
+
+    def max_staleness(self) -> float:
+        # Upper bound of the age of a reading while the sensor keeps answering.
+        return self.interval + self.read_time
+
+    def age(self, reading: Reading) -> float:
+        # In the sampler's clock, which may not be time.monotonic().
+        return reading.age(self._clock())
+
+    def sample(self) -> Reading | None:
+        value = self.sensor()
+        if value is None:
+            self.failures += 1
+            return None
+        # Replacing the reference is atomic, so readers never need a lock.
+        reading = self._latest = Reading(value, self._clock())
+        for listener in self._listeners:
+            listener(reading)
+        return reading
+
+    def start(self) -> None:
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="temperature-sampler",
+                                        daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self) -> None:
+        next_sample = time.monotonic()
+        while not self._stop.is_set():
+            try:
+                self.sample()
+            except Exception:
+                logger.exception("Sensor read failed")
+                self.failures += 1
+            # Schedule from the previous deadline so slow reads don't make the rate drift.
+            next_sample += self.interval
+            delay = next_sample - time.monotonic()
+            if delay < 0:
+                next_sample = time.monotonic()
+                delay = 0
+            self._stop.wait(delay)
+
+
+class BusSampler(TemperatureSampler):
+    # Samples every probe of a W1Bus. latest() returns the reading of `primary`
+    # (the first probe by default) and readings() all of them.
+
+    def __init__(self, bus: W1Bus, interval: float = 1.0,
+                 clock: Callable[[], float] = time.monotonic) -> None:
+        super().__init__(bus.sweep, interval, clock)
+        self.bus = bus
+        self.read_time = bus.max_read_time
+        self.primary = next(iter(bus.probes), "")
+        self._readings: dict[str, Reading] = {}
+
+    def latest(self, sensor_id: str | None = None) -> Reading | None:
+        return self._readings.get(sensor_id if sensor_id is not None else self.primary)
+
+    def readings(self) -> dict[str, Reading]:
+        return self._readings
+
+    def sample(self) -> Reading | None:
+        now = self._clock()
+        readings = dict(self._readings)
+        new = []
+        for sensor_id, value in self.sensor().items():
+            if value is None:
+                self.failures += 1
+                continue
+            readings[sensor_id] = Reading(value, now, sensor_id)
+            new.append(readings[sensor_id])
+        # Swap the whole dict so readers always see a consistent sweep.
+        self._readings = readings
+        for reading in new:
+            for listener in self._listeners:
+                listener(reading)
+        return readings.get(self.primary)
+
+    def stop(self) -> None:
+        super().stop()
+        self.bus.close()
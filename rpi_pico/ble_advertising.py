@@ -1,8 +1,23 @@
 # Helpers for generating BLE advertising payloads.
 
-from micropython import const
 import struct
-import bluetooth
+
+try:
+    from micropython import const
+except ImportError:
+    # CPython, so the decoders can also be used by a central.
+    def const(x):
+        return x
+
+try:
+    import bluetooth
+
+    _uuid = bluetooth.UUID
+except ImportError:
+    bluetooth = None
+
+    def _uuid(u):
+        return u
 
 # Advertising payloads are repeated packets of the following form:
 #   1 byte data length (N + 1)
@@ -18,23 +33,32 @@ _ADV_TYPE_UUID16_MORE = const(0x2)
 _ADV_TYPE_UUID32_MORE = const(0x4)
 _ADV_TYPE_UUID128_MORE = const(0x6)
 _ADV_TYPE_APPEARANCE = const(0x19)
+_ADV_TYPE_SHORT_NAME = const(0x08)
+_ADV_TYPE_SERVICE_DATA16 = const(0x16)
+_ADV_TYPE_SERVICE_DATA32 = const(0x20)
+_ADV_TYPE_SERVICE_DATA128 = const(0x21)
+_ADV_TYPE_MANUFACTURER = const(0xFF)
 
 
 # Generate a payload to be passed to gap_advertise(adv_data=...).
-def advertising_payload(limited_disc=False, br_edr=False, name=None, services=None, appearance=0):
+# service_data is a list of (uuid, data) pairs; include_flags=False is meant for scan
+# response payloads, which must not carry the flags field.
+def advertising_payload(limited_disc=False, br_edr=False, name=None, services=None, appearance=0,
+                        service_data=None, include_flags=True):
     payload = bytearray()
 
     def _append(adv_type, value):
         nonlocal payload
         payload += struct.pack("BB", len(value) + 1, adv_type) + value
 
-    _append(
-        _ADV_TYPE_FLAGS,
-        struct.pack("B", (0x01 if limited_disc else 0x02) + (0x18 if br_edr else 0x04)),
-    )
+    if include_flags:
+        _append(
+            _ADV_TYPE_FLAGS,
+            struct.pack("B", (0x01 if limited_disc else 0x02) + (0x18 if br_edr else 0x04)),
+        )
 
     if name:
-        _append(_ADV_TYPE_NAME, name)
+        _append(_ADV_TYPE_NAME, name.encode() if isinstance(name, str) else name)
 
     if services:
         for uuid in services:
@@ -50,32 +74,137 @@ def advertising_payload(limited_disc=False, br_edr=False, name=None, services=No
     if appearance:
         _append(_ADV_TYPE_APPEARANCE, struct.pack("<h", appearance))
 
+    if service_data:
+        for uuid, data in service_data:
+            b = bytes(uuid)
+            if len(b) == 2:
+                _append(_ADV_TYPE_SERVICE_DATA16, b + data)
+            elif len(b) == 4:
+                _append(_ADV_TYPE_SERVICE_DATA32, b + data)
+            elif len(b) == 16:
+                _append(_ADV_TYPE_SERVICE_DATA128, b + data)
+
     return payload
 
 
+class AdvPayload:
+    # Index of the AD structures of a payload, built in a single pass.
+    # Fields are returned as memoryviews into the original payload, so nothing is
+    # copied until a value is actually converted. Works under MicroPython and CPython.
+
+    def __init__(self, payload):
+        self._mv = memoryview(payload)
+        # adv_type -> list of (start, end) offsets of the field data.
+        self._offsets = {}
+        mv = self._mv
+        n = len(mv)
+        i = 0
+        while i + 1 < n:
+            length = mv[i]
+            end = i + 1 + length
+            if length == 0 or end > n:
+                # Zero length marks the end of the significant part; anything else is truncated.
+                break
+            adv_type = mv[i + 1]
+            offsets = self._offsets.get(adv_type)
+            if offsets is None:
+                self._offsets[adv_type] = [(i + 2, end)]
+            else:
+                offsets.append((i + 2, end))
+            i = end
+
+    def __contains__(self, adv_type):
+        return adv_type in self._offsets
+
+    def types(self):
+        return list(self._offsets)
+
+    def field(self, adv_type):
+        offsets = self._offsets.get(adv_type)
+        if not offsets:
+            return None
+        start, end = offsets[0]
+        return self._mv[start:end]
+
+    def fields(self, adv_type):
+        mv = self._mv
+        return [mv[start:end] for start, end in self._offsets.get(adv_type, ())]
+
+    def flags(self):
+        offsets = self._offsets.get(_ADV_TYPE_FLAGS)
+        return self._mv[offsets[0][0]] if offsets else None
+
+    def name(self):
+        n = self.field(_ADV_TYPE_NAME) or self.field(_ADV_TYPE_SHORT_NAME)
+        return str(bytes(n), "utf-8") if n else ""
+
+    def appearance(self):
+        offsets = self._offsets.get(_ADV_TYPE_APPEARANCE)
+        return struct.unpack_from("<H", self._mv, offsets[0][0])[0] if offsets else None
+
+    def _unpack_list(self, types, fmt, size):
+        result = []
+        for adv_type in types:
+            for start, end in self._offsets.get(adv_type, ()):
+                for i in range(start, end - size + 1, size):
+                    result.append(struct.unpack_from(fmt, self._mv, i)[0])
+        return result
+
+    def uuids16(self):
+        return self._unpack_list((_ADV_TYPE_UUID16_COMPLETE, _ADV_TYPE_UUID16_MORE), "<H", 2)
+
+    def uuids32(self):
+        return self._unpack_list((_ADV_TYPE_UUID32_COMPLETE, _ADV_TYPE_UUID32_MORE), "<I", 4)
+
+    def uuids128(self):
+        # Little-endian 16 byte views, as stored in the payload.
+        mv = self._mv
+        result = []
+        for adv_type in (_ADV_TYPE_UUID128_COMPLETE, _ADV_TYPE_UUID128_MORE):
+            for start, end in self._offsets.get(adv_type, ()):
+                for i in range(start, end - 15, 16):
+                    result.append(mv[i : i + 16])
+        return result
+
+    def service_data(self):
+        # List of (uuid, data) pairs. 16 and 32-bit UUIDs are ints, 128-bit UUIDs are
+        # little-endian 16 byte views.
+        mv = self._mv
+        result = []
+        for start, end in self._offsets.get(_ADV_TYPE_SERVICE_DATA16, ()):
+            result.append((struct.unpack_from("<H", mv, start)[0], mv[start + 2 : end]))
+        for start, end in self._offsets.get(_ADV_TYPE_SERVICE_DATA32, ()):
+            result.append((struct.unpack_from("<I", mv, start)[0], mv[start + 4 : end]))
+        for start, end in self._offsets.get(_ADV_TYPE_SERVICE_DATA128, ()):
+            result.append((mv[start : start + 16], mv[start + 16 : end]))
+        return result
+
+    def manufacturer_data(self):
+        # List of (company_id, data) pairs.
+        mv = self._mv
+        return [
+            (struct.unpack_from("<H", mv, start)[0], mv[start + 2 : end])
+            for start, end in self._offsets.get(_ADV_TYPE_MANUFACTURER, ())
+        ]
+
+
 def decode_field(payload, adv_type):
-    i = 0
-    result = []
-    while i + 1 < len(payload):
-        if payload[i + 1] == adv_type:
-            result.append(payload[i + 2 : i + payload[i] + 1])
-        i += 1 + payload[i]
-    return result
+    return AdvPayload(payload).fields(adv_type)
 
 
 def decode_name(payload):
-    n = decode_field(payload, _ADV_TYPE_NAME)
-    return str(n[0], "utf-8") if n else ""
+    return AdvPayload(payload).name()
 
 
 def decode_services(payload):
+    adv = AdvPayload(payload)
     services = []
-    for u in decode_field(payload, _ADV_TYPE_UUID16_COMPLETE):
-        services.append(bluetooth.UUID(struct.unpack("<h", u)[0]))
-    for u in decode_field(payload, _ADV_TYPE_UUID32_COMPLETE):
-        services.append(bluetooth.UUID(struct.unpack("<d", u)[0]))
-    for u in decode_field(payload, _ADV_TYPE_UUID128_COMPLETE):
-        services.append(bluetooth.UUID(u))
+    for u in adv.uuids16():
+        services.append(_uuid(u))
+    for u in adv.uuids32():
+        services.append(_uuid(u))
+    for u in adv.uuids128():
+        services.append(_uuid(bytes(u)))
     return services
 
 
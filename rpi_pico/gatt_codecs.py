@@ -0,0 +1,161 @@
+# Encoders/decoders of characteristic values, shared by the firmware and the centrals.
+#
+# CODECS maps characteristic UUIDs (lowercase 128-bit strings, see uuid_key) to a
+# codec. Fixed-size values are decoded with unpack_from straight from the buffer
+# received (bytes, bytearray or memoryview), so decoding is one dict lookup and one
+# unpack_from. Under CPython the format is compiled once into a struct.Struct;
+# MicroPython has no struct.Struct, so there the format string is passed on each call.
+#
+# The exercises import this module through exercises/ble_codecs.py.
+
+import struct
+
+try:
+    _Struct = struct.Struct
+except AttributeError:
+    # MicroPython.
+    _Struct = None
+
+_BASE_UUID = "-0000-1000-8000-00805f9b34fb"
+
+
+def uuid_key(uuid):
+    # 0x2A6E, "2a6e", "00002a6e" and "00002A6E-0000-1000-8000-00805F9B34FB" give the same key.
+    if isinstance(uuid, int):
+        return "%08x%s" % (uuid, _BASE_UUID)
+    uuid = str(uuid).lower()
+    if uuid.startswith("0x"):
+        uuid = uuid[2:]
+    if len(uuid) == 4:
+        return "0000" + uuid + _BASE_UUID
+    if len(uuid) == 8:
+        return uuid + _BASE_UUID
+    return uuid
+
+
+class StructCodec:
+    # A single number (raw value / divisor, e.g. 100 for 0.01 degC), or a tuple when the
+    # format has several fields, with a tuple of divisors (one per field). Divisors are
+    # integers so that decoding gives exactly the value / 100 it replaces (value * 0.01
+    # doesn't: 2008 * 0.01 is 20.080000000000002). Encoding rounds to the nearest raw
+    # value: int() would truncate 20.08 * 100 (2007.9999999999998) to 2007.
+    def __init__(self, fmt, divisor=1):
+        self.format = fmt
+        self.size = struct.calcsize(fmt)
+        self.divisor = divisor
+        self._single = len(struct.unpack(fmt, bytes(self.size))) == 1
+        # Multi-field formats without divisors pass the tuples through as they are.
+        self._scaled = not self._single and divisor != 1
+        if _Struct is not None:
+            compiled = _Struct(fmt)
+            self._unpack_from = compiled.unpack_from
+            self._pack = compiled.pack
+            self._pack_into = compiled.pack_into
+        else:
+            self._unpack_from = lambda buffer, offset=0: struct.unpack_from(fmt, buffer, offset)
+            self._pack = lambda *values: struct.pack(fmt, *values)
+            self._pack_into = lambda buffer, offset, *values: struct.pack_into(
+                fmt, buffer, offset, *values)
+
+    def decode(self, data, offset=0):
+        values = self._unpack_from(data, offset)
+        if self._scaled:
+            return tuple(value / divisor if divisor != 1 else value
+                         for value, divisor in zip(values, self.divisor))
+        if not self._single:
+            return values
+        return values[0] / self.divisor if self.divisor != 1 else values[0]
+
+    def _raw(self, value):
+        return round(value * self.divisor) if self.divisor != 1 else value
+
+    def _raw_fields(self, values):
+        if not self._scaled:
+            return values
+        return [round(value * divisor) if divisor != 1 else value
+                for value, divisor in zip(values, self.divisor)]
+
+    def encode(self, value):
+        if not self._single:
+            return self._pack(*self._raw_fields(value))
+        return self._pack(self._raw(value))
+
+    def encode_into(self, buffer, offset, value):
+        # Writes in place, e.g. into the service data of an advertising payload.
+        if self._single:
+            self._pack_into(buffer, offset, self._raw(value))
+        else:
+            self._pack_into(buffer, offset, *self._raw_fields(value))
+
+
+class ArrayCodec:
+    # A list of values of the same format, as many as fit in the data.
+    def __init__(self, item_fmt, divisor=1):
+        self.item = StructCodec(item_fmt, divisor)
+
+    def decode(self, data, offset=0):
+        size = self.item.size
+        return [self.item.decode(data, n) for n in range(offset, len(data) - size + 1, size)]
+
+    def encode(self, values):
+        buffer = bytearray(self.item.size * len(values))
+        for n, value in enumerate(values):
+            self.item.encode_into(buffer, n * self.item.size, value)
+        return bytes(buffer)
+
+
+class Utf8Codec:
+    size = None
+
+    def decode(self, data, offset=0):
+        return str(data[offset:], "utf-8")
+
+    def encode(self, value):
+        return value.encode("utf-8")
+
+
+# org.bluetooth.characteristic.temperature: sint16 in 0.01 degrees Celsius.
+TEMPERATURE = StructCodec("<h", 100)
+# Broadcast mode service data: temperature (sint16, 0.01 degC) + sequence (uint8).
+BROADCAST = StructCodec("<hB", (100, 1))
+# Custom characteristic with every 1-Wire probe temperature (sint16, 0.01 degC).
+PROBE_TEMPERATURES = ArrayCodec("<h", 100)
+UTF8 = Utf8Codec()
+
+PROBE_TEMPERATURES_UUID = "51ff12bb-3ed8-46e5-b4f9-d64e2fec0002"
+
+CODECS = {
+    uuid_key(0x2A00): UTF8,  # device name
+    uuid_key(0x2A19): StructCodec("<B"),  # battery level (%)
+    uuid_key(0x2A24): UTF8,  # model number
+    uuid_key(0x2A25): UTF8,  # serial number
+    uuid_key(0x2A26): UTF8,  # firmware revision
+    uuid_key(0x2A27): UTF8,  # hardware revision
+    uuid_key(0x2A28): UTF8,  # software revision
+    uuid_key(0x2A29): UTF8,  # manufacturer name
+    uuid_key(0x2A6D): StructCodec("<I", 10),  # pressure (Pa)
+    uuid_key(0x2A6E): TEMPERATURE,
+    uuid_key(0x2A6F): StructCodec("<H", 100),  # humidity (%)
+    PROBE_TEMPERATURES_UUID: PROBE_TEMPERATURES,
+}
+
+
+def register(uuid, codec):
+    CODECS[uuid_key(uuid)] = codec
+
+
+def codec_for(uuid):
+    # The key is computed here; keep the codec around (or use CODECS[key]) in hot paths.
+    return CODECS.get(uuid_key(uuid))
+
+
+def decode(uuid, data):
+    # bleak reports lowercase 128-bit UUIDs, which are already keys.
+    codec = CODECS.get(uuid) or CODECS.get(uuid_key(uuid))
+    if codec is None:
+        return bytes(data)
+    return codec.decode(data)
+
+
+def encode(uuid, value):
+    return CODECS[uuid_key(uuid)].encode(value)
@@ -0,0 +1,124 @@
+# History of timestamped samples, downloaded by a central in MTU-sized chunks.
+#
+# A peripheral keeps the last samples in a History ring. Every sample gets a sequence
+# number (0 for the first one since boot), so a central that was offline asks for
+# everything after the last sequence it stored and gets it in notifications of up to
+# 59 samples (MTU 247) instead of one read per sample. Two characteristics:
+#   - control (read/write). Read: uint32 first sequence still kept, uint32 next
+#     sequence. Write: uint8 opcode, uint32 sequence, uint16 MTU of the central
+#     (0 if unknown). OP_START streams from the sequence, OP_STOP ends the transfer.
+#   - data (notify). Chunk, little endian:
+#       uint32 sequence of the first sample
+#       uint32 timestamp of the first sample (ms, peripheral clock)
+#       K x (uint16 ms after the first sample, sint16 temperature in 0.01 degC)
+#     A chunk without samples ends the transfer: its sequence is the one to resume
+#     from and its timestamp is the peripheral clock when it was sent, which maps the
+#     peripheral clock to the central's.
+# A sequence jump between chunks means the samples in between were overwritten before
+# they were sent.
+#
+# Nothing here needs the bluetooth module, so it also runs on CPython (the exercises
+# import it through exercises/ble_history.py). Timestamps are ticks_ms values, which
+# wrap every TICKS_PERIOD (~12.4 days), so a history spanning the wrap gets wrong times.
+
+import struct
+from array import array
+
+from sampler import DEFAULT_MTU, TICKS_PERIOD, ticks_diff  # noqa: F401
+
+try:
+    from micropython import const
+except ImportError:
+    def const(x):
+        return x
+
+HISTORY_CONTROL_UUID = "51ff12bb-3ed8-46e5-b4f9-d64e2fec0004"
+HISTORY_DATA_UUID = "51ff12bb-3ed8-46e5-b4f9-d64e2fec0005"
+
+OP_START = const(1)
+OP_STOP = const(2)
+
+CONTROL_FORMAT = "<BIH"
+STATUS_FORMAT = "<II"
+CHUNK_HEADER_FORMAT = "<II"
+SAMPLE_FORMAT = "<Hh"
+CONTROL_SIZE = struct.calcsize(CONTROL_FORMAT)
+CHUNK_HEADER_SIZE = struct.calcsize(CHUNK_HEADER_FORMAT)
+SAMPLE_SIZE = struct.calcsize(SAMPLE_FORMAT)
+
+# ATT notification header: opcode (1 byte) + attribute handle (2 bytes).
+_ATT_HEADER_SIZE = const(3)
+
+
+def chunk_capacity(mtu):
+    # Samples per chunk: 59 for an MTU of 247, 3 for the default 23.
+    return max((mtu - _ATT_HEADER_SIZE - CHUNK_HEADER_SIZE) // SAMPLE_SIZE, 1)
+
+
+class History:
+    def __init__(self, size=4096):
+        # Arrays rather than lists: 6 bytes per sample, ~24KB for the default size.
+        self.size = size
+        self.total = 0
+        self._timestamps = array("I", bytes(4 * size))
+        self._values = array("h", bytes(2 * size))
+
+    def first(self):
+        # Sequence of the oldest sample still kept.
+        return max(self.total - self.size, 0)
+
+    def append(self, timestamp_ms, value):
+        i = self.total % self.size
+        self._timestamps[i] = timestamp_ms & 0xFFFFFFFF
+        self._values[i] = value
+        self.total += 1
+
+    def status(self):
+        return struct.pack(STATUS_FORMAT, self.first(), self.total)
+
+    def pack_chunk(self, sequence, max_samples, now_ms):
+        # Returns (chunk, sequence of the next chunk, True once the transfer is done).
+        # Like SampleBatch.pack, a chunk stops early if a sample is more than 65.535s
+        # after the first one.
+        start = max(sequence, self.first())
+        count = min(self.total - start, max_samples)
+        if count <= 0:
+            return (struct.pack(CHUNK_HEADER_FORMAT, self.total, now_ms & 0xFFFFFFFF),
+                    self.total, True)
+        first = self._timestamps[start % self.size]
+        buf = bytearray(CHUNK_HEADER_SIZE + count * SAMPLE_SIZE)
+        struct.pack_into(CHUNK_HEADER_FORMAT, buf, 0, start, first)
+        offset = CHUNK_HEADER_SIZE
+        packed = 0
+        for n in range(start, start + count):
+            i = n % self.size
+            delta = ticks_diff(self._timestamps[i], first)
+            if delta > 0xFFFF:
+                break
+            struct.pack_into(SAMPLE_FORMAT, buf, offset, delta, self._values[i])
+            offset += SAMPLE_SIZE
+            packed += 1
+        return memoryview(buf)[:offset], start + packed, False
+
+
+def pack_control(opcode, sequence=0, mtu=0):
+    return struct.pack(CONTROL_FORMAT, opcode, sequence, mtu)
+
+
+def unpack_control(data):
+    # (opcode, sequence, mtu)
+    return struct.unpack_from(CONTROL_FORMAT, data, 0)
+
+
+def unpack_status(data):
+    # (first sequence, next sequence)
+    return struct.unpack_from(STATUS_FORMAT, data, 0)
+
+
+def unpack_chunk(data):
+    # (sequence, first timestamp ms, [(ms after the first, value), ...])
+    sequence, first = struct.unpack_from(CHUNK_HEADER_FORMAT, data, 0)
+    samples = [struct.unpack_from(SAMPLE_FORMAT, data, offset)
+               for offset in range(CHUNK_HEADER_SIZE, len(data) - SAMPLE_SIZE + 1,
+                                   SAMPLE_SIZE)]
+    return sequence, first, samples
@@ -2,24 +2,56 @@
 #
 # The sensor's local value is updated, and it will notify
 # any connected central every 10 seconds.
+#
+# In broadcast mode the latest temperature (org.bluetooth.characteristic.temperature
+# format) and a sequence counter are also sent in the Service Data AD field of the
+# advertising payload, so centrals can collect readings without connecting.
+#
+# The ADC is read `oversample` times per reported temperature (see sampler.py). In
+# batched mode the samples are also kept in a ring and sent on the temperature batch
+# characteristic, as many per notification as the negotiated MTU allows.
+#
+# BLEDevice.run() drives the peripheral with uasyncio tasks: the sampler, one
+# notifier per connection, an advertising watchdog and the status LED. Periodic
+# tasks use a Ticker, which schedules from the previous deadline so the cadence
+# doesn't drift with the time spent working.
+#
+# Notifications and indications go through a ConnectionQueue per connection
+# (send_queue.py): indications wait for the previous one to be confirmed and
+# notifications to a slow central are coalesced to the latest value.
+#
+# Every reported temperature is also kept in a History ring (gatt_history.py), which a
+# central that was offline downloads through the history control/data characteristics,
+# in chunks as large as the MTU of its connection allows.
 
+try:
+    import asyncio
+except ImportError:
+    import uasyncio as asyncio
 import bluetooth
 import random
-import struct
 import time
 import machine
 import ubinascii
-from ble_advertising import advertising_payload
+from ble_advertising import AdvPayload, advertising_payload
+from gatt_codecs import BROADCAST, TEMPERATURE
+from gatt_history import (CONTROL_SIZE, HISTORY_CONTROL_UUID, HISTORY_DATA_UUID, OP_START,
+                          History, chunk_capacity, unpack_control)
+from sampler import DEFAULT_MTU, OversamplingSampler, SampleBatch, batch_capacity
+from send_queue import COUNTERS, ConnectionQueue
 from micropython import const
 from machine import Pin
 
 _IRQ_CENTRAL_CONNECT = const(1)
 _IRQ_CENTRAL_DISCONNECT = const(2)
+_IRQ_GATTS_WRITE = const(3)
 _IRQ_GATTS_INDICATE_DONE = const(20)
 _IRQ_GATTS_READ_REQUEST = const(4)
+_IRQ_MTU_EXCHANGED = const(21)
 
 
 _FLAG_READ = const(0x0002)
+_FLAG_WRITE = const(0x0008)
 _FLAG_NOTIFY = const(0x0010)
 _FLAG_INDICATE = const(0x0020)
 
@@ -28,9 +60,15 @@ _ENV_SENSE_UUID = bluetooth.UUID(0x181A)
 # org.bluetooth.characteristic.temperature
 _TEMP_CHAR = (bluetooth.UUID(0x2A6E),
               _FLAG_READ | _FLAG_NOTIFY | _FLAG_INDICATE, )
+# Custom characteristic with timestamped temperature samples (format in sampler.py).
+_TEMP_BATCH_CHAR = (bluetooth.UUID("51ff12bb-3ed8-46e5-b4f9-d64e2fec0003"),
+                    _FLAG_READ | _FLAG_NOTIFY, )
+# Custom characteristics to download the history (protocol in gatt_history.py).
+_HISTORY_CONTROL_CHAR = (bluetooth.UUID(HISTORY_CONTROL_UUID), _FLAG_READ | _FLAG_WRITE, )
+_HISTORY_DATA_CHAR = (bluetooth.UUID(HISTORY_DATA_UUID), _FLAG_NOTIFY, )
 _ENV_SENSE_SERVICE = (
     _ENV_SENSE_UUID,
-    (_TEMP_CHAR,),
+    (_TEMP_CHAR, _TEMP_BATCH_CHAR, _HISTORY_CONTROL_CHAR, _HISTORY_DATA_CHAR),
 )
 
 _DEVICE_INFO_UUID = bluetooth.UUID(0x180A)
@@ -50,30 +88,92 @@ SERVICES = (_DEVICE_INFO_SERVICE, _ENV_SENSE_SERVICE)
 # org.bluetooth.characteristic.gap.appearance.xml
 _ADV_APPEARANCE_GENERIC_THERMOMETER = const(768)
 
+# MTU asked for when a central starts the exchange: 247 fits 60 samples per batch.
+_PREFERRED_MTU = const(247)
+# Delay before trying again when the stack had no room for a notification.
+_RETRY_MS = const(20)
+
+
+class Ticker:
+    def __init__(self, period_ms):
+        self.period_ms = period_ms
+        self._deadline = time.ticks_ms()
+
+    async def wait(self):
+        self._deadline = time.ticks_add(self._deadline, self.period_ms)
+        delay = time.ticks_diff(self._deadline, time.ticks_ms())
+        if delay < 0:
+            # Too late for this period (and maybe more): skip them instead of bursting.
+            self._deadline = time.ticks_ms()
+            delay = 0
+        await asyncio.sleep_ms(delay)
+
 
 class BLEDevice:
-    def __init__(self, ble, name=""):
-        self._sensor_temp = machine.ADC(4)
+    def __init__(self, ble, name="", broadcast=False, oversample=16, batched=False,
+                 verbose=False, max_connections=1, history=4096):
+        self._sampler = OversamplingSampler(machine.ADC(4), oversample)
         self._ble = ble
         self._ble.active(True)
+        self._ble.config(mtu=_PREFERRED_MTU)
         
         self._ble.irq(self._irq)
         (
             (self._manufacturer, self._model, self._serial),
-            (self._handle,),
+            (self._handle, self._batch_handle, self._history_control, self._history_data),
         ) = self._ble.gatts_register_services(SERVICES)
+        # The default attribute buffer (20 bytes) is too small for a batch.
+        self._ble.gatts_set_buffer(self._batch_handle, _PREFERRED_MTU - 3)
         self._ble.gatts_write(self._manufacturer,"PyconTemperatureSensor")
         self._ble.gatts_write(self._model,"FANTASTIC.2024")
         self._ble.gatts_write(self._serial,"2024.10.19")
         
         self._connections = set()
+        self._max_connections = max_connections
+        self._advertising = False
+        # Set by the IRQ handler when a central connects or disconnects.
+        self._connections_changed = asyncio.ThreadSafeFlag()
+        # Per connection: notifier task and the flag that wakes it up, and outbound queue.
+        self._notifiers = {}
+        self._queues = {}
+        # Counters of the connections already closed.
+        self._closed_counters = dict.fromkeys(COUNTERS, 0)
+        self._running = False
+        self._verbose = verbose
+        self._batched = batched
+        self._batch = SampleBatch()
+        # Per connection: negotiated MTU and index of the next sample to send.
+        self._mtu = {}
+        self._cursors = {}
+        # `history` reports (~68 minutes at one per second); per connection downloading
+        # it, the sequence of the next chunk.
+        self._history = History(history)
+        self._history_cursors = {}
+        # Last status written to the control attribute (see _refresh_history_status).
+        self._history_status = None
+        self._write_history_status()
         if len(name) == 0:
             name = 'Pico %s' % ubinascii.hexlify(
                 self._ble.config('mac')[1], ':').decode().upper()
         print('Sensor name %s' % name)
-        self._payload = advertising_payload(
-            name=name, services=[_ENV_SENSE_UUID]
-        )
+        self._broadcast = broadcast
+        self._broadcast_seq = 0
+        if broadcast:
+            # The name doesn't fit next to the service data in 31 bytes, so it goes in
+            # the scan response. The advertisement is not connectable: readings are
+            # only collected from scan results.
+            self._payload = advertising_payload(
+                services=[_ENV_SENSE_UUID],
+                service_data=[(_ENV_SENSE_UUID, BROADCAST.encode((0, 0)))],
+            )
+            self._resp_payload = advertising_payload(name=name, include_flags=False)
+            # View into self._payload, so readings are written in place.
+            self._broadcast_value = AdvPayload(self._payload).service_data()[0][1]
+        else:
+            self._payload = advertising_payload(
+                name=name, services=[_ENV_SENSE_UUID]
+            )
+            self._resp_payload = None
         self._advertise()
 
     def _irq(self, event, data):
@@ -81,45 +181,264 @@ class BLEDevice:
         if event == _IRQ_CENTRAL_CONNECT:
             conn_handle, _, _ = data
             self._connections.add(conn_handle)
+            self._mtu[conn_handle] = DEFAULT_MTU
+            self._cursors[conn_handle] = self._batch.total
+            self._queues[conn_handle] = ConnectionQueue(self._ble, conn_handle)
+            # The controller stops advertising when a central connects.
+            self._advertising = False
+            self._connections_changed.set()
         elif event == _IRQ_CENTRAL_DISCONNECT:
             conn_handle, _, _ = data
             self._connections.remove(conn_handle)
+            self._mtu.pop(conn_handle, None)
+            self._cursors.pop(conn_handle, None)
+            self._history_cursors.pop(conn_handle, None)
+            queue = self._queues.pop(conn_handle, None)
+            if queue is not None:
+                for name, value in queue.counters().items():
+                    self._closed_counters[name] += value
+            self._connections_changed.set()
             # Start advertising again to allow a new connection.
             self._advertise()
+        elif event == _IRQ_GATTS_WRITE:
+            conn_handle, attr_handle = data
+            if attr_handle == self._history_control:
+                # Read the request right away: the attribute is shared by every connection.
+                self._history_request(conn_handle, self._ble.gatts_read(attr_handle))
         elif event == _IRQ_GATTS_INDICATE_DONE:
             conn_handle, value_handle, status = data
+            queue = self._queues.get(conn_handle)
+            if queue is not None:
+                queue.indicate_done(status)
+                # The next indication is sent by the notifier.
+                notifier = self._notifiers.get(conn_handle)
+                if notifier is not None:
+                    notifier[1].set()
+        elif event == _IRQ_MTU_EXCHANGED:
+            conn_handle, mtu = data
+            self._mtu[conn_handle] = mtu
         # elif event == _IRQ_GATTS_READ_REQUEST:
         #     conn_handle, attr_handle = data
         #     # print("attr_handle = " % str(type(attr_handle)))
         #     # gatt_read_manufacturer = self._ble.gatts_read(self._manufacturer)
         #     # print(gatt_read_manufacturer)
 
+    def _history_request(self, conn_handle, request):
+        # The MTU in the request is ignored: the one negotiated for the connection is known.
+        # Leave the status readable, not the request.
+        self._write_history_status()
+        if len(request) < CONTROL_SIZE or conn_handle not in self._connections:
+            return
+        opcode, sequence, _ = unpack_control(request)
+        if opcode == OP_START:
+            self._history_cursors[conn_handle] = sequence
+        else:
+            self._history_cursors.pop(conn_handle, None)
+        # The chunks are sent by the notifier.
+        notifier = self._notifiers.get(conn_handle)
+        if notifier is not None:
+            notifier[1].set()
+
+    def _write_history_status(self):
+        self._history_status = self._history.status()
+        self._ble.gatts_write(self._history_control, self._history_status)
+
+    def _refresh_history_status(self):
+        # Anything but the status written last is a request the IRQ handler hasn't read
+        # yet (a request is never as long as a status): leave it, _history_request()
+        # writes the status once it has the request.
+        if self._ble.gatts_read(self._history_control) == self._history_status:
+            self._write_history_status()
+
+    def sample(self):
+        # One ADC read into the running average; call it faster than update_temperature.
+        self._sampler.accumulate()
+
     def update_temperature(self, notify=False, indicate=False):
         # Write the local value, ready for a central to read.
         temp_deg_c = self._get_temp()
-        print("write temp %.2f degc" % temp_deg_c)
-        self._ble.gatts_write(self._handle, struct.pack(
-            "<h", int(temp_deg_c * 100)))
-        if notify or indicate:
+        if self._verbose:
+            print("write temp %.2f degc" % temp_deg_c)
+        encoded = TEMPERATURE.encode(temp_deg_c)
+        self._ble.gatts_write(self._handle, encoded)
+        # Rounded like the encoded value, not truncated.
+        value = round(temp_deg_c * 100)
+        now = time.ticks_ms()
+        self._history.append(now, value)
+        self._refresh_history_status()
+        if self._broadcast:
+            self._update_broadcast(temp_deg_c)
+        if self._batched:
+            self._batch.append(now, value)
+        elif notify or indicate:
             for conn_handle in self._connections:
+                queue = self._queues[conn_handle]
                 if notify:
                     # Notify connected centrals.
-                    self._ble.gatts_notify(conn_handle, self._handle)
+                    queue.notify(self._handle)
                 if indicate:
-                    # Indicate connected centrals.
-                    self._ble.gatts_indicate(conn_handle, self._handle)
+                    # Indicate connected centrals. Unlike notifications, every queued
+                    # indication carries its own value, not the attribute's latest one.
+                    queue.indicate(self._handle, encoded)
+        if not (notify or indicate):
+            return
+        # Under run() the notifier tasks send (and retry); otherwise send right away.
+        for conn_handle in self._connections:
+            if not self._running:
+                self._send(conn_handle)
+            elif conn_handle in self._notifiers:
+                self._notifiers[conn_handle][1].set()
+
+    def counters(self):
+        # queued/sent/dropped/failed messages, over every connection since start.
+        totals = dict(self._closed_counters)
+        for queue in self._queues.values():
+            for name, value in queue.counters().items():
+                totals[name] += value
+        return totals
+
+    def _send(self, conn_handle):
+        # Returns False if something has to be retried later.
+        sent = self._send_batches(conn_handle) if self._batched else True
+        if conn_handle in self._history_cursors:
+            sent = self._send_history(conn_handle) and sent
+        return self._queues[conn_handle].flush() and sent
+
+    def _send_history(self, conn_handle):
+        # Sends chunks until the transfer is done or the stack has no room; the cursor only
+        # moves past the chunks actually sent, so the notifier retries from there.
+        queue = self._queues[conn_handle]
+        capacity = chunk_capacity(self._mtu[conn_handle])
+        cursor = self._history_cursors[conn_handle]
+        while True:
+            data, next_cursor, done = self._history.pack_chunk(cursor, capacity,
+                                                               time.ticks_ms())
+            if not queue.try_notify(self._history_data, data):
+                self._history_cursors[conn_handle] = cursor
+                return False
+            if done:
+                del self._history_cursors[conn_handle]
+                return True
+            cursor = next_cursor
+
+    def _send_batches(self, conn_handle):
+        # A connection is only notified once it has a full batch for its MTU. A batch the
+        # stack had no room for stays in the ring, unless newer samples overwrite it (those
+        # samples are counted as dropped).
+        queue = self._queues[conn_handle]
+        capacity = batch_capacity(self._mtu[conn_handle])
+        cursor = self._cursors[conn_handle]
+        lost = self._batch.total - self._batch.size - cursor
+        if lost > 0:
+            queue.dropped += lost
+            cursor += lost
+        sent = True
+        while self._batch.pending(cursor) >= capacity:
+            data, next_cursor = self._batch.pack(cursor, capacity)
+            if not queue.try_notify(self._batch_handle, data):
+                sent = False
+                break
+            cursor = next_cursor
+        self._cursors[conn_handle] = cursor
+        return sent
+
+    def _update_broadcast(self, temp_deg_c):
+        # Patch the service data in place; the rest of the payload is reused as is.
+        self._broadcast_seq = (self._broadcast_seq + 1) & 0xFF
+        BROADCAST.encode_into(self._broadcast_value, 0, (temp_deg_c, self._broadcast_seq))
+        self._advertise()
 
     def _advertise(self, interval_us=100000):
-        self._ble.gap_advertise(interval_us, adv_data=self._payload)
+        # _advertising is only set once the controller accepted to advertise.
+        self._advertising = False
+        try:
+            if self._broadcast:
+                self._ble.gap_advertise(interval_us, adv_data=self._payload,
+                                        resp_data=self._resp_payload, connectable=False)
+            else:
+                self._ble.gap_advertise(interval_us, adv_data=self._payload)
+        except OSError as exc:
+            # e.g. the controller is busy; the watchdog tries again.
+            print("Advertising failed:", exc)
+            return
+        self._advertising = True
 
-    # ref https://github.com/raspberrypi/pico-micropython-examples/blob/master/adc/temperature.py
     def _get_temp(self):
-        conversion_factor = 3.3 / (65535)
-        reading = self._sensor_temp.read_u16() * conversion_factor
+        return self._sampler.read()
+
+    async def run(self, led=None, sample_period_ms=100, report_every=10,
+                  watchdog_period_ms=5000, notify=True, indicate=False):
+        # Reads the ADC every sample_period_ms and reports (and notifies) the average of
+        # every report_every reads.
+        self._running = True
+        tasks = [
+            asyncio.create_task(self._sampler_task(sample_period_ms, report_every, notify,
+                                                   indicate)),
+            asyncio.create_task(self._connections_task()),
+            asyncio.create_task(self._advertising_watchdog(watchdog_period_ms)),
+        ]
+        if led is not None:
+            tasks.append(asyncio.create_task(self._led_task(led)))
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            self._running = False
+            for task in tasks:
+                task.cancel()
+
+    async def _sampler_task(self, period_ms, report_every, notify, indicate):
+        ticker = Ticker(period_ms)
+        count = 0
+        while True:
+            self.sample()
+            count += 1
+            if count >= report_every:
+                count = 0
+                self.update_temperature(notify, indicate)
+            await ticker.wait()
+
+    async def _connections_task(self):
+        # Starts a notifier for every new connection and stops those of closed ones.
+        while True:
+            await self._connections_changed.wait()
+            for conn_handle in self._connections:
+                if conn_handle not in self._notifiers:
+                    wake = asyncio.ThreadSafeFlag()
+                    task = asyncio.create_task(self._notifier(conn_handle, wake))
+                    self._notifiers[conn_handle] = (task, wake)
+            for conn_handle in list(self._notifiers):
+                if conn_handle not in self._connections:
+                    task, _ = self._notifiers.pop(conn_handle)
+                    task.cancel()
+
+    async def _notifier(self, conn_handle, wake):
+        # Woken up by a new report or an indication confirmed; retries while the stack
+        # has no room for this connection.
+        while True:
+            await wake.wait()
+            while conn_handle in self._connections and not self._send(conn_handle):
+                await asyncio.sleep_ms(_RETRY_MS)
+            if conn_handle not in self._connections:
+                return
+
+    async def _advertising_watchdog(self, period_ms):
+        # Re-advertises while below max_connections: the controller stops advertising when
+        # a central connects, and starting it again may have failed (see _advertise).
+        ticker = Ticker(period_ms)
+        while True:
+            await ticker.wait()
+            if not self._advertising and len(self._connections) < self._max_connections:
+                self._advertise()
 
-        # The temperature sensor measures the Vbe voltage of a biased bipolar diode, connected to the fifth ADC channel
-        # Typically, Vbe = 0.706V at 27 degrees C, with a slope of -1.721mV (0.001721) per degree.
-        return 27 - (reading - 0.706) / 0.001721
+    async def _led_task(self, led):
+        # Blinks while waiting for a central, steady on while connected.
+        ticker = Ticker(500)
+        while True:
+            if self._connections:
+                led.on()
+            else:
+                led.toggle()
+            await ticker.wait()
 
 
 # class BLETemperature:
@@ -185,15 +504,12 @@ def demo():
     ble = bluetooth.BLE()
     # temp = BLETemperature(ble)
     temp = BLEDevice(ble)
-    # counter = 0
+    # temp = BLEDevice(ble, broadcast=True)
+    # temp = BLEDevice(ble, batched=True)
     led = Pin('LED', Pin.OUT)
 
-    while True:
-        # if counter % 10 == 0:
-        temp.update_temperature(notify=True, indicate=False)
-        led.toggle()
-        time.sleep_ms(1000)
-        # counter += 1
+    # The ADC is read every 100ms and the average reported every second.
+    asyncio.run(temp.run(led, sample_period_ms=100, report_every=10))
 
 
 if __name__ == "__main__":
@@ -0,0 +1,128 @@
+# Oversampled temperature readings and multi-sample notifications.
+#
+# The RP2040 temperature sensor is noisy: a single read_u16() jumps by several
+# tenths of a degree. OversamplingSampler accumulates ADC reads at a higher rate
+# than temperatures are reported (accumulate() is cheap: one read and one add)
+# and read() returns the mean of everything accumulated since the previous read.
+#
+# SampleBatch keeps the last samples in a ring and packs as many of them as fit
+# in one notification for the MTU negotiated by each connection, so several
+# samples go out in a single radio event. Batch format (little endian):
+#   uint32 timestamp of the first sample (ms)
+#   K x (uint16 ms after the first sample, sint16 temperature in 0.01 degC)
+#
+# Nothing here needs the bluetooth/machine modules, so it also runs on CPython.
+
+import struct
+
+try:
+    from micropython import const
+except ImportError:
+    # CPython, so the packing code can be used by a central (and tested off-board).
+    def const(x):
+        return x
+
+# ticks_ms() wraps at TICKS_PERIOD (2**30 ms, ~12.4 days) on MicroPython ports.
+TICKS_PERIOD = const(1 << 30)
+
+try:
+    from time import ticks_diff
+except ImportError:
+    def ticks_diff(a, b):
+        # Same as MicroPython, so ages computed off-device match the firmware's.
+        return ((a - b + TICKS_PERIOD // 2) & (TICKS_PERIOD - 1)) - TICKS_PERIOD // 2
+
+# ATT notification header: opcode (1 byte) + attribute handle (2 bytes).
+_ATT_HEADER_SIZE = const(3)
+DEFAULT_MTU = const(23)
+BATCH_HEADER_FORMAT = "<I"
+BATCH_SAMPLE_FORMAT = "<Hh"
+BATCH_HEADER_SIZE = struct.calcsize(BATCH_HEADER_FORMAT)
+BATCH_SAMPLE_SIZE = struct.calcsize(BATCH_SAMPLE_FORMAT)
+
+_ADC_VOLTS = 3.3 / 65535
+
+
+# ref https://github.com/raspberrypi/pico-micropython-examples/blob/master/adc/temperature.py
+def adc_to_celsius(raw):
+    # The temperature sensor measures the Vbe voltage of a biased bipolar diode, connected to
+    # the fifth ADC channel. Typically, Vbe = 0.706V at 27 degrees C, with a slope of -1.721mV
+    # (0.001721) per degree.
+    return 27 - (raw * _ADC_VOLTS - 0.706) / 0.001721
+
+
+class OversamplingSampler:
+    def __init__(self, adc, oversample=16):
+        self._adc = adc
+        self.oversample = oversample
+        self._sum = 0
+        self._count = 0
+
+    def accumulate(self):
+        self._sum += self._adc.read_u16()
+        self._count += 1
+
+    def read(self):
+        # Mean of the reads accumulated since the last call; if accumulate() was not
+        # called in the meantime, a burst of `oversample` reads is taken instead.
+        if self._count == 0:
+            for _ in range(self.oversample):
+                self.accumulate()
+        raw = self._sum / self._count
+        self._sum = 0
+        self._count = 0
+        return adc_to_celsius(raw)
+
+
+def batch_capacity(mtu):
+    # Number of samples that fit in a single notification.
+    return max((mtu - _ATT_HEADER_SIZE - BATCH_HEADER_SIZE) // BATCH_SAMPLE_SIZE, 1)
+
+
+class SampleBatch:
+    def __init__(self, size=64):
+        self.size = size
+        self.total = 0
+        self._timestamps = [0] * size
+        self._values = [0] * size
+
+    def append(self, timestamp_ms, value):
+        i = self.total % self.size
+        self._timestamps[i] = timestamp_ms
+        self._values[i] = value
+        self.total += 1
+
+    def pending(self, cursor):
+        # Samples after `cursor` still in the ring (older ones were overwritten).
+        return min(self.total - cursor, self.size)
+
+    def pack(self, cursor, max_samples):
+        # Returns (payload, new cursor). The batch stops early if a sample is more than
+        # 65.535s after the first one, as the offsets are 16 bits.
+        start = max(cursor, self.total - self.size)
+        count = min(self.total - start, max_samples)
+        if count <= 0:
+            return None, cursor
+        first = self._timestamps[start % self.size]
+        buf = bytearray(BATCH_HEADER_SIZE + count * BATCH_SAMPLE_SIZE)
+        struct.pack_into(BATCH_HEADER_FORMAT, buf, 0, first & 0xFFFFFFFF)
+        offset = BATCH_HEADER_SIZE
+        packed = 0
+        for n in range(start, start + count):
+            i = n % self.size
+            delta = ticks_diff(self._timestamps[i], first)
+            if delta > 0xFFFF:
+                break
+            struct.pack_into(BATCH_SAMPLE_FORMAT, buf, offset, delta, self._values[i])
+            offset += BATCH_SAMPLE_SIZE
+            packed += 1
+        return memoryview(buf)[:offset], start + packed
+
+
+def unpack_batch(data):
+    # [(timestamp ms, temperature in 0.01 degC), ...] from a batch notification.
+    (first,) = struct.unpack_from(BATCH_HEADER_FORMAT, data, 0)
+    return [(first + delta, value)
+            for delta, value in (struct.unpack_from(BATCH_SAMPLE_FORMAT, data, offset)
+                                 for offset in range(BATCH_HEADER_SIZE, len(data),
+                                                     BATCH_SAMPLE_SIZE))]
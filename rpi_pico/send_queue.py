@@ -0,0 +1,98 @@
+# Per-connection outbound queue for notifications and indications.
+#
+# gatts_notify/gatts_indicate raise OSError when the stack has no room left for
+# the connection, which happens quickly with several centrals or a slow one.
+# ConnectionQueue keeps what could not be sent yet:
+#   - notifications are coalesced per characteristic: a slow peer gets the
+#     latest value once it catches up, not a backlog of stale ones;
+#   - indications are sent one at a time, the next one only after the central
+#     confirmed the previous (_IRQ_GATTS_INDICATE_DONE), and at most `maxlen`
+#     are kept waiting (the oldest is dropped). Pass the data to indicate(): an
+#     indication queued without data sends the attribute's value when it goes out.
+# `queued`, `sent`, `dropped` and `failed` (indications not confirmed) count
+# the messages handled by the queue.
+#
+# Nothing here needs the bluetooth module, so it also runs on CPython.
+
+COUNTERS = ("queued", "sent", "dropped", "failed")
+
+
+class ConnectionQueue:
+    def __init__(self, ble, conn_handle, maxlen=8):
+        self._ble = ble
+        self.conn_handle = conn_handle
+        self.maxlen = maxlen
+        self.queued = 0
+        self.sent = 0
+        self.dropped = 0
+        self.failed = 0
+        # value handle -> data (None sends the current value of the characteristic).
+        self._notifications = {}
+        self._indications = []
+        self._indicating = False
+
+    def counters(self):
+        return {name: getattr(self, name) for name in COUNTERS}
+
+    def pending(self):
+        return len(self._notifications) + len(self._indications)
+
+    def notify(self, value_handle, data=None):
+        if value_handle in self._notifications:
+            # The peer hasn't taken the previous value yet: replace it.
+            self.dropped += 1
+        self._notifications[value_handle] = data
+        self.queued += 1
+
+    def indicate(self, value_handle, data=None):
+        if len(self._indications) >= self.maxlen:
+            self._indications.pop(0)
+            self.dropped += 1
+        self._indications.append((value_handle, data))
+        self.queued += 1
+
+    def try_notify(self, value_handle, data):
+        # Sends right away, bypassing the queue, for data that must not be coalesced
+        # (e.g. batches). Returns False if the stack has no room, so the caller retries.
+        try:
+            self._ble.gatts_notify(self.conn_handle, value_handle, data)
+        except OSError:
+            return False
+        self.queued += 1
+        self.sent += 1
+        return True
+
+    def indicate_done(self, status):
+        # Called from the IRQ handler: only update the state, flush() does the sending.
+        self._indicating = False
+        if status != 0:
+            self.failed += 1
+
+    def flush(self):
+        # Returns False if the stack ran out of room, so the caller should retry later.
+        # An indication waiting for its confirmation doesn't count: INDICATE_DONE will.
+        for value_handle in list(self._notifications):
+            data = self._notifications[value_handle]
+            try:
+                if data is None:
+                    self._ble.gatts_notify(self.conn_handle, value_handle)
+                else:
+                    self._ble.gatts_notify(self.conn_handle, value_handle, data)
+            except OSError:
+                return False
+            del self._notifications[value_handle]
+            self.sent += 1
+
+        if self._indications and not self._indicating:
+            value_handle, data = self._indications[0]
+            try:
+                if data is None:
+                    self._ble.gatts_indicate(self.conn_handle, value_handle)
+                else:
+                    self._ble.gatts_indicate(self.conn_handle, value_handle, data)
+            except OSError:
+                return False
+            self._indications.pop(0)
+            self._indicating = True
+            self.sent += 1
+        return True
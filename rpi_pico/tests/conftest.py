@@ -0,0 +1,47 @@
+# Runs the firmware under CPython: the stubs/ directory provides the MicroPython-only
+# modules (bluetooth, machine, micropython, ubinascii) and the MicroPython additions to
+# time and asyncio are patched in below, before any firmware module is imported.
+
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+HERE = Path(__file__).resolve().parent
+sys.path[:0] = [str(HERE / "stubs"), str(HERE.parent)]
+
+# ticks_ms() wraps at 2**30 ms on MicroPython ports (sampler.TICKS_PERIOD).
+_TICKS_PERIOD = 1 << 30
+
+
+def ticks_ms():
+    return time.monotonic_ns() // 1_000_000 & (_TICKS_PERIOD - 1)
+
+
+def ticks_add(ticks, delta):
+    return (ticks + delta) & (_TICKS_PERIOD - 1)
+
+
+def ticks_diff(a, b):
+    return ((a - b + _TICKS_PERIOD // 2) & (_TICKS_PERIOD - 1)) - _TICKS_PERIOD // 2
+
+
+async def sleep_ms(ms):
+    await asyncio.sleep(ms / 1000)
+
+
+class ThreadSafeFlag(asyncio.Event):
+    # Cleared by wait(), as uasyncio.ThreadSafeFlag.
+    async def wait(self):
+        await super().wait()
+        self.clear()
+
+
+for _name, _value in (("ticks_ms", ticks_ms), ("ticks_add", ticks_add),
+                      ("ticks_diff", ticks_diff)):
+    if not hasattr(time, _name):
+        setattr(time, _name, _value)
+if not hasattr(asyncio, "sleep_ms"):
+    asyncio.sleep_ms = sleep_ms
+if not hasattr(asyncio, "ThreadSafeFlag"):
+    asyncio.ThreadSafeFlag = ThreadSafeFlag
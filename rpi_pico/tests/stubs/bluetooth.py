@@ -0,0 +1,88 @@
+# Stub of MicroPython's bluetooth module, to run the firmware under CPython.
+#
+# BLE records what the firmware does (attribute values, notifications,
+# indications, advertising) instead of talking to a radio. Set `full` to make
+# gatts_notify/gatts_indicate raise OSError as when the stack has no room left.
+
+import struct
+
+
+class UUID:
+    def __init__(self, value):
+        if isinstance(value, int):
+            self._bytes = struct.pack("<H", value)
+        else:
+            self._bytes = bytes.fromhex(value.replace("-", ""))[::-1]
+
+    def __bytes__(self):
+        return self._bytes
+
+    def __eq__(self, other):
+        return isinstance(other, UUID) and self._bytes == other._bytes
+
+    def __hash__(self):
+        return hash(self._bytes)
+
+
+class BLE:
+    def __init__(self):
+        self.values = {}
+        self.buffers = {}
+        self.notifications = []
+        self.indications = []
+        self.advertising = []
+        self.full = False
+        self.irq_handler = None
+        self._active = False
+        self._mac = bytes.fromhex("28cdc1000001")
+
+    def active(self, change=None):
+        if change is not None:
+            self._active = bool(change)
+        return self._active
+
+    def config(self, *args, **kwargs):
+        if args == ("mac",):
+            return 0, self._mac
+        return None
+
+    def irq(self, handler):
+        self.irq_handler = handler
+
+    def gatts_register_services(self, services):
+        # One value handle per characteristic, numbered from 1 in registration order.
+        handles = []
+        next_handle = 1
+        for _, characteristics in services:
+            service_handles = []
+            for _ in characteristics:
+                service_handles.append(next_handle)
+                next_handle += 1
+            handles.append(tuple(service_handles))
+        return tuple(handles)
+
+    def gatts_set_buffer(self, value_handle, size, append=False):
+        self.buffers[value_handle] = size
+
+    def gatts_write(self, value_handle, data, send_update=False):
+        self.values[value_handle] = bytes(data) if not isinstance(data, str) else data.encode()
+
+    def gatts_read(self, value_handle):
+        return self.values.get(value_handle, b"")
+
+    def gatts_notify(self, conn_handle, value_handle, data=None):
+        if self.full:
+            raise OSError(12)
+        self.notifications.append(
+            (conn_handle, value_handle,
+             bytes(data) if data is not None else self.gatts_read(value_handle)))
+
+    def gatts_indicate(self, conn_handle, value_handle, data=None):
+        if self.full:
+            raise OSError(12)
+        self.indications.append(
+            (conn_handle, value_handle,
+             bytes(data) if data is not None else self.gatts_read(value_handle)))
+
+    def gap_advertise(self, interval_us, adv_data=None, resp_data=None, connectable=True):
+        self.advertising.append((interval_us, adv_data, resp_data, connectable))
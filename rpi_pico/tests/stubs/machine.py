@@ -0,0 +1,41 @@
+# Stub of MicroPython's machine module, to run the firmware under CPython.
+
+
+class ADC:
+    def __init__(self, channel, value=14000):
+        self.channel = channel
+        # read_u16() returns `value`, or the next item of `values` while there is one.
+        self.value = value
+        self.values = []
+        self.reads = 0
+
+    def read_u16(self):
+        self.reads += 1
+        if self.values:
+            return self.values.pop(0)
+        return self.value
+
+
+class Pin:
+    IN = 0
+    OUT = 1
+
+    def __init__(self, pin, mode=IN):
+        self.pin = pin
+        self.mode = mode
+        self._value = 0
+
+    def value(self, value=None):
+        if value is None:
+            return self._value
+        self._value = int(bool(value))
+        return None
+
+    def on(self):
+        self._value = 1
+
+    def off(self):
+        self._value = 0
+
+    def toggle(self):
+        self._value ^= 1
@@ -0,0 +1,5 @@
+# Stub of MicroPython's micropython module, to run the firmware under CPython.
+
+
+def const(value):
+    return value
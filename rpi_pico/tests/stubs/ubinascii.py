@@ -0,0 +1,3 @@
+# Stub of MicroPython's ubinascii module, to run the firmware under CPython.
+
+from binascii import a2b_base64, b2a_base64, hexlify, unhexlify  # noqa: F401
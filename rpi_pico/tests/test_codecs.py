@@ -0,0 +1,30 @@
+import pytest
+from gatt_codecs import BROADCAST, PROBE_TEMPERATURES, TEMPERATURE, UTF8, decode, uuid_key
+
+
+@pytest.mark.parametrize("value", [20.08, -0.07, 0.29, 21.5, -40.01])
+def test_temperature_round_trip(value):
+    # int() would truncate 20.08 * 100 to 2007.
+    assert TEMPERATURE.decode(TEMPERATURE.encode(value)) == value
+
+
+def test_broadcast_scales_the_temperature_only():
+    data = BROADCAST.encode((20.08, 7))
+    assert data == b"\xd8\x07\x07"
+    assert BROADCAST.decode(data) == (20.08, 7)
+
+
+def test_broadcast_encode_into():
+    buffer = bytearray(5)
+    BROADCAST.encode_into(buffer, 2, (-1.5, 255))
+    assert BROADCAST.decode(buffer, 2) == (-1.5, 255)
+
+
+def test_probe_temperatures():
+    assert PROBE_TEMPERATURES.decode(PROBE_TEMPERATURES.encode([20.08, -3.1])) == [20.08, -3.1]
+
+
+def test_decode_by_uuid():
+    assert uuid_key(0x2A6E) == uuid_key("00002A6E-0000-1000-8000-00805F9B34FB")
+    assert decode(uuid_key(0x2A29), UTF8.encode("Pico")) == "Pico"
+    assert decode("0000ffff-0000-1000-8000-00805f9b34fb", bytearray(b"\x01")) == b"\x01"
@@ -0,0 +1,105 @@
+import bluetooth
+import pytest
+from gatt_codecs import TEMPERATURE
+from gatt_history import OP_START, pack_control, unpack_chunk, unpack_status
+from main import (
+    _IRQ_CENTRAL_CONNECT,
+    _IRQ_CENTRAL_DISCONNECT,
+    _IRQ_GATTS_INDICATE_DONE,
+    _IRQ_GATTS_WRITE,
+    _IRQ_MTU_EXCHANGED,
+    BLEDevice,
+)
+from sampler import adc_to_celsius, batch_capacity, unpack_batch
+
+CONN = 64
+
+
+@pytest.fixture
+def ble():
+    return bluetooth.BLE()
+
+
+def connect(ble, conn_handle=CONN, mtu=None):
+    ble.irq_handler(_IRQ_CENTRAL_CONNECT, (conn_handle, 0, b"\x00" * 6))
+    if mtu is not None:
+        ble.irq_handler(_IRQ_MTU_EXCHANGED, (conn_handle, mtu))
+
+
+def test_advertises_on_start(ble):
+    BLEDevice(ble, name="test")
+    assert len(ble.advertising) == 1
+    assert ble.active()
+
+
+def test_notify_sends_the_current_temperature(ble):
+    device = BLEDevice(ble, name="test")
+    connect(ble)
+    device.update_temperature(notify=True)
+    [(conn_handle, value_handle, data)] = ble.notifications
+    assert conn_handle == CONN
+    assert value_handle == device._handle
+    assert TEMPERATURE.decode(data) == pytest.approx(adc_to_celsius(14000), abs=0.01)
+
+
+def test_notification_is_retried_when_the_stack_is_full(ble):
+    device = BLEDevice(ble, name="test")
+    connect(ble)
+    ble.full = True
+    device.update_temperature(notify=True)
+    assert ble.notifications == []
+    ble.full = False
+    device.update_temperature(notify=True)
+    assert len(ble.notifications) == 1
+    assert device.counters()["dropped"] == 1
+
+
+def test_indications_keep_their_own_value(ble):
+    device = BLEDevice(ble, name="test")
+    connect(ble)
+    adc = device._sampler._adc
+    device.update_temperature(indicate=True)
+    adc.value = 15000
+    device.update_temperature(indicate=True)
+    # The second indication waits for the first one to be confirmed.
+    assert len(ble.indications) == 1
+    ble.irq_handler(_IRQ_GATTS_INDICATE_DONE, (CONN, device._handle, 0))
+    device._send(CONN)
+    assert [TEMPERATURE.decode(data) for _, _, data in ble.indications] == [
+        pytest.approx(adc_to_celsius(14000), abs=0.01),
+        pytest.approx(adc_to_celsius(15000), abs=0.01),
+    ]
+
+
+def test_batched_notifications_fill_the_mtu(ble):
+    device = BLEDevice(ble, name="test", batched=True)
+    connect(ble, mtu=247)
+    for _ in range(batch_capacity(247)):
+        device.update_temperature(notify=True)
+    [(_, value_handle, data)] = ble.notifications
+    assert value_handle == device._batch_handle
+    assert len(unpack_batch(data)) == batch_capacity(247)
+
+
+def test_advertises_again_after_a_disconnect(ble):
+    BLEDevice(ble, name="test")
+    connect(ble)
+    ble.irq_handler(_IRQ_CENTRAL_DISCONNECT, (CONN, 0, b"\x00" * 6))
+    assert len(ble.advertising) == 2
+
+
+def test_sample_keeps_a_history_request_not_read_yet(ble):
+    device = BLEDevice(ble, name="test")
+    connect(ble)
+    device.update_temperature()
+    # The central's write lands, then a sample is taken before the IRQ handler runs.
+    ble.gatts_write(device._history_control, pack_control(OP_START, 0, 0))
+    device.update_temperature()
+    ble.irq_handler(_IRQ_GATTS_WRITE, (CONN, device._history_control))
+    device._send(CONN)
+    sequence, _, samples = unpack_chunk(ble.notifications[0][2])
+    assert (sequence, len(samples)) == (0, 2)
+    # The status is readable again, and kept up to date.
+    assert unpack_status(ble.gatts_read(device._history_control)) == (0, 2)
+    device.update_temperature()
+    assert unpack_status(ble.gatts_read(device._history_control)) == (0, 3)
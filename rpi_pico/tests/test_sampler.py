@@ -0,0 +1,114 @@
+import struct
+
+import pytest
+from machine import ADC
+from sampler import (
+    BATCH_HEADER_SIZE,
+    BATCH_SAMPLE_SIZE,
+    DEFAULT_MTU,
+    OversamplingSampler,
+    SampleBatch,
+    adc_to_celsius,
+    batch_capacity,
+    ticks_diff,
+    unpack_batch,
+)
+
+
+def test_adc_to_celsius_reference_point():
+    # Vbe = 0.706V at 27 degC.
+    assert adc_to_celsius(0.706 / 3.3 * 65535) == pytest.approx(27)
+
+
+def test_read_returns_the_mean_of_the_accumulated_reads():
+    adc = ADC(4)
+    adc.values = [14000, 14100, 14200, 14300]
+    sampler = OversamplingSampler(adc, oversample=16)
+    for _ in range(4):
+        sampler.accumulate()
+    assert sampler.read() == pytest.approx(adc_to_celsius(14150))
+    assert adc.reads == 4
+
+
+def test_read_takes_a_burst_when_nothing_was_accumulated():
+    adc = ADC(4, value=14000)
+    sampler = OversamplingSampler(adc, oversample=8)
+    assert sampler.read() == pytest.approx(adc_to_celsius(14000))
+    assert adc.reads == 8
+    # The accumulator was reset: the next read is a new burst.
+    adc.value = 15000
+    assert sampler.read() == pytest.approx(adc_to_celsius(15000))
+    assert adc.reads == 16
+
+
+@pytest.mark.parametrize(("mtu", "capacity"), [(DEFAULT_MTU, 4), (185, 44), (247, 60), (10, 1)])
+def test_batch_capacity(mtu, capacity):
+    assert batch_capacity(mtu) == capacity
+
+
+@pytest.mark.parametrize("mtu", [DEFAULT_MTU, 64, 185, 247])
+def test_full_batch_fits_in_one_notification(mtu):
+    batch = SampleBatch(size=128)
+    for n in range(128):
+        batch.append(1000 + n * 100, n)
+    data, _ = batch.pack(0, batch_capacity(mtu))
+    # ATT header (3 bytes) + payload.
+    assert 3 + len(data) <= mtu
+    assert len(data) == BATCH_HEADER_SIZE + batch_capacity(mtu) * BATCH_SAMPLE_SIZE
+
+
+def test_pack_round_trip():
+    batch = SampleBatch(size=16)
+    samples = [(5000 + n * 250, 2000 + n) for n in range(10)]
+    for timestamp, value in samples:
+        batch.append(timestamp, value)
+    data, cursor = batch.pack(0, 4)
+    assert cursor == 4
+    assert unpack_batch(bytes(data)) == samples[:4]
+    data, cursor = batch.pack(cursor, 60)
+    assert cursor == 10
+    assert unpack_batch(bytes(data)) == samples[4:]
+    assert batch.pack(cursor, 60) == (None, 10)
+
+
+def test_pack_negative_values():
+    batch = SampleBatch(size=4)
+    batch.append(0, -1234)
+    data, _ = batch.pack(0, 4)
+    assert unpack_batch(bytes(data)) == [(0, -1234)]
+
+
+def test_pack_skips_overwritten_samples():
+    batch = SampleBatch(size=4)
+    for n in range(10):
+        batch.append(n * 10, n)
+    assert batch.pending(0) == 4
+    data, cursor = batch.pack(0, 60)
+    assert cursor == 10
+    assert [value for _, value in unpack_batch(bytes(data))] == [6, 7, 8, 9]
+
+
+def test_pack_stops_before_a_16_bit_offset_overflow():
+    batch = SampleBatch(size=8)
+    batch.append(0, 1)
+    batch.append(0xFFFF, 2)
+    batch.append(0x10000, 3)
+    data, cursor = batch.pack(0, 8)
+    assert cursor == 2
+    assert unpack_batch(bytes(data)) == [(0, 1), (0xFFFF, 2)]
+    data, cursor = batch.pack(cursor, 8)
+    assert cursor == 3
+    assert unpack_batch(bytes(data)) == [(0x10000, 3)]
+
+
+def test_pack_across_the_ticks_wrap():
+    batch = SampleBatch(size=4)
+    last = (1 << 30) - 100
+    batch.append(last, 1)
+    batch.append(50, 2)
+    data, _ = batch.pack(0, 4)
+    (first,) = struct.unpack_from("<I", data)
+    assert first == last
+    assert [delta for delta, _ in (struct.unpack_from("<Hh", data, 4 + 4 * n)
+                                   for n in range(2))] == [0, 150]
+    assert ticks_diff(50, last) == 150